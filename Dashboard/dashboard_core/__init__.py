@@ -0,0 +1,2 @@
+'''Computations behind the dashboard pages: loading, filtering, KPIs, top tens and paging.
+Nothing in this package imports Streamlit, so it can run from scripts and the ETL as well.'''
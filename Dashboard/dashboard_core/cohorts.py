@@ -0,0 +1,94 @@
+'''Cohort retention: customers grouped by the month of their first purchase, and the share of
+each cohort purchasing again in every month since.
+
+Customers are identified by customer_unique_id. The cohort counts are taken in one pass over
+integer arrays: every (customer, month) a customer purchased in becomes one int64 key, np.unique
+sorts the keys by customer then month, so the first key of each customer gives its cohort, and
+np.bincount counts the active customers per (cohort, months since) cell. The ETL writes the
+counts as customer_cohorts.parquet. They are additive per customer, so an incremental refresh
+subtracts the old counts of the customers with new orders and adds their new counts.
+'''
+import numpy as np
+import pandas as pd
+
+from .customers import EXCLUDED_STATUSES
+from .data_cache import memoize
+
+# Columns read from the cleaned sales data
+COHORT_COLUMNS = ['customer_unique_id', 'order_status', 'order_purchase_timestamp']
+
+COUNT_COLUMNS = ['cohort', 'months_since', 'customers']
+
+
+def _purchases(df):
+    '''Rows of df counted as purchases'''
+    return df[~df['order_status'].isin(EXCLUDED_STATUSES) & df['customer_unique_id'].notna()
+              & df['order_purchase_timestamp'].notna()]
+
+
+def build_cohort_counts(df):
+    '''Active customers per cohort and months since the cohort's month.
+    return: dataframe with the COUNT_COLUMNS, sorted by cohort and months_since'''
+    df = _purchases(df)
+    codes = df['customer_unique_id'].astype('category').cat.codes.to_numpy().astype('int64')
+    months = df['order_purchase_timestamp'].to_numpy(dtype='datetime64[ns]').astype('datetime64[M]').astype('int64')
+    if not len(months):
+        return pd.DataFrame({'cohort': pd.Series(dtype='datetime64[ns]'), 'months_since': pd.Series(dtype='int16'),
+                             'customers': pd.Series(dtype='int32')})
+
+    first_month = months.min()
+    span = int(months.max() - first_month) + 1
+    # One key per (customer, month), sorted by customer then month
+    active = np.unique(codes * span + (months - first_month))
+    customer, month = np.divmod(active, span)
+    starts = np.flatnonzero(np.r_[True, customer[1:] != customer[:-1]])
+    cohort = month[np.repeat(starts, np.diff(np.r_[starts, len(active)]))]
+
+    cells = np.bincount(cohort * span + (month - cohort), minlength=span * span)
+    filled = np.flatnonzero(cells)
+    cohort, months_since = np.divmod(filled, span)
+    return pd.DataFrame({
+        'cohort': (cohort + first_month).astype('datetime64[M]').astype('datetime64[ns]'),
+        'months_since': months_since.astype('int16'),
+        'customers': cells[filled].astype('int32'),
+    })
+
+
+def refresh_cohort_counts(counts, previous, sales, customer_ids):
+    '''Update the counts for the given customers only: their counts in the previous sales rows
+    are subtracted and their counts in the new sales rows added.
+    return: dataframe with the COUNT_COLUMNS'''
+    customer_ids = list(customer_ids)
+    keys = ['cohort', 'months_since']
+    removed = build_cohort_counts(previous[previous['customer_unique_id'].isin(customer_ids)])
+    added = build_cohort_counts(sales[sales['customer_unique_id'].isin(customer_ids)])
+    totals = (counts.set_index(keys)['customers']
+              .add(added.set_index(keys)['customers'], fill_value=0)
+              .sub(removed.set_index(keys)['customers'], fill_value=0))
+    result = totals[totals > 0].astype('int32').sort_index().reset_index()[COUNT_COLUMNS]
+    return result.astype({'months_since': 'int16'})
+
+
+@memoize
+def retention_matrix(counts, rates=True):
+    '''The cohort triangle: one row per cohort month, one column per month since the first purchase.
+    Cells after the last month of the data are missing.
+    rates: divide every row by the size of its cohort
+    return: dataframe indexed by the cohort month'''
+    cohorts = pd.PeriodIndex(counts['cohort'], freq='M')
+    months = cohorts.year.to_numpy() * 12 + cohorts.month.to_numpy() - 1
+    if not len(months):
+        return pd.DataFrame(index=pd.PeriodIndex([], freq='M', name='cohort'))
+
+    first_month, last_month = months.min(), (months + counts['months_since'].to_numpy()).max()
+    span = int(last_month - first_month) + 1
+    rows = np.arange(span)
+    matrix = np.where(rows[:, None] + rows[None, :] < span, 0.0, np.nan)
+    matrix[months - first_month, counts['months_since'].to_numpy()] = counts['customers'].to_numpy()
+
+    # Only the months a cohort acquired customers in
+    matrix = matrix[matrix[:, 0] > 0]
+    if rates:
+        matrix = matrix / matrix[:, :1]
+    index = cohorts.unique().sort_values().rename('cohort')
+    return pd.DataFrame(matrix, index=index, columns=pd.RangeIndex(span, name='months_since'))
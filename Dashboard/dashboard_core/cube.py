@@ -0,0 +1,51 @@
+'''Monthly rollup cube of the cleaned sales data.
+
+The cube holds one row per (year, month, customer_state, product_category_name_english,
+order_status, payment_type) with summed measures and a review score histogram.
+It has thousands of rows instead of hundreds of thousands, and every KPI and top-ten chart
+on the Home page can be answered from it.
+'''
+import pandas as pd
+
+CUBE_DIMENSIONS = ['year', 'month', 'customer_state', 'product_category_name_english',
+                   'order_status', 'payment_type']
+
+REVIEW_SCORES = [1, 2, 3, 4, 5]
+REVIEW_COLUMNS = ['review_{}'.format(score) for score in REVIEW_SCORES]
+
+
+def build_cube(df):
+    '''Aggregate row level sales data to the monthly cube.
+    return: dataframe with the CUBE_DIMENSIONS columns, the payment_value, price and freight_value sums,
+    the number of rows and distinct orders, and one count column per review score'''
+    review_score = df['review_score'].astype('float64')
+    # The measures may be stored as float32, sum them in float64
+    rows = df[CUBE_DIMENSIONS + ['order_id']].assign(
+        **{column: df[column].astype('float64') for column in ['payment_value', 'price', 'freight_value']},
+        **{column: (review_score == score).astype('int32')
+           for column, score in zip(REVIEW_COLUMNS, REVIEW_SCORES)})
+
+    cube = rows.groupby(CUBE_DIMENSIONS, observed=True, dropna=False, sort=True).agg(
+        payment_value=('payment_value', 'sum'),
+        price=('price', 'sum'),
+        freight_value=('freight_value', 'sum'),
+        rows=('payment_value', 'size'),
+        orders=('order_id', 'nunique'),
+        **{column: (column, 'sum') for column in REVIEW_COLUMNS})
+    cube = cube.reset_index()
+
+    cube['year'] = cube['year'].astype('int16')
+    cube['month'] = cube['month'].astype('int8')
+    # The dimension columns keep the categorical dtypes of df
+    for column in CUBE_DIMENSIONS[2:]:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            cube[column] = cube[column].astype(df[column].dtype)
+    return cube
+
+
+def review_score_mean(cube):
+    '''Mean review score of the rows aggregated in cube (or a grouped sum of it)'''
+    reviews = cube[REVIEW_COLUMNS]
+    count = reviews.sum(axis=1)
+    total = (reviews * REVIEW_SCORES).sum(axis=1)
+    return total / count.where(count > 0)
@@ -0,0 +1,107 @@
+'''Recency, frequency and monetary value (RFM) per customer, and the customer segments.
+
+Customers are identified by customer_unique_id (customer_id changes with every order). The
+three measures are taken in a single grouped pass over integer arrays: the customer codes,
+the purchase time as int64 and a flag marking the first row of each of the customer's orders. Each measure is
+scored 1 to 5 by quantile, and the recency and frequency scores pick the segment from a
+5 x 5 lookup table. Results are memoized per version of the sales data.
+'''
+import numpy as np
+import pandas as pd
+
+from .data_cache import memoize
+
+# Columns read from the cleaned sales data
+RFM_COLUMNS = ['customer_unique_id', 'order_id', 'order_status', 'order_purchase_timestamp', 'payment_value']
+
+# Orders that never turned into revenue
+EXCLUDED_STATUSES = ['Canceled', 'Unavailable']
+
+SCORES = 5
+
+_DAY = np.timedelta64(1, 'D').astype('timedelta64[ns]').astype('int64')
+
+SEGMENTS = ['Champions', 'Loyal Customers', 'Potential Loyalists', 'New Customers', 'Promising',
+            'Need Attention', 'About To Sleep', 'At Risk', "Can't Lose", 'Hibernating']
+
+# Segment of each (recency score, frequency score), rows are recency 1 to 5, columns frequency 1 to 5
+SEGMENT_GRID = [
+    ['Hibernating', 'Hibernating', 'At Risk', 'At Risk', "Can't Lose"],
+    ['Hibernating', 'Hibernating', 'At Risk', 'At Risk', "Can't Lose"],
+    ['About To Sleep', 'About To Sleep', 'Need Attention', 'Loyal Customers', 'Loyal Customers'],
+    ['Promising', 'Potential Loyalists', 'Potential Loyalists', 'Loyal Customers', 'Loyal Customers'],
+    ['New Customers', 'Potential Loyalists', 'Potential Loyalists', 'Champions', 'Champions'],
+]
+_SEGMENT_CODES = np.array([[SEGMENTS.index(segment) for segment in row] for row in SEGMENT_GRID], dtype='int8')
+
+
+def quantile_scores(values, higher_is_better=True):
+    '''Score values 1 to SCORES by quantile. Tied values get the same, lowest, score, so the
+    many customers with a single order do not spread over several frequency scores.
+    return: int8 array'''
+    ranks = pd.Series(values if higher_is_better else -values).rank(method='min', pct=True).to_numpy()
+    return np.clip(np.ceil(ranks * SCORES), 1, SCORES).astype('int8')
+
+
+@memoize
+def customer_rfm(df):
+    '''RFM measures, scores and segment of every customer with a purchase.
+    Recency is counted in days from the day after the last purchase in df.
+    return: dataframe indexed by customer_unique_id'''
+    fingerprint = df.attrs.get('fingerprint')
+    df = df[~df['order_status'].isin(EXCLUDED_STATUSES) & df['customer_unique_id'].notna()
+            & df['order_purchase_timestamp'].notna()]
+    customers = df['customer_unique_id'].astype('category')
+    orders = df['order_id'].astype('category')
+    purchased = df['order_purchase_timestamp'].to_numpy(dtype='datetime64[ns]').view('int64')
+
+    customer_codes = customers.cat.codes.to_numpy()
+    # One int64 key per (customer, order), so each order is counted once per customer
+    order_keys = customer_codes.astype('int64') * (len(orders.cat.categories) + 1) + orders.cat.codes.to_numpy() + 1
+    rows = pd.DataFrame({
+        'customer': customer_codes,
+        'purchased': purchased,
+        'first_row': ~pd.Series(order_keys).duplicated().to_numpy(),
+        'payment_value': df['payment_value'].to_numpy(dtype='float64'),
+    })
+    grouped = rows.groupby('customer', sort=True).agg(
+        last_purchase=('purchased', 'max'),
+        frequency=('first_row', 'sum'),
+        monetary=('payment_value', 'sum'))
+
+    last_purchase = grouped['last_purchase'].to_numpy()
+    recency = (last_purchase.max(initial=0) + _DAY - last_purchase) // _DAY
+    frequency = grouped['frequency'].to_numpy(dtype='int32')
+    monetary = grouped['monetary'].to_numpy()
+
+    r_score = quantile_scores(recency, higher_is_better=False)
+    f_score = quantile_scores(frequency)
+    m_score = quantile_scores(monetary)
+    segment = pd.Categorical.from_codes(_SEGMENT_CODES[r_score - 1, f_score - 1], categories=SEGMENTS)
+
+    rfm = pd.DataFrame({
+        'recency': recency.astype('int32'),
+        'frequency': frequency,
+        'monetary': monetary,
+        'r_score': r_score,
+        'f_score': f_score,
+        'm_score': m_score,
+        'segment': segment,
+    }, index=pd.Index(customers.cat.categories[grouped.index.to_numpy()], name='customer_unique_id'))
+    rfm.attrs['fingerprint'] = ('rfm', fingerprint) if fingerprint else None
+    return rfm
+
+
+@memoize
+def segment_summary(rfm):
+    '''Size and revenue of every segment, largest revenue first.
+    return: dataframe indexed by segment'''
+    summary = rfm.groupby('segment', observed=False).agg(
+        customers=('monetary', 'size'),
+        revenue=('monetary', 'sum'),
+        recency=('recency', 'mean'),
+        frequency=('frequency', 'mean'),
+        monetary=('monetary', 'mean'))
+    summary['customer_share'] = summary['customers'] / max(len(rfm), 1)
+    summary['revenue_share'] = summary['revenue'] / (rfm['monetary'].sum() or 1)
+    return summary.sort_values('revenue', ascending=False)
@@ -0,0 +1,146 @@
+'''Process-wide cache for loaded data and derived frames.
+
+Streamlit re-runs the page scripts on every widget interaction, but imported modules are kept
+for the life of the server process. The cache below therefore outlives script runs and sessions.
+
+Entries are keyed on the source file fingerprint (path, mtime and size), so editing or replacing
+the data file invalidates everything derived from it. The cache is bounded by memory and evicts
+the least recently used entries first.
+'''
+import functools
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+# Upper bound on the memory held by the cache
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def file_fingerprint(file_path):
+    '''Identify the current version of a file.
+    return: tuple of (absolute path, modification time in ns, size in bytes)'''
+    stat = os.stat(file_path)
+    return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+
+
+def _size_of(value):
+    '''Approximate memory used by a cached value, in bytes'''
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+def enable_copy_on_write():
+    '''Turn on pandas copy-on-write, for the dashboard scripts to call first.
+    Cached frames are then handed out as shallow copies: writing to a copy never touches the cached frame.'''
+    pd.set_option('mode.copy_on_write', True)
+
+
+def _read_only(value):
+    '''Return a copy of value that cannot modify the cached object, shallow under copy-on-write'''
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return value.copy(deep=not pd.options.mode.copy_on_write)
+    return value
+
+
+class FrameCache:
+    '''Thread-safe LRU cache bounded by the memory of its values, with hit/miss counters'''
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+
+    def get_or_compute(self, key, compute):
+        '''Return the value cached under key, computing and storing it on a miss'''
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _read_only(self._entries[key][0])
+            self.misses += 1
+
+        value = compute()
+        size = _size_of(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            self._evict()
+        return _read_only(value)
+
+    def _evict(self):
+        '''Drop least recently used entries until the cache fits in max_bytes.
+        The newest entry is always kept, even when it alone exceeds the limit.'''
+        while self.current_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        '''Counters used to confirm that interactions are served from the cache'''
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+            }
+
+
+frame_cache = FrameCache()
+
+
+def _key_part(value):
+    '''Turn a function argument into a hashable cache key component.
+    Frames are identified by the fingerprint stored in their attrs; None means "not cacheable".'''
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return ('frame', value.attrs.get('fingerprint'))
+    if isinstance(value, (list, tuple)):
+        return tuple(_key_part(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_key_part(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _key_part(v)) for k, v in value.items()))
+    return value
+
+
+def _cacheable(key):
+    '''A key is only usable when every frame in it carries a fingerprint'''
+    if isinstance(key, tuple):
+        if len(key) == 2 and key[0] == 'frame':
+            return key[1] is not None
+        return all(_cacheable(part) for part in key)
+    if isinstance(key, frozenset):
+        return all(_cacheable(part) for part in key)
+    return True
+
+
+def memoize(func):
+    '''Cache the results of func in the process-wide frame cache.
+    Frame arguments are keyed by their fingerprint; calls on frames without one are not cached.'''
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__module__, func.__qualname__, _key_part(args), _key_part(kwargs))
+        if not _cacheable(key):
+            return func(*args, **kwargs)
+        return frame_cache.get_or_compute(key, lambda: func(*args, **kwargs))
+    return wrapper
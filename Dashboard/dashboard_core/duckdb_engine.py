@@ -0,0 +1,213 @@
+'''DuckDB query engine for the dashboard, an optional alternative to the pandas cube.
+
+The cleaned sales data is copied once into an on-disk DuckDB database next to it, with the
+rows ordered by month so DuckDB's zone maps skip whole row groups for a date range. Every
+Streamlit worker opens the same file read-only instead of holding its own copy of the table.
+The sidebar filters become the WHERE clause of each query, and the queries only return the
+small result frames the KPI cards and charts need.
+
+The database is rebuilt when the source file changes. A rebuild writes a new file and
+renames it over the old one, so workers still reading the old file are not disturbed.
+
+Select it with DASHBOARD_ENGINE=duckdb (see engines.py). Requires the duckdb package.
+'''
+import os
+import threading
+from dataclasses import dataclass
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError as error:
+    raise ImportError('the duckdb dashboard engine needs the duckdb package: pip install duckdb') from error
+
+from .data_cache import file_fingerprint, memoize
+from .filters import FILTER_COLUMNS, month_number
+from .home import HomeNumbers, SidebarOptions
+from .kpis import kpis_from_summary
+from .loading import SALES_PATH, source_path
+from .schema import apply_schema
+
+DATABASE_PATH = os.path.splitext(SALES_PATH)[0] + '.duckdb'
+
+_MONTH = '(year * 12 + month - 1)'
+
+
+def _source_query(sales_path):
+    '''DuckDB table function reading the cleaned sales file'''
+    reader = 'read_parquet' if sales_path.endswith('.parquet') else 'read_csv_auto'
+    return "{}('{}')".format(reader, sales_path.replace("'", "''"))
+
+
+def build_database(sales_path=SALES_PATH, database_path=DATABASE_PATH):
+    '''Copy the cleaned sales data into a DuckDB database, ordered by month.
+    The fingerprint of the source file is stored with it, to detect when it is stale.'''
+    fingerprint = file_fingerprint(sales_path)
+    temporary_path = '{}.{}.tmp'.format(database_path, os.getpid())
+    if os.path.exists(temporary_path):
+        os.remove(temporary_path)
+
+    connection = duckdb.connect(temporary_path)
+    try:
+        connection.execute('CREATE TABLE sales AS SELECT * FROM {} ORDER BY year, month'.format(
+            _source_query(sales_path)))
+        connection.execute('CREATE TABLE source (path VARCHAR, mtime_ns BIGINT, size BIGINT)')
+        connection.execute('INSERT INTO source VALUES (?, ?, ?)', list(fingerprint))
+    finally:
+        connection.close()
+    os.replace(temporary_path, database_path)
+
+
+def _stored_fingerprint(database_path):
+    '''Fingerprint of the source file the database was built from, None when there is no database'''
+    if not os.path.exists(database_path):
+        return None
+    connection = duckdb.connect(database_path, read_only=True)
+    try:
+        return tuple(connection.execute('SELECT path, mtime_ns, size FROM source').fetchone())
+    except duckdb.Error:
+        return None
+    finally:
+        connection.close()
+
+
+_connections = {}
+_connections_lock = threading.Lock()
+
+
+def _connection(database_path, database_fingerprint):
+    '''Read-only connection to the current version of the database, shared by the threads of the process'''
+    key = (database_path, database_fingerprint)
+    with _connections_lock:
+        if key not in _connections:
+            for old_key in [old_key for old_key in _connections if old_key[0] == database_path]:
+                _connections.pop(old_key).close()
+            _connections[key] = duckdb.connect(database_path, read_only=True)
+        return _connections[key]
+
+
+def where_clause(filters, years_back=0):
+    '''SQL condition and parameters selecting the rows that match filters.
+    With years_back, the date range is shifted back by that many years.'''
+    first = month_number(*filters.start) - 12 * years_back
+    last = month_number(*filters.end) - 12 * years_back
+    # The year bounds let DuckDB skip row groups by their min/max statistics
+    conditions = ['year BETWEEN ? AND ?', '{} BETWEEN ? AND ?'.format(_MONTH)]
+    parameters = [first // 12, last // 12, first, last]
+    for name, column in FILTER_COLUMNS.items():
+        selected = list(getattr(filters, name))
+        if selected:
+            conditions.append('{} IN ({})'.format(column, ', '.join('?' * len(selected))))
+            parameters.extend(selected)
+    return ' AND '.join(conditions), parameters
+
+
+@dataclass(frozen=True)
+class DuckDBEngine:
+    '''Dashboard queries answered by DuckDB. Instances are keyed on the database version, so
+    results memoized for one version are not served for the next.'''
+    database_path: str
+    fingerprint: tuple
+
+    @classmethod
+    def open(cls, sales_path=SALES_PATH, database_path=DATABASE_PATH):
+        '''Engine over the database for the Parquet or CSV file of sales_path, (re)built first when missing or stale.
+        The engine is cached per version of that file, so reruns do not open the database to check it.'''
+        return _open_engine(file_fingerprint(source_path(sales_path)), database_path)
+
+    def query(self, sql, parameters=()):
+        '''Run sql and return the result as a dataframe'''
+        cursor = _connection(self.database_path, self.fingerprint).cursor()
+        try:
+            return cursor.execute(sql, list(parameters)).df()
+        finally:
+            cursor.close()
+
+    def sidebar_options(self):
+        return _sidebar_options(self)
+
+    def compute_home(self, filters):
+        return _compute_home(self, filters)
+
+    def rows(self, filters):
+        return _rows(self, filters)
+
+
+@memoize
+def _open_engine(source_fingerprint, database_path):
+    '''Engine over the database built from the source file identified by source_fingerprint'''
+    if _stored_fingerprint(database_path) != source_fingerprint:
+        build_database(source_fingerprint[0], database_path)
+    return DuckDBEngine(database_path=database_path, fingerprint=file_fingerprint(database_path))
+
+
+@memoize
+def _sidebar_options(engine):
+    bounds = engine.query('SELECT min(year) AS min_year, min(month) AS min_month, '
+                          'max(year) AS max_year, max(month) AS max_month FROM sales').iloc[0]
+
+    def distinct(column):
+        values = engine.query('SELECT DISTINCT {0} FROM sales WHERE {0} IS NOT NULL ORDER BY 1'.format(column))
+        return values[column].tolist()
+
+    return SidebarOptions(
+        first_month=pd.Timestamp(int(bounds.min_year), int(bounds.min_month), 1).to_pydatetime(),
+        last_month=pd.Timestamp(int(bounds.max_year), int(bounds.max_month), 1).to_pydatetime(),
+        order_statuses=distinct('order_status'),
+        customer_states=distinct('customer_state'),
+        product_categories=distinct('product_category_name_english'),
+    )
+
+
+def yearly_status_summary(engine, filters):
+    '''Same table as kpis.yearly_status_summary, for the selected period and the two before it.
+    Each period is labelled with the year its range ends in. The periods are separate queries,
+    so with a range over 12 months a row falls in every period overlapping it, as in comparison_cube.'''
+    this_year = filters.end[0]
+    periods, parameters = [], []
+    for years_back in range(3):
+        condition, condition_parameters = where_clause(filters, years_back)
+        periods.append('SELECT ? AS period, order_status, payment_value, review_score FROM sales WHERE {}'
+                       .format(condition))
+        parameters.extend([this_year - years_back] + condition_parameters)
+    sql = '''
+        SELECT period AS year, order_status,
+               sum(payment_value::DOUBLE) AS payment_value,
+               avg(review_score::DOUBLE) AS review_score,
+               count(review_score) AS review_count,
+               count(*) AS rows
+        FROM ({})
+        GROUP BY ALL'''.format(' UNION ALL '.join(periods))
+    summary = engine.query(sql, parameters)
+    summary['year'] = summary['year'].astype('int64')
+    return summary.set_index(['year', 'order_status']).sort_index()
+
+
+@memoize
+def _compute_home(engine, filters):
+    condition, parameters = where_clause(filters)
+    product_lines = engine.query('''
+        SELECT product_category_name_english, sum(payment_value::DOUBLE) AS payment_value
+        FROM sales WHERE {} AND product_category_name_english IS NOT NULL
+        GROUP BY 1 ORDER BY 2 DESC LIMIT 10'''.format(condition), parameters)
+    regions = engine.query('''
+        SELECT customer_state, sum(payment_value::DOUBLE) AS payment_value
+        FROM sales WHERE {} AND order_status = 'Delivered' AND customer_state IS NOT NULL
+        GROUP BY 1 ORDER BY 2 DESC LIMIT 10'''.format(condition), parameters)
+
+    return HomeNumbers(
+        filters=filters,
+        kpis=kpis_from_summary(yearly_status_summary(engine, filters), int(filters.end[0])),
+        top_product_lines=product_lines.set_index('product_category_name_english')['payment_value']
+                                       .sort_values(ascending=True),
+        top_regions=regions.set_index('customer_state')['payment_value'],
+    )
+
+
+@memoize
+def _rows(engine, filters):
+    condition, parameters = where_clause(filters)
+    rows = apply_schema(engine.query('SELECT * FROM sales WHERE {}'.format(condition), parameters))
+    rows.attrs['fingerprint'] = ('duckdb', engine, filters)
+    return rows
@@ -0,0 +1,44 @@
+'''Query engines the Home page can run on.
+
+pandas (the default) answers every KPI and chart from the monthly cube held in memory.
+duckdb answers them with SQL over an on-disk database shared by all workers, see duckdb_engine.py.
+The engine is chosen with the DASHBOARD_ENGINE environment variable.
+'''
+import os
+from dataclasses import dataclass
+
+from .filters import filter_cube, sort_by_month
+from .home import compute_home, sidebar_options
+from .loading import CUBE_PATH, SALES_PATH, load_cube, load_data
+
+ENGINE_VARIABLE = 'DASHBOARD_ENGINE'
+ENGINES = ['pandas', 'duckdb']
+
+
+@dataclass(frozen=True)
+class PandasEngine:
+    '''Queries answered by pandas from the cube, and from the cleaned sales rows for the raw data view'''
+    cube_path: str = CUBE_PATH
+    sales_path: str = SALES_PATH
+
+    def sidebar_options(self):
+        return sidebar_options(load_cube(self.cube_path, self.sales_path))
+
+    def compute_home(self, filters):
+        return compute_home(load_cube(self.cube_path, self.sales_path), filters)
+
+    def rows(self, filters):
+        '''Cleaned sales rows matching filters'''
+        return filter_cube(sort_by_month(load_data(self.sales_path)), filters)
+
+
+def get_engine(name=None):
+    '''Engine called name, or the one set in DASHBOARD_ENGINE, pandas by default'''
+    name = name or os.environ.get(ENGINE_VARIABLE, 'pandas')
+    if name == 'pandas':
+        return PandasEngine()
+    if name == 'duckdb':
+        # Optional dependency, only imported when selected
+        from .duckdb_engine import DuckDBEngine
+        return DuckDBEngine.open()
+    raise ValueError('unknown dashboard engine {!r}, expected one of {}'.format(name, ', '.join(ENGINES)))
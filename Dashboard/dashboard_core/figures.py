@@ -0,0 +1,216 @@
+'''Plotly figures of the Home page, cached as serialized JSON.
+
+Building a Plotly figure validates every property it is given, which costs more server time
+per rerun than the numbers behind it. cached_figure stores the JSON of each figure in the
+frame cache, keyed by the builder, a hash of the data it plots and its layout parameters.
+On a hit the figure is rebuilt from the JSON without validation, so widgets whose inputs did
+not change, like the constant target and team goal charts, skip Plotly construction entirely.
+'''
+import hashlib
+import json
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from millify import millify
+
+from .data_cache import frame_cache
+
+ACCENT = "#e05628"
+REMAINDER = "#C7C9CE"
+
+
+def data_digest(data):
+    '''Hash of the values, index and labels of a frame or series, used in figure cache keys'''
+    if data is None:
+        return None
+    digest = hashlib.sha256(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    labels = list(data.columns) if isinstance(data, pd.DataFrame) else [data.name]
+    digest.update(repr((labels, data.index.name)).encode())
+    return digest.hexdigest()
+
+
+def cached_figure(build, data=None, **params):
+    '''Figure returned by build(data, **params), or build(**params) without data, from the cache.
+    params must be hashable.
+    return: plotly Figure'''
+    key = ('figure', build.__module__, build.__qualname__, data_digest(data), tuple(sorted(params.items())))
+
+    def compute():
+        figure = build(**params) if data is None else build(data, **params)
+        return figure.to_json()
+
+    spec = frame_cache.get_or_compute(key, compute)
+    # The JSON was produced by a validated figure, so it is not validated again
+    return go.Figure(json.loads(spec), _validate=False)
+
+
+def target_figure(target_sales, current_sales):
+    '''Donut of the sales made so far against the target for this year'''
+    figure = go.Figure(data=go.Pie(values=[current_sales, max(target_sales - current_sales, 0)], hole=0.75,
+                                   marker_colors=[ACCENT, REMAINDER], domain={'x': [0, 1], 'y': [0, 1]},),
+                       layout={'height': 500, 'width': 500,},)
+    figure.update_traces(hoverinfo='value+percent', textinfo='none', rotation=45, showlegend=False,)
+    figure.add_annotation(x=0.5, y=0.5,
+                          text='${}'.format(millify(target_sales)),
+                          font=dict(size=30, family='sans serif',),
+                          showarrow=False)
+    figure.update_layout(
+        title={'text': 'Target For This Year', 'font': {'size': 18}, 'x': 0, 'y': 1},
+        autosize=False, height=400, width=400, plot_bgcolor="rgba(0,0,0,0)", xaxis=(dict(showgrid=False)))
+    return figure
+
+
+def team_goal_figure(team_name, target_revenue=5000000, current_revenue=500000):
+    '''Bullet gauge of a team's revenue against its target'''
+    figure = go.Figure(go.Indicator(
+        mode="gauge+number+delta",
+        number={'prefix': "$", 'font': {'size': 18}},
+        value=target_revenue,
+        title={'text': team_name, 'font': {'size': 14}},
+        align='center',
+        domain={'x': [0, 1], 'y': [0, 1]},
+        gauge={
+            'shape': "bullet",
+            'axis': {'ticks': "", 'showticklabels': False,},
+            'bar': {'color': "rgba(0,0,0,0)", 'thickness': 0.3,},
+            'bgcolor': "rgba(0,0,0,0)",
+            'borderwidth': 0,
+            'steps': [{'range': [0, current_revenue], 'color': ACCENT},
+                      {'range': [current_revenue, target_revenue], 'color': REMAINDER}],
+        },
+    ))
+    figure.update_layout(autosize=True,
+                         height=50,
+                         margin=dict(r=0, b=0.2, t=0.2))
+    return figure
+
+
+def product_lines_figure(sales_by_product_line):
+    '''Horizontal bars of the top product lines by sales'''
+    figure = px.bar(
+        data_frame=sales_by_product_line,
+        x="payment_value",
+        y=sales_by_product_line.index,
+        title="<b>Sales by Product Line</b>",
+        orientation='h',
+        color_discrete_sequence=[ACCENT],
+        template="plotly_white")
+    figure.update_layout(plot_bgcolor="rgba(0,0,0,0)", xaxis=(dict(showgrid=False)))
+    return figure
+
+
+def regions_figure(sales_by_region):
+    '''Vertical bars of the top customer states by sales'''
+    figure = px.bar(
+        data_frame=sales_by_region,
+        y="payment_value",
+        x=sales_by_region.index,
+        title="<b>Sales by Region</b>",
+        orientation='v',
+        color_discrete_sequence=[ACCENT],
+        template="plotly_white")
+    figure.update_layout(plot_bgcolor="rgba(0,0,0,0)", xaxis=(dict(showgrid=False)))
+    return figure
+
+
+def segment_share_figure(summary):
+    '''Grouped horizontal bars of each customer segment's share of customers and of revenue'''
+    shares = (summary[['customer_share', 'revenue_share']]
+              .rename(columns={'customer_share': 'Customers', 'revenue_share': 'Revenue'}) * 100)
+    shares = shares.iloc[::-1].reset_index().melt(id_vars='segment', var_name='share', value_name='percent')
+    figure = px.bar(
+        data_frame=shares,
+        x='percent',
+        y='segment',
+        color='share',
+        barmode='group',
+        title="<b>Share of Customers and Revenue by Segment</b>",
+        orientation='h',
+        color_discrete_sequence=[REMAINDER, ACCENT],
+        template="plotly_white")
+    figure.update_layout(plot_bgcolor="rgba(0,0,0,0)", xaxis=dict(showgrid=False, ticksuffix='%'),
+                         yaxis_title=None, legend_title=None, height=450)
+    return figure
+
+
+def leaderboard_figure(sellers, measure, label):
+    '''Horizontal bars of the sellers of a leaderboard, best at the top'''
+    ranked = sellers.iloc[::-1]
+    figure = px.bar(
+        data_frame=ranked,
+        x=measure,
+        y='seller_id',
+        hover_data=['seller_city', 'seller_state'],
+        title="<b>Sellers by {}</b>".format(label),
+        orientation='h',
+        color_discrete_sequence=[ACCENT],
+        template="plotly_white")
+    figure.update_layout(plot_bgcolor="rgba(0,0,0,0)", xaxis=dict(showgrid=False), xaxis_title=label,
+                         yaxis_title=None, height=max(300, 24 * len(sellers) + 100))
+    return figure
+
+
+def monthly_revenue_figure(revenue):
+    '''Line of a revenue series indexed by month'''
+    figure = px.line(
+        x=revenue.index.astype(str),
+        y=revenue.to_numpy(),
+        markers=True,
+        title="<b>Revenue by Month</b>",
+        color_discrete_sequence=[ACCENT],
+        template="plotly_white")
+    figure.update_layout(plot_bgcolor="rgba(0,0,0,0)", xaxis_title=None, yaxis_title='payment_value')
+    return figure
+
+
+def retention_figure(retention):
+    '''Heatmap of the cohort triangle, from the first month after the cohort's first purchase,
+    since month 0 is always the whole cohort'''
+    repeat = retention.iloc[:, 1:] * 100
+    figure = px.imshow(
+        repeat.to_numpy(),
+        x=[str(months) for months in repeat.columns],
+        y=repeat.index.astype(str),
+        labels=dict(x='Months since first purchase', y='Cohort', color='Repeat %'),
+        title="<b>Repeat Purchase Rate by Cohort</b>",
+        color_continuous_scale=[REMAINDER, ACCENT],
+        aspect='auto',
+        template="plotly_white")
+    figure.update_layout(plot_bgcolor="rgba(0,0,0,0)", height=max(400, 20 * len(repeat) + 150),
+                         coloraxis_colorbar=dict(ticksuffix='%'))
+    return figure
+
+
+def map_cells_figure(cells, measure, label, center_lat, center_lng, zoom):
+    '''Grid cells of the map as circles sized and colored by measure'''
+    figure = px.scatter_map(
+        data_frame=cells,
+        lat='lat',
+        lon='lng',
+        size=measure,
+        color=measure,
+        hover_data={'payment_value': ':,.2f', 'orders': True, 'lat': False, 'lng': False},
+        labels={measure: label, 'payment_value': 'Revenue', 'orders': 'Orders'},
+        color_continuous_scale=[REMAINDER, ACCENT],
+        size_max=30,
+        center=dict(lat=center_lat, lon=center_lng),
+        zoom=zoom,
+        map_style='carto-positron')
+    figure.update_layout(margin=dict(l=0, r=0, t=0, b=0), height=600)
+    return figure
+
+
+def pair_matrix_figure(matrix, label):
+    '''Heatmap of a state pair measure, seller states down and customer states across'''
+    figure = px.imshow(
+        matrix.to_numpy(),
+        x=list(matrix.columns),
+        y=list(matrix.index),
+        labels=dict(x='Customer state', y='Seller state', color=label),
+        title="<b>{} by Seller and Customer State</b>".format(label),
+        color_continuous_scale=[REMAINDER, ACCENT],
+        aspect='auto',
+        template="plotly_white")
+    figure.update_layout(plot_bgcolor="rgba(0,0,0,0)", height=650)
+    return figure
@@ -0,0 +1,130 @@
+'''Filter layer for the sidebar options of the Home page.
+
+Filters are evaluated on arrays precomputed once per cube: a sorted month index for the
+date range, and category codes for order status, state and product category. A date range
+becomes a binary search, and each multiselect becomes a lookup table indexed by category
+code, so changing a filter does not rescan or re-parse any strings.
+'''
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import memoize
+
+# Sidebar multiselects and the cube columns they filter
+FILTER_COLUMNS = {
+    'order_status': 'order_status',
+    'customer_state': 'customer_state',
+    'product_category': 'product_category_name_english',
+}
+
+
+def month_number(year, month):
+    '''Months since year 0, used to compare (year, month) pairs as integers'''
+    return int(year) * 12 + int(month) - 1
+
+
+@dataclass(frozen=True)
+class Filters:
+    '''Sidebar selection. An empty selection means no filtering on that column.'''
+    start: tuple
+    end: tuple
+    order_status: tuple = ()
+    customer_state: tuple = ()
+    product_category: tuple = ()
+
+    @classmethod
+    def from_widgets(cls, date_range, order_status, customer_state, product_category):
+        '''Build the filters from the values of the sidebar widgets'''
+        start, end = date_range
+        return cls(start=(start.year, start.month), end=(end.year, end.month),
+                   order_status=tuple(order_status),
+                   customer_state=tuple(customer_state),
+                   product_category=tuple(product_category))
+
+
+@dataclass(frozen=True)
+class CubeIndex:
+    '''Arrays the filters are evaluated on, precomputed once per cube'''
+    months: np.ndarray
+    codes: dict
+    categories: dict
+
+    @property
+    def nbytes(self):
+        return self.months.nbytes + sum(codes.nbytes for codes in self.codes.values())
+
+
+@memoize
+def cube_index(cube):
+    '''Precompute the month index and category codes of cube. The cube must be sorted by year and month.'''
+    months = cube['year'].to_numpy(dtype='int32') * 12 + cube['month'].to_numpy(dtype='int32') - 1
+    if np.any(np.diff(months) < 0):
+        raise ValueError('cube must be sorted by year and month')
+
+    codes, categories = {}, {}
+    for column in FILTER_COLUMNS.values():
+        values = cube[column]
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype('category')
+        codes[column] = values.cat.codes.to_numpy()
+        categories[column] = values.cat.categories
+    return CubeIndex(months=months, codes=codes, categories=categories)
+
+
+def _code_mask(codes, categories, selected):
+    '''Boolean mask of the rows whose category is in selected'''
+    # One slot per category, plus a last slot for missing values (code -1) which is never selected
+    lookup = np.zeros(len(categories) + 1, dtype=bool)
+    positions = categories.get_indexer(list(selected))
+    lookup[positions[positions >= 0]] = True
+    return lookup[codes]
+
+
+@memoize
+def sort_by_month(df):
+    '''Rows of df sorted by year and month, as filter_cube requires. Returned as is when already sorted.'''
+    months = df['year'].to_numpy(dtype='int32') * 12 + df['month'].to_numpy(dtype='int32') - 1
+    if not np.any(np.diff(months) < 0):
+        return df
+    result = df.iloc[np.argsort(months, kind='stable')]
+    fingerprint = df.attrs.get('fingerprint')
+    result.attrs['fingerprint'] = ('sorted', fingerprint) if fingerprint else None
+    return result
+
+
+@memoize
+def filter_cube(cube, filters, years_back=0):
+    '''Rows of cube matching filters. With years_back, the date range is shifted back by that many years.
+    The cleaned sales rows can be filtered the same way once passed through sort_by_month.
+    return: the filtered cube, fingerprinted so results computed from it can be memoized'''
+    index = cube_index(cube)
+    first = month_number(*filters.start) - 12 * years_back
+    last = month_number(*filters.end) - 12 * years_back
+    start = np.searchsorted(index.months, first, side='left')
+    stop = np.searchsorted(index.months, last, side='right')
+
+    mask = np.ones(stop - start, dtype=bool)
+    for name, column in FILTER_COLUMNS.items():
+        selected = getattr(filters, name)
+        if selected:
+            mask &= _code_mask(index.codes[column][start:stop], index.categories[column], selected)
+
+    result = cube.iloc[start + np.flatnonzero(mask)]
+    fingerprint = cube.attrs.get('fingerprint')
+    result.attrs['fingerprint'] = ('filtered', fingerprint, filters, years_back) if fingerprint else None
+    return result
+
+
+@memoize
+def comparison_cube(cube, filters):
+    '''Filtered cube for the selected period and the same period one and two years earlier.
+    Each period is labelled with the year its range ends in, so the KPI engine can compare them by year.'''
+    this_year = filters.end[0]
+    periods = [filter_cube(cube, filters, years_back).assign(year=np.int16(this_year - years_back))
+               for years_back in range(3)]
+    result = pd.concat(periods, ignore_index=True)
+    fingerprint = cube.attrs.get('fingerprint')
+    result.attrs['fingerprint'] = ('comparison', fingerprint, filters) if fingerprint else None
+    return result
@@ -0,0 +1,66 @@
+'''Numbers shown on the Home page, computed without Streamlit.
+
+Home.py only renders what compute_home returns, so the same numbers can be profiled,
+checked or precomputed for a batch of selections outside the Streamlit runtime.
+'''
+from dataclasses import dataclass
+from datetime import datetime
+
+import pandas as pd
+
+from .data_cache import memoize
+from .filters import Filters, comparison_cube, filter_cube
+from .kpis import KPIs, compute_kpis, top_product_lines, top_regions
+
+
+@dataclass(frozen=True)
+class SidebarOptions:
+    '''Choices offered by the sidebar widgets'''
+    first_month: datetime
+    last_month: datetime
+    order_statuses: list
+    customer_states: list
+    product_categories: list
+
+
+@memoize
+def sidebar_options(cube):
+    '''Date bounds and multiselect options, taken from the cube'''
+    # The slider opens on the whole last year, so its bounds use the earliest and latest month of any year
+    return SidebarOptions(
+        first_month=datetime(int(cube.year.min()), int(cube.month.min()), 1),
+        last_month=datetime(int(cube.year.max()), int(cube.month.max()), 1),
+        order_statuses=list(cube.order_status.dropna().unique()),
+        customer_states=list(cube.customer_state.dropna().unique()),
+        product_categories=list(cube.product_category_name_english.dropna().unique()),
+    )
+
+
+def default_filters(cube):
+    '''The selection the Home page opens with: the last year of data, no other filter'''
+    last_year = int(cube.year.max())
+    return Filters(start=(last_year, 1), end=(last_year, 12))
+
+
+@dataclass(frozen=True)
+class HomeNumbers:
+    '''Everything the Home page shows for one selection'''
+    filters: Filters
+    kpis: KPIs
+    top_product_lines: pd.Series
+    top_regions: pd.Series
+
+
+def compute_home(cube, filters):
+    '''KPIs and top tens for the selection in filters'''
+    filtered = filter_cube(cube, filters)
+    return HomeNumbers(filters=filters,
+                       kpis=compute_kpis(comparison_cube(cube, filters), filters.end[0]),
+                       top_product_lines=top_product_lines(filtered),
+                       top_regions=top_regions(filtered))
+
+
+def precompute_home(cube, selections):
+    '''Compute the Home numbers for several selections, which also fills the frame cache for them.
+    return: dict of Filters to HomeNumbers'''
+    return {filters: compute_home(cube, filters) for filters in selections}
@@ -0,0 +1,109 @@
+'''KPI engine for the Home page.
+
+Every KPI card is derived from one small summary table, built with a single
+groupby of the monthly cube over (year, order_status), instead of a separate scan
+of the sales data per metric. The top-ten aggregations of the Home page live here too.
+'''
+from dataclasses import dataclass
+
+import pandas as pd
+
+from .cube import REVIEW_COLUMNS, review_score_mean
+from .data_cache import memoize
+
+
+@dataclass(frozen=True)
+class KPIs:
+    '''Values rendered by the KPI cards, for one year and the year before it'''
+    year: int
+    cleared_order: int
+    cleared_order_last_year: int
+    canceled_order: int
+    canceled_order_last_year: int
+    yoy_growth: int
+    yoy_growth_last_year: int
+    star_rating: float
+
+    @property
+    def cleared_order_delta(self):
+        return self.cleared_order - self.cleared_order_last_year
+
+    @property
+    def canceled_order_delta(self):
+        return self.canceled_order - self.canceled_order_last_year
+
+    @property
+    def yoy_growth_delta(self):
+        return self.yoy_growth - self.yoy_growth_last_year
+
+
+@memoize
+def yearly_status_summary(cube):
+    '''Aggregate the monthly cube in one pass.
+    return: dataframe indexed by (year, order_status) with the payment_value sum,
+    the review score mean and count, and the number of rows'''
+    summary = (cube.groupby(['year', 'order_status'], observed=True)
+               [['payment_value', 'rows'] + REVIEW_COLUMNS].sum())
+    summary['review_score'] = review_score_mean(summary)
+    summary['review_count'] = summary[REVIEW_COLUMNS].sum(axis=1)
+    return summary[['payment_value', 'review_score', 'review_count', 'rows']]
+
+
+def _status_value(summary, year, status):
+    '''Value of orders with the given status in the given year, 0 when there are none'''
+    if (year, status) not in summary.index:
+        return 0
+    return int(summary.loc[(year, status), 'payment_value'])
+
+
+def _yoy_growth(revenue_by_year, this_year, last_year):
+    '''formula = (revenue this year - revenue last year)/revenue last year * 100'''
+    revenue_this_year = revenue_by_year.get(this_year, 0)
+    revenue_last_year = revenue_by_year.get(last_year, 0)
+    if not revenue_last_year:
+        return 0
+    difference = revenue_this_year - revenue_last_year
+    return int((difference / revenue_last_year) * 100)
+
+
+def kpis_from_summary(summary, this_year):
+    '''Derive every KPI card value and its delta from the yearly status summary'''
+    last_year = this_year - 1
+    revenue_by_year = summary['payment_value'].groupby(level='year').sum()
+
+    star_rating = 0.0
+    if (this_year, 'Delivered') in summary.index:
+        mean_score = summary.loc[(this_year, 'Delivered'), 'review_score']
+        if pd.notna(mean_score):
+            star_rating = round(float(mean_score), 1)
+
+    return KPIs(
+        year=this_year,
+        cleared_order=_status_value(summary, this_year, 'Delivered'),
+        cleared_order_last_year=_status_value(summary, last_year, 'Delivered'),
+        canceled_order=_status_value(summary, this_year, 'Canceled'),
+        canceled_order_last_year=_status_value(summary, last_year, 'Canceled'),
+        yoy_growth=_yoy_growth(revenue_by_year, this_year, last_year),
+        yoy_growth_last_year=_yoy_growth(revenue_by_year, last_year, last_year - 1),
+        star_rating=star_rating,
+    )
+
+
+@memoize
+def compute_kpis(cube, this_year):
+    '''KPI card values for this_year, compared to the year before'''
+    return kpis_from_summary(yearly_status_summary(cube), int(this_year))
+
+
+@memoize
+def top_product_lines(df):
+    '''Ten product lines with the highest sales, in ascending order for the bar chart'''
+    sales = df.groupby(by=['product_category_name_english'], observed=True)['payment_value'].sum()
+    return sales.nlargest(10).sort_values(ascending=True)
+
+
+@memoize
+def top_regions(df):
+    '''Ten customer states with the highest value of delivered orders'''
+    sales = df[df['order_status'] == 'Delivered'].groupby('customer_state', observed=True)['payment_value'].sum()
+    return sales.sort_values(ascending=False)[:10]
@@ -0,0 +1,108 @@
+'''Loading of the cleaned sales data and of the frames the ETL derives from it: the monthly cube,
+the seller table, the cohort counts, the map bins and the state pairs.
+
+Every frame is cached for the whole process, keyed on the fingerprint of the file it was read
+from. A derived frame whose file is missing is built from the sales data instead. The default
+paths point at the ETL outputs in the repository root, whatever the working directory.
+'''
+import os
+
+import pandas as pd
+
+from .cohorts import COHORT_COLUMNS, build_cohort_counts
+from .cube import build_cube
+from .data_cache import file_fingerprint, memoize
+from .logistics import build_state_pairs
+from .schema import apply_schema
+from .sellers import SELLER_COLUMNS, build_seller_table
+from .spatial import build_map_bins
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SALES_PATH = os.path.join(ROOT_DIR, 'cleaned_sales_data.parquet')
+CUBE_PATH = os.path.join(ROOT_DIR, 'sales_cube.parquet')
+SELLERS_PATH = os.path.join(ROOT_DIR, 'seller_stats.parquet')
+COHORTS_PATH = os.path.join(ROOT_DIR, 'customer_cohorts.parquet')
+MAP_BINS_PATH = os.path.join(ROOT_DIR, 'map_bins.parquet')
+STATE_PAIRS_PATH = os.path.join(ROOT_DIR, 'state_pairs.parquet')
+
+
+def source_path(file_path=SALES_PATH):
+    '''File the sales data is read from: the typed Parquet export of file_path when it exists, otherwise the CSV'''
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    return parquet_path if os.path.exists(parquet_path) else os.path.splitext(file_path)[0] + '.csv'
+
+
+def load_data(file_path=SALES_PATH, columns=None, encoding='utf-8'):
+    '''Fetch data from source file. The typed Parquet export of file_path is read when it exists,
+    otherwise the CSV is parsed and given pandas-specific data type transformation.
+    Results are cached for the whole process, keyed on the file's path, mtime and size.
+    columns: optional list of the columns to read
+    return: the transformed dataframe'''
+    columns = tuple(columns) if columns is not None else None
+    return _read_data(file_fingerprint(source_path(file_path)), columns, encoding)
+
+
+@memoize
+def _read_data(fingerprint, columns, encoding):
+    '''Read the file identified by fingerprint. Only called on a cache miss.'''
+    file_path = fingerprint[0]
+    usecols = list(columns) if columns is not None else None
+    if file_path.endswith('.parquet'):
+        df = pd.read_parquet(file_path, columns=usecols)
+    else:
+        df = pd.read_csv(file_path, encoding=encoding, usecols=usecols)
+
+    # Dtypes are stored in the Parquet file, so this only casts CSV columns and older exports
+    df = apply_schema(df)
+    df.attrs['fingerprint'] = (fingerprint, columns)
+    return df
+
+
+def load_derived(file_path, builder, data_path=SALES_PATH, columns=None):
+    '''Fetch a frame the ETL derives from the sales data and writes to file_path.
+    When the file is missing, builder is run on the sales data in data_path instead.
+    columns: the columns of the sales data builder needs, all when None
+    return: the derived dataframe'''
+    if os.path.exists(file_path):
+        return _read_derived(file_fingerprint(file_path))
+    return _build_derived(builder, load_data(data_path, columns=columns))
+
+
+@memoize
+def _read_derived(fingerprint):
+    derived = pd.read_parquet(fingerprint[0])
+    derived.attrs['fingerprint'] = fingerprint
+    return derived
+
+
+@memoize
+def _build_derived(builder, df):
+    derived = builder(df)
+    derived.attrs['fingerprint'] = (builder.__name__, df.attrs.get('fingerprint'))
+    return derived
+
+
+def load_cube(file_path=CUBE_PATH, data_path=SALES_PATH):
+    '''Fetch the monthly rollup cube'''
+    return load_derived(file_path, build_cube, data_path)
+
+
+def load_sellers(file_path=SELLERS_PATH, data_path=SALES_PATH):
+    '''Fetch the per-seller table, sorted by seller_id'''
+    return load_derived(file_path, build_seller_table, data_path, SELLER_COLUMNS)
+
+
+def load_cohorts(file_path=COHORTS_PATH, data_path=SALES_PATH):
+    '''Fetch the cohort counts'''
+    return load_derived(file_path, build_cohort_counts, data_path, COHORT_COLUMNS)
+
+
+def load_map_bins(file_path=MAP_BINS_PATH, data_path=SALES_PATH):
+    '''Fetch the map bins. All sales columns are read, as older exports lack some of the coordinates.'''
+    return load_derived(file_path, build_map_bins, data_path)
+
+
+def load_state_pairs(file_path=STATE_PAIRS_PATH, data_path=SALES_PATH):
+    '''Fetch the (seller_state, customer_state) table. All sales columns are read, as older exports
+    lack the distance and delivery days columns.'''
+    return load_derived(file_path, build_state_pairs, data_path)
@@ -0,0 +1,106 @@
+'''Shipping distance, delivery time and freight cost, per item and per (seller state, customer state).
+
+The great-circle distance between seller and customer and the delivery days are computed as
+array operations over whole columns, when the ETL selects the dashboard columns, so every sales
+row carries its distance_km and delivery_days. The ETL also aggregates them to one row per
+(seller_state, customer_state) pair (state_pairs.parquet), which is all the Logistics page reads.
+'''
+import numpy as np
+import pandas as pd
+
+from .data_cache import memoize
+
+# Mean radius of the Earth
+EARTH_RADIUS_KM = 6371.0088
+
+PAIR_DIMENSIONS = ['seller_state', 'customer_state']
+
+# Measures of the state pairs the Logistics page can show
+PAIR_MEASURES = ['freight_per_km', 'distance_km', 'delivery_days', 'freight_value', 'items']
+
+_DAY_NS = 24 * 3600 * 10**9
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    '''Great-circle distance in km between arrays of points given in degrees, NaN where a coordinate is missing'''
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(values, dtype='float64')) for values in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def delivery_days(purchased, delivered):
+    '''Days from purchase to delivery to the customer, NaN where either date is missing'''
+    purchased = pd.to_datetime(purchased, errors='coerce').to_numpy(dtype='datetime64[ns]')
+    delivered = pd.to_datetime(delivered, errors='coerce').to_numpy(dtype='datetime64[ns]')
+    days = (delivered - purchased).astype('int64') / _DAY_NS
+    days[np.isnat(purchased) | np.isnat(delivered)] = np.nan
+    return days
+
+
+def _item_measures(df):
+    '''distance_km and delivery_days of every row of df, computed when df is an older export without them'''
+    if 'distance_km' in df.columns:
+        distance = df['distance_km'].to_numpy(dtype='float64')
+    elif 'seller_lat' in df.columns and 'customer_lat' in df.columns:
+        distance = haversine_km(df['seller_lat'], df['seller_lng'], df['customer_lat'], df['customer_lng'])
+    else:
+        distance = np.full(len(df), np.nan)
+    if 'delivery_days' in df.columns:
+        days = df['delivery_days'].to_numpy(dtype='float64')
+    else:
+        days = delivery_days(df['order_purchase_timestamp'], df['order_delivered_customer_date'])
+    return distance, days
+
+
+def build_state_pairs(df):
+    '''Aggregate sales rows to one row per (seller_state, customer_state).
+    Freight per km is the freight of the rows with a known distance over their total distance.
+    return: dataframe with the PAIR_DIMENSIONS, items, orders, total_km and the PAIR_MEASURES, sorted by the pair'''
+    distance, days = _item_measures(df)
+    freight = df['freight_value'].to_numpy(dtype='float64')
+    located = ~np.isnan(distance)
+    rows = df[PAIR_DIMENSIONS + ['order_id']].assign(
+        freight_value=freight,
+        located_freight=np.where(located, freight, np.nan),
+        distance_km=distance,
+        delivery_days=days)
+
+    pairs = rows.groupby(PAIR_DIMENSIONS, observed=True, sort=True).agg(
+        items=('freight_value', 'size'),
+        orders=('order_id', 'nunique'),
+        freight_value=('freight_value', 'sum'),
+        located_freight=('located_freight', 'sum'),
+        total_km=('distance_km', 'sum'),
+        distance_km=('distance_km', 'mean'),
+        delivery_days=('delivery_days', 'mean')).reset_index()
+
+    total_km = pairs['total_km'].to_numpy()
+    located_freight = pairs.pop('located_freight').to_numpy()
+    pairs['freight_per_km'] = np.divide(located_freight, total_km, out=np.full(len(pairs), np.nan), where=total_km > 0)
+    for column in PAIR_DIMENSIONS:
+        pairs[column] = pairs[column].astype(str)
+    return pairs.astype({'items': 'int32', 'orders': 'int32'})
+
+
+def refresh_state_pairs(table, sales, pairs):
+    '''Rebuild the rows of the given (seller_state, customer_state) pairs only, from the full sales rows'''
+    pairs = pd.MultiIndex.from_tuples(sorted(pairs), names=PAIR_DIMENSIONS)
+    kept = table[~pd.MultiIndex.from_frame(table[PAIR_DIMENSIONS]).isin(pairs)]
+    # The levels of categorical columns are their categories, so the states are not decoded for every row
+    in_pairs = pd.MultiIndex.from_frame(sales[PAIR_DIMENSIONS]).isin(pairs)
+    rebuilt = build_state_pairs(sales[in_pairs])
+    return pd.concat([kept, rebuilt], ignore_index=True).sort_values(PAIR_DIMENSIONS, ignore_index=True)
+
+
+@memoize
+def pair_matrix(pairs, measure='freight_per_km', min_items=1):
+    '''One measure of the state pairs as a matrix, seller states down and customer states across.
+    Pairs with fewer than min_items items are missing.
+    return: dataframe indexed by seller_state'''
+    pairs = pairs[pairs['items'] >= min_items]
+    sellers = pd.Index(pairs['seller_state'].unique()).sort_values()
+    customers = pd.Index(pairs['customer_state'].unique()).sort_values()
+    matrix = np.full((len(sellers), len(customers)), np.nan)
+    matrix[sellers.get_indexer(pairs['seller_state']), customers.get_indexer(pairs['customer_state'])] = \
+        pairs[measure].to_numpy(dtype='float64')
+    return pd.DataFrame(matrix, index=sellers.rename('seller_state'), columns=customers.rename('customer_state'))
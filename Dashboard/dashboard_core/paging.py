@@ -0,0 +1,104 @@
+'''Paging for the raw data viewer.
+
+st.dataframe(sales_df) serializes the whole table to the browser on every rerun.
+The viewer in Dashboard/data_viewer.py sends one page instead. Rows are sorted through an
+argsort cached per frame and column, sliced on the server, and the page size is reduced for
+every page to stay under MAX_PAGE_BYTES, from the size of the largest row of each column.
+Categorical columns only carry the categories on the page, so the Arrow payload does not include
+every id of the table.
+'''
+import math
+import sys
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .data_cache import memoize
+
+MAX_PAGE_BYTES = 1_000_000
+PAGE_SIZES = [25, 50, 100, 250, 500]
+
+
+@memoize
+def sort_order(df, column, ascending=True):
+    '''Row positions of df ordered by column, missing values last. Computed once per frame, column and direction.'''
+    values = df[column].reset_index(drop=True)
+    if isinstance(values.dtype, pd.CategoricalDtype) and not values.cat.ordered:
+        # Unordered categories sort by code, so put the codes in alphabetical order first
+        values = values.cat.reorder_categories(values.cat.categories.sort_values())
+    return values.sort_values(ascending=ascending, kind='stable', na_position='last').index.to_numpy()
+
+
+def _plain(page):
+    '''Drop the categories not used on the page, so they are not serialized with it'''
+    categorical = [col for col in page.columns if isinstance(page[col].dtype, pd.CategoricalDtype)]
+    return page.assign(**{col: page[col].cat.remove_unused_categories() for col in categorical})
+
+
+def _max_value_bytes(values):
+    '''Bytes of the largest value of values, as memory_usage(deep=True) counts them'''
+    if not len(values):
+        return 0
+    if values.dtype == object or (isinstance(values.dtype, pd.StringDtype) and values.dtype.storage == 'python'):
+        # A pointer to the object, plus the object
+        return 8 + max(map(sys.getsizeof, values))
+    if isinstance(values.dtype, pd.StringDtype):
+        # Arrow strings: a 64-bit offset and a validity bit, plus the UTF-8 bytes
+        return 9 + (pc.max(pc.binary_length(pa.array(values))).as_py() or 0)
+    return math.ceil(values.memory_usage(index=False, deep=True) / len(values))
+
+
+@memoize
+def max_row_bytes(df, column):
+    '''Upper bound on the bytes one row of df[column] adds to a page. Computed once per frame and column.'''
+    values = df[column]
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # A row adds its code, and at most one category not already on the page
+        return values.cat.codes.dtype.itemsize + _max_value_bytes(values.cat.categories.to_series())
+    return _max_value_bytes(values)
+
+
+def page_size_limit(df, columns, max_bytes=MAX_PAGE_BYTES):
+    '''Number of rows of df[columns] that fit in max_bytes wherever they are taken from.
+    Each row is counted at the size of the largest row, so every page stays under max_bytes.'''
+    # The index of a page holds the 8-byte row labels
+    per_row = 8 + sum(max_row_bytes(df, column) for column in columns)
+    return max(1, max_bytes // per_row)
+
+
+@dataclass(frozen=True)
+class Page:
+    '''One page of rows, with its position in the table'''
+    rows: pd.DataFrame
+    number: int
+    count: int
+    first: int
+    total: int
+    page_size: int
+
+    @property
+    def last(self):
+        return self.first + len(self.rows)
+
+
+def get_page(df, columns=None, sort_by=None, ascending=True, page=1, page_size=100, max_bytes=MAX_PAGE_BYTES):
+    '''Slice one page of df[columns], sorted by sort_by.
+    The page size is reduced so pages stay under max_bytes, the same size for every page so that
+    consecutive pages cover every row; page is clipped to the valid range.
+    return: Page with the page_size actually used'''
+    columns = list(columns) if columns else list(df.columns)
+    page_size = max(1, min(page_size, page_size_limit(df, columns, max_bytes)))
+    count = max(1, math.ceil(len(df) / page_size))
+    number = min(max(1, int(page)), count)
+    start = (number - 1) * page_size
+    stop = min(start + page_size, len(df))
+
+    if sort_by is not None:
+        positions = sort_order(df, sort_by, ascending)[start:stop]
+    else:
+        positions = np.arange(start, stop)
+    rows = _plain(df.iloc[positions, df.columns.get_indexer(columns)])
+    return Page(rows=rows, number=number, count=count, first=start, total=len(df), page_size=page_size)
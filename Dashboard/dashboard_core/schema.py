@@ -0,0 +1,101 @@
+'''Declared dtypes of the cleaned sales table, shared by the ETL and the dashboard.
+
+- The product and seller ids, repeated on many rows, are dictionary encoded as categoricals:
+  integer codes plus one copy of each id.
+- The order and customer ids are nearly unique per row, so a dictionary would hold a copy of almost
+  every id plus the codes. They are Arrow strings instead: the 32 chars of every id packed in one
+  buffer, without a Python object per id.
+- Zip code prefixes are stored as small integers rather than strings.
+- Money, coordinates, distances and delivery days are float32, review scores and item numbers Int8.
+- Order status and payment type are ordered categoricals, other named columns unordered ones.
+
+Aggregations that sum float32 columns should upcast to float64 first, as build_cube does.
+'''
+import pandas as pd
+
+ORDER_STATUSES = ['Unavailable', 'Created', 'Invoiced', 'Approved', 'Processing', 'Shipped', 'Canceled', 'Delivered',]
+PAYMENT_TYPES = ['Credit Card', 'Debit Card', 'Voucher', 'Boleto', 'Not Defined',]
+
+ORDERED_CATEGORIES = {
+    'order_status': ORDER_STATUSES,
+    'payment_type': PAYMENT_TYPES,
+    }
+
+ID_COLUMNS = ['order_id', 'customer_id', 'product_id', 'seller_id', 'customer_unique_id']
+
+ID_STRING = pd.StringDtype('pyarrow')
+
+SALES_SCHEMA = {
+    'order_id': ID_STRING,
+    'customer_id': ID_STRING,
+    'order_status': pd.CategoricalDtype(ORDER_STATUSES, ordered=True),
+    'order_purchase_timestamp': 'datetime64[ns]',
+    'order_approved_at': 'datetime64[ns]',
+    'order_delivered_customer_date': 'datetime64[ns]',
+    'review_score': 'Int8',
+    'payment_type': pd.CategoricalDtype(PAYMENT_TYPES, ordered=True),
+    'payment_value': 'float32',
+    'order_item_id': 'Int8',
+    'product_id': 'category',
+    'seller_id': 'category',
+    'price': 'float32',
+    'freight_value': 'float32',
+    'product_category_name_english': 'category',
+    'seller_zip_code_prefix': 'Int32',
+    'seller_city': 'category',
+    'seller_state': 'category',
+    'seller_lat': 'float32',
+    'seller_lng': 'float32',
+    'customer_unique_id': ID_STRING,
+    'customer_zip_code_prefix': 'Int32',
+    'customer_city': 'category',
+    'customer_state': 'category',
+    'customer_lat': 'float32',
+    'customer_lng': 'float32',
+    'distance_km': 'float32',
+    'delivery_days': 'float32',
+    'year': 'int16',
+    'month': 'int8',
+    }
+
+
+def _matches(dtype, target):
+    '''True when a column of dtype needs no cast to reach target'''
+    if isinstance(target, (pd.CategoricalDtype, pd.StringDtype)):
+        return dtype == target
+    if target == 'category':
+        return isinstance(dtype, pd.CategoricalDtype)
+    return str(dtype) == target
+
+
+def apply_schema(df, schema=SALES_SCHEMA):
+    '''Cast the columns of df that are in schema and don't already have its dtype.
+    Values outside the declared categories become missing.
+    return: the typed dataframe'''
+    casts = {}
+    for column, target in schema.items():
+        if column not in df.columns or _matches(df[column].dtype, target):
+            continue
+        values = df[column]
+        if str(target).startswith('Int') and not pd.api.types.is_numeric_dtype(values.dtype):
+            values = pd.to_numeric(values.astype('object'), errors='coerce')
+        elif str(target).startswith('datetime64'):
+            values = pd.to_datetime(values, errors='coerce')
+        elif isinstance(values.dtype, pd.CategoricalDtype) and target != 'category':
+            # Decode to plain values first, missing values become NaN
+            values = pd.Series(values.to_numpy(), index=values.index)
+        casts[column] = values.astype(target)
+    return df.assign(**casts) if casts else df
+
+
+def memory_report(before, after):
+    '''Memory used by each column before and after applying the schema.
+    return: dataframe with dtype and MB columns for both frames, plus a total row'''
+    report = pd.DataFrame({
+        'dtype_before': before.dtypes.astype(str),
+        'mb_before': before.memory_usage(index=False, deep=True) / 1e6,
+        'dtype_after': after.dtypes.astype(str),
+        'mb_after': after.memory_usage(index=False, deep=True) / 1e6,
+    })
+    report.loc['total'] = ['', report.mb_before.sum(), '', report.mb_after.sum()]
+    return report.round(2)
@@ -0,0 +1,135 @@
+'''Per-seller leaderboard and drill-down for the Merchants page.
+
+The ETL aggregates the cleaned sales rows to one row per seller_id (seller_stats.parquet):
+revenue, orders, items, cancellations, average review score and average delivery days.
+Leaderboards pick the top k sellers with np.argpartition and only sort those k rows.
+Drill-down into one seller goes through an index of the sales rows grouped by seller, built
+once per data version, so it slices the seller's rows instead of masking the whole table.
+'''
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import memoize
+from .logistics import delivery_days
+
+# Columns of the cleaned sales data the seller table is built from
+SELLER_COLUMNS = ['seller_id', 'seller_city', 'seller_state', 'order_id', 'order_status', 'payment_value',
+                  'review_score', 'order_purchase_timestamp', 'order_delivered_customer_date']
+
+# Measures of the seller table a leaderboard can rank by
+MEASURES = ['revenue', 'orders', 'items', 'cancellations', 'review_score', 'delivery_days']
+
+def build_seller_table(df):
+    '''Aggregate sales rows (one per order item) to one row per seller.
+    Orders, cancellations, review scores and delivery days are counted once per (seller, order).
+    return: dataframe sorted by seller_id, with seller_id, seller_city, seller_state and the MEASURES'''
+    df = df[df['seller_id'].notna()]
+    sellers = df['seller_id'].astype('category')
+    orders = df['order_id'].astype('category')
+    seller_codes = sellers.cat.codes.to_numpy()
+    order_keys = seller_codes.astype('int64') * (len(orders.cat.categories) + 1) + orders.cat.codes.to_numpy() + 1
+    first_row = ~pd.Series(order_keys).duplicated().to_numpy()
+
+    days = delivery_days(df['order_purchase_timestamp'], df['order_delivered_customer_date'])
+    review_score = df['review_score'].astype('float64').to_numpy()
+
+    rows = pd.DataFrame({
+        'seller': seller_codes,
+        'revenue': df['payment_value'].to_numpy(dtype='float64'),
+        'orders': first_row,
+        'cancellations': first_row & (df['order_status'] == 'Canceled').to_numpy(),
+        'review_score': np.where(first_row, review_score, np.nan),
+        'delivery_days': np.where(first_row, days, np.nan),
+    })
+    table = rows.groupby('seller', sort=True).agg(
+        revenue=('revenue', 'sum'),
+        orders=('orders', 'sum'),
+        items=('revenue', 'size'),
+        cancellations=('cancellations', 'sum'),
+        review_score=('review_score', 'mean'),
+        delivery_days=('delivery_days', 'mean'))
+
+    # City and state of the first row of every seller
+    first = pd.Series(np.arange(len(df))).groupby(seller_codes).first().to_numpy()
+    table.insert(0, 'seller_id', sellers.cat.categories[table.index.to_numpy()].astype(str))
+    table.insert(1, 'seller_city', df['seller_city'].to_numpy()[first])
+    table.insert(2, 'seller_state', df['seller_state'].to_numpy()[first])
+    table = table.astype({'orders': 'int32', 'items': 'int32', 'cancellations': 'int32',
+                          'review_score': 'float32', 'delivery_days': 'float32'})
+    return table.sort_values('seller_id', ignore_index=True)
+
+
+def refresh_seller_table(table, sales, seller_ids):
+    '''Rebuild the rows of the given sellers only, from the full sales rows'''
+    # isin on a categorical column compares codes, the ids are not decoded for every row
+    seller_ids = list(seller_ids)
+    kept = table[~table['seller_id'].isin(seller_ids)]
+    rebuilt = build_seller_table(sales[sales['seller_id'].isin(seller_ids)])
+    return pd.concat([kept, rebuilt], ignore_index=True).sort_values('seller_id', ignore_index=True)
+
+
+@memoize
+def top_sellers(table, k=10, by='revenue', ascending=False):
+    '''The k sellers with the highest (or lowest) value of by, best first.
+    Sellers where by is missing are ranked last.'''
+    values = table[by].to_numpy(dtype='float64')
+    keys = np.where(np.isnan(values), np.inf, values if ascending else -values)
+    k = min(k, len(keys))
+    if k == 0:
+        return table.iloc[:0]
+    candidates = np.argpartition(keys, k - 1)[:k] if k < len(keys) else np.arange(len(keys))
+    # Within the k rows, ties are broken by seller_id, the order of the table
+    best = candidates[np.lexsort((candidates, keys[candidates]))]
+    return table.iloc[best].reset_index(drop=True)
+
+
+@dataclass(frozen=True)
+class SellerIndex:
+    '''Row positions of the sales data grouped by seller: the rows of the seller with code c
+    are positions[starts[c]:starts[c + 1]], in their original order'''
+    categories: pd.Index
+    positions: np.ndarray
+    starts: np.ndarray
+
+    @property
+    def nbytes(self):
+        return self.positions.nbytes + self.starts.nbytes
+
+    def rows_of(self, seller_id):
+        '''Positions of the rows of seller_id, empty when it has none'''
+        code = self.categories.get_indexer([seller_id])[0]
+        if code < 0:
+            return self.positions[:0]
+        return self.positions[self.starts[code]:self.starts[code + 1]]
+
+
+@memoize
+def seller_index(df):
+    '''Group the row positions of df by seller, with one stable argsort'''
+    sellers = df['seller_id'] if isinstance(df['seller_id'].dtype, pd.CategoricalDtype) \
+        else df['seller_id'].astype('category')
+    codes = sellers.cat.codes.to_numpy()
+    positions = np.argsort(codes, kind='stable')
+    # Rows without a seller (code -1) sort first and are skipped by the offsets
+    starts = np.searchsorted(codes[positions], np.arange(len(sellers.cat.categories) + 1))
+    return SellerIndex(categories=sellers.cat.categories, positions=positions, starts=starts)
+
+
+def seller_rows(df, seller_id):
+    '''Sales rows of one seller, sliced through the seller index'''
+    result = df.iloc[seller_index(df).rows_of(seller_id)]
+    fingerprint = df.attrs.get('fingerprint')
+    result.attrs['fingerprint'] = ('seller', fingerprint, seller_id) if fingerprint else None
+    return result
+
+
+@memoize
+def seller_monthly_revenue(df, seller_id):
+    '''Revenue of one seller per month of purchase'''
+    rows = seller_rows(df, seller_id)
+    months = pd.PeriodIndex.from_fields(year=rows['year'].astype('int64'), month=rows['month'].astype('int64'),
+                                        freq='M') if len(rows) else pd.PeriodIndex([], freq='M')
+    revenue = rows['payment_value'].astype('float64').groupby(months).sum()
+    return revenue.rename_axis('month')
@@ -0,0 +1,134 @@
+'''Customer and seller locations binned into square grid cells, for the map of the Map page.
+
+Each sales row is counted in the cell holding its customer, and in the cell holding its seller,
+at every zoom level of LEVELS. A cell is identified by integer column and row numbers on a grid
+of the level's cell size in degrees. Like the cube, the bins keep the year, month and sidebar
+filter columns, so the page filters them with filter_cube and then sums the cells inside the
+viewport: the browser only receives the non-empty cells, never the order points.
+'''
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .data_cache import memoize
+from .filters import FILTER_COLUMNS, filter_cube
+
+# Cell size in degrees of each zoom level
+LEVELS = {3: 4.0, 4: 2.0, 5: 1.0, 6: 0.5, 7: 0.25}
+
+PARTIES = ['customer', 'seller']
+
+BIN_DIMENSIONS = ['party', 'level', 'year', 'month', *FILTER_COLUMNS.values(), 'cell_x', 'cell_y']
+
+
+@dataclass(frozen=True)
+class Bounds:
+    '''Viewport of the map in degrees'''
+    south: float
+    west: float
+    north: float
+    east: float
+
+    @classmethod
+    def around(cls, lat, lng, level):
+        '''Viewport of about 16 cells of level across, centered on (lat, lng)'''
+        half = 8 * LEVELS[level]
+        return cls(south=lat - half / 2, west=lng - half, north=lat + half / 2, east=lng + half)
+
+
+def cell_numbers(lat, lng, size):
+    '''Column and row numbers of the cells of size degrees holding the points.
+    return: (cell_x, cell_y) int32 arrays'''
+    cell_x = np.floor((np.asarray(lng, dtype='float64') + 180) / size).astype('int32')
+    cell_y = np.floor((np.asarray(lat, dtype='float64') + 90) / size).astype('int32')
+    return cell_x, cell_y
+
+
+def build_map_bins(df):
+    '''Revenue, rows and orders per (party, level, year, month, filter columns, cell).
+    The rows of one order can fall in several bins, with items in several categories or from sellers
+    in several cells, so each row counts for an equal share of its order: the orders of any set of
+    bins add up without counting an order twice.
+    Rows without coordinates for a party are left out of that party's bins, and a party without
+    coordinate columns in df (older exports have no seller coordinates) gets no bins.
+    return: dataframe with the BIN_DIMENSIONS and the measures, sorted by party, level, year and month'''
+    dimensions = ['year', 'month', *FILTER_COLUMNS.values()]
+    bins = []
+    for party in PARTIES:
+        if '{}_lat'.format(party) not in df.columns:
+            continue
+        lat = df['{}_lat'.format(party)].to_numpy(dtype='float64')
+        lng = df['{}_lng'.format(party)].to_numpy(dtype='float64')
+        located = ~(np.isnan(lat) | np.isnan(lng))
+        rows = df.loc[located, dimensions + ['order_id']].assign(
+            payment_value=df['payment_value'].to_numpy(dtype='float64')[located])
+        rows['order_share'] = 1 / rows.groupby('order_id', sort=False)['order_id'].transform('size')
+        for level, size in LEVELS.items():
+            cell_x, cell_y = cell_numbers(lat[located], lng[located], size)
+            grouped = rows.assign(cell_x=cell_x, cell_y=cell_y).groupby(
+                dimensions + ['cell_x', 'cell_y'], observed=True, dropna=False, sort=True).agg(
+                payment_value=('payment_value', 'sum'),
+                rows=('payment_value', 'size'),
+                orders=('order_share', 'sum'))
+            bins.append(grouped.reset_index().assign(party=party, level=np.int8(level)))
+
+    result = pd.concat(bins, ignore_index=True)[BIN_DIMENSIONS + ['payment_value', 'rows', 'orders']]
+    result['party'] = pd.Categorical(result['party'], categories=PARTIES)
+    result['year'] = result['year'].astype('int16')
+    result['month'] = result['month'].astype('int8')
+    for column in FILTER_COLUMNS.values():
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            result[column] = result[column].astype(df[column].dtype)
+    return result.sort_values(['party', 'level', 'year', 'month'], kind='stable', ignore_index=True)
+
+
+def refresh_map_bins(bins, sales, months):
+    '''Re-bin the sales rows of the given (year, month) pairs only'''
+    bin_months = pd.MultiIndex.from_frame(bins[['year', 'month']].astype('int64'))
+    sales_months = pd.MultiIndex.from_frame(sales[['year', 'month']].astype('int64'))
+    months = pd.MultiIndex.from_tuples(sorted(months), names=['year', 'month'])
+
+    kept = bins[~bin_months.isin(months)]
+    rebuilt = build_map_bins(sales[sales_months.isin(months)])
+    result = pd.concat([kept, rebuilt], ignore_index=True)
+    for column in FILTER_COLUMNS.values():
+        if not isinstance(result[column].dtype, pd.CategoricalDtype):
+            result[column] = result[column].astype('category')
+    return result.sort_values(['party', 'level', 'year', 'month'], kind='stable', ignore_index=True)
+
+
+@memoize
+def level_bins(bins, party, level):
+    '''Bins of one party at one zoom level, sorted by year and month as filter_cube requires'''
+    codes = bins['party'].cat.codes.to_numpy().astype('int64') * 256 + bins['level'].to_numpy(dtype='int64')
+    key = PARTIES.index(party) * 256 + level
+    start, stop = np.searchsorted(codes, [key, key + 1])
+    result = bins.iloc[start:stop]
+    fingerprint = bins.attrs.get('fingerprint')
+    result.attrs['fingerprint'] = ('level', fingerprint, party, level) if fingerprint else None
+    return result
+
+
+@memoize
+def map_cells(bins, party, level, filters, bounds=None):
+    '''Non-empty cells of one party and zoom level matching filters, inside bounds when given.
+    return: dataframe with the cell center (lat, lng), payment_value, rows and orders'''
+    filtered = filter_cube(level_bins(bins, party, level), filters)
+    size = LEVELS[level]
+    cell_x = filtered['cell_x'].to_numpy()
+    cell_y = filtered['cell_y'].to_numpy()
+    if bounds is not None:
+        (west, east), (south, north) = cell_numbers([bounds.south, bounds.north], [bounds.west, bounds.east], size)
+        inside = (cell_x >= west) & (cell_x <= east) & (cell_y >= south) & (cell_y <= north)
+        filtered, cell_x, cell_y = filtered[inside], cell_x[inside], cell_y[inside]
+
+    cells = filtered[['payment_value', 'rows', 'orders']].groupby([cell_x, cell_y]).sum()
+    cell_x, cell_y = (cells.index.get_level_values(i).to_numpy() for i in range(2))
+    return pd.DataFrame({
+        'lat': (cell_y + 0.5) * size - 90,
+        'lng': (cell_x + 0.5) * size - 180,
+        'payment_value': cells['payment_value'].to_numpy(),
+        'rows': cells['rows'].to_numpy(),
+        'orders': cells['orders'].to_numpy(),
+    })
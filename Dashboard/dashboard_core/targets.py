@@ -0,0 +1,143 @@
+'''Revenue targets of the company and its teams, and their year-to-date revenue.
+
+Targets are read from targets.json in the repository root. Each entry counts the revenue of the
+orders matching its selection of order statuses, customer states and product categories; an
+empty selection counts every order.
+
+Year-to-date revenue is a running total per target and year, written by the ETL next to the
+cube as revenue_ytd.parquet, with the targets it was computed for in its metadata. The full
+build computes it once from the cube. An incremental refresh adds the revenue of the new rows
+and subtracts the revenue of the rows they replace, so the year is never summed again.
+'''
+import json
+import os
+from dataclasses import dataclass
+
+import pandas as pd
+
+from .data_cache import file_fingerprint, memoize
+from .filters import FILTER_COLUMNS
+from .loading import CUBE_PATH, ROOT_DIR, SALES_PATH, load_cube
+
+TARGETS_PATH = os.path.join(ROOT_DIR, 'targets.json')
+REVENUE_PATH = os.path.join(ROOT_DIR, 'revenue_ytd.parquet')
+
+REVENUE_COLUMNS = ['name', 'year', 'revenue']
+
+
+@dataclass(frozen=True)
+class Target:
+    '''Revenue target of the company or a team, and the orders its revenue is counted on'''
+    name: str
+    target: float
+    order_status: tuple = ()
+    customer_state: tuple = ()
+    product_category: tuple = ()
+
+    @property
+    def selection(self):
+        '''The selection as text, stored with the running totals to detect edited targets'''
+        return json.dumps({name: list(getattr(self, name)) for name in FILTER_COLUMNS})
+
+
+def _definitions(targets):
+    return [[target.name, target.selection] for target in targets]
+
+
+@dataclass(frozen=True)
+class Targets:
+    '''The company target, shown as the donut, and the team targets, shown as gauges'''
+    company: Target
+    teams: tuple
+
+    def __iter__(self):
+        yield self.company
+        yield from self.teams
+
+
+def _target(entry):
+    return Target(name=entry['name'], target=float(entry['target']),
+                  **{name: tuple(entry.get(name, ())) for name in FILTER_COLUMNS})
+
+
+def load_targets(path=TARGETS_PATH):
+    '''Targets defined in the JSON file at path, cached until the file changes'''
+    return _read_targets(file_fingerprint(path))
+
+
+@memoize
+def _read_targets(fingerprint):
+    with open(fingerprint[0], encoding='utf-8') as targets_file:
+        config = json.load(targets_file)
+    return Targets(company=_target(config['company']), teams=tuple(_target(entry) for entry in config['teams']))
+
+
+def _selected(df, target):
+    '''Boolean mask of the rows of df counted towards target'''
+    mask = pd.Series(True, index=df.index)
+    for name, column in FILTER_COLUMNS.items():
+        selected = getattr(target, name)
+        if selected:
+            mask &= df[column].isin(selected)
+    return mask
+
+
+def revenue_by_year(df, targets):
+    '''Revenue of every target per year, from the sales rows or the cube.
+    return: dataframe with the REVENUE_COLUMNS'''
+    payment_value = df['payment_value'].astype('float64')
+    frames = []
+    for target in targets:
+        mask = (_selected(df, target) & df['year'].notna()).to_numpy()
+        revenue = payment_value[mask].groupby(df['year'][mask].astype('int64')).sum()
+        frames.append(pd.DataFrame({'name': target.name, 'year': revenue.index.to_numpy(dtype='int64'),
+                                    'revenue': revenue.to_numpy()}))
+    result = pd.concat(frames, ignore_index=True)[REVENUE_COLUMNS]
+    # Saved in the Parquet metadata, so edited targets are detected when the totals are read
+    result.attrs['targets'] = _definitions(targets)
+    return result
+
+
+def accumulate(revenue, targets, added=None, removed=None):
+    '''Update the running totals with the revenue of added rows, minus the revenue of removed rows.
+    return: dataframe with the REVENUE_COLUMNS'''
+    keys = ['name', 'year']
+    totals = revenue.set_index(keys)['revenue']
+    if added is not None and len(added):
+        totals = totals.add(revenue_by_year(added, targets).set_index(keys)['revenue'], fill_value=0)
+    if removed is not None and len(removed):
+        totals = totals.sub(revenue_by_year(removed, targets).set_index(keys)['revenue'], fill_value=0)
+    result = totals.reset_index()[REVENUE_COLUMNS]
+    result.attrs['targets'] = _definitions(targets)
+    return result
+
+
+def matches(revenue, targets):
+    '''Whether the running totals were computed for these targets'''
+    return revenue.attrs.get('targets') == _definitions(targets)
+
+
+def year_to_date(targets, year, path=REVENUE_PATH, cube_path=CUBE_PATH, sales_path=SALES_PATH):
+    '''Revenue of every target in year, from the running totals written by the ETL.
+    When they are missing or were computed for other targets, they are computed from the cube.
+    return: dict of target name to revenue'''
+    revenue = _read_revenue(file_fingerprint(path)) if os.path.exists(path) else None
+    if revenue is None or not matches(revenue, targets):
+        revenue = _cube_revenue(load_cube(cube_path, sales_path), targets)
+
+    in_year = revenue[revenue['year'] == int(year)]
+    totals = dict(zip(in_year['name'], in_year['revenue']))
+    return {target.name: float(totals.get(target.name, 0.0)) for target in targets}
+
+
+@memoize
+def _read_revenue(fingerprint):
+    revenue = pd.read_parquet(fingerprint[0])
+    revenue.attrs['fingerprint'] = fingerprint
+    return revenue
+
+
+@memoize
+def _cube_revenue(cube, targets):
+    return revenue_by_year(cube, targets)
+
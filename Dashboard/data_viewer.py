@@ -0,0 +1,31 @@
+'''Paged, sortable raw data table, rendered from the pages of the dashboard.
+Paging and sorting are done by dashboard_core.paging.'''
+import streamlit as st
+
+from dashboard_core.paging import MAX_PAGE_BYTES, PAGE_SIZES, get_page
+
+
+def show_table(df, key, columns=None):
+    '''Render df as a paged, sortable table with column selection.
+    key: prefix for the widget keys, unique per page of the app
+    columns: columns shown by default, all when None'''
+    all_columns = list(df.columns)
+    shown = st.multiselect('Columns', options=all_columns, default=columns or all_columns, key=key + '_columns')
+    col1, col2, col3, col4 = st.columns([3, 2, 2, 2])
+    with col1:
+        sort_by = st.selectbox('Sort by', options=[None] + all_columns,
+                               format_func=lambda col: 'Row order' if col is None else col, key=key + '_sort')
+    with col2:
+        ascending = st.radio('Order', options=[True, False], horizontal=True,
+                             format_func=lambda value: 'Ascending' if value else 'Descending', key=key + '_order')
+    with col3:
+        page_size = st.selectbox('Rows per page', options=PAGE_SIZES, index=2, key=key + '_page_size')
+    with col4:
+        number = st.number_input('Page', min_value=1, value=1, step=1, key=key + '_page')
+
+    page = get_page(df, shown, sort_by, ascending, number, page_size)
+    st.dataframe(page.rows, use_container_width=True)
+    note = ' Page size reduced to {} rows to stay under {:.0f} kB.'.format(
+        page.page_size, MAX_PAGE_BYTES / 1e3) if page.page_size < page_size else ''
+    st.caption('Rows {:,}-{:,} of {:,}, page {} of {}.{}'.format(
+        page.first + 1 if page.total else 0, page.last, page.total, page.number, page.count, note))
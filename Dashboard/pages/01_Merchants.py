@@ -1,4 +1,88 @@
-import pandas as pd
 import numpy as np
 import streamlit as st
-import plotly.express as px
\ No newline at end of file
+from millify import millify
+from dashboard_core.data_cache import enable_copy_on_write
+from dashboard_core.figures import cached_figure, leaderboard_figure, monthly_revenue_figure
+from dashboard_core.loading import load_data, load_sellers
+from dashboard_core.sellers import MEASURES, seller_monthly_revenue, seller_rows, top_sellers
+from data_viewer import show_table
+
+# Cached frames are shared by every session, so writes to them must copy
+enable_copy_on_write()
+
+MEASURE_LABELS = {
+    'revenue': 'Revenue',
+    'orders': 'Orders',
+    'items': 'Items Sold',
+    'cancellations': 'Cancellations',
+    'review_score': 'Average Rating',
+    'delivery_days': 'Delivery Days',
+}
+
+st.markdown("#### 🏪 Merchants")
+st.markdown("---")
+
+# One row per seller, precomputed by the ETL
+sellers = load_sellers()
+
+# ---- SIDEBAR ----
+st.sidebar.header("Leaderboard Options")
+with st.sidebar:
+    measure = st.selectbox(label="Rank By", options=MEASURES, format_func=MEASURE_LABELS.get)
+    lowest = st.radio(label="Order", options=[False, True], horizontal=True,
+    format_func=lambda value: 'Lowest first' if value else 'Highest first')
+    top_k = st.slider(label="Sellers", min_value=5, max_value=100, value=20, step=5)
+
+col11, col21, col31, col41 = st.columns(4, gap='medium')
+with col11:
+    st.metric(label='SELLERS', value=millify(len(sellers), precision=2))
+with col21:
+    st.metric(label='REVENUE', value="${}".format(millify(sellers.revenue.sum(), precision=2)))
+with col31:
+    st.metric(label='AVERAGE RATING', value="{:.2f}".format(np.nanmean(sellers.review_score)))
+with col41:
+    st.metric(label='AVERAGE DELIVERY', value="{:.1f} days".format(np.nanmean(sellers.delivery_days)))
+
+# LEADERBOARD
+st.markdown("---")
+st.subheader('Leaderboard')
+leaders = top_sellers(sellers, k=top_k, by=measure, ascending=lowest)
+board_col1, board_col2 = st.columns([3, 2], gap='medium')
+with board_col1:
+    st.plotly_chart(cached_figure(leaderboard_figure, leaders, measure=measure, label=MEASURE_LABELS[measure]),
+                    use_container_width=True)
+with board_col2:
+    st.dataframe(leaders, hide_index=True, use_container_width=True)
+
+# DRILL-DOWN
+st.markdown("---")
+st.subheader('Seller Details')
+detail_col1, detail_col2 = st.columns(2)
+with detail_col1:
+    picked = st.selectbox(label="Seller from the leaderboard", options=list(leaders.seller_id))
+with detail_col2:
+    typed = st.text_input(label="Or any seller id").strip()
+seller_id = typed or picked
+
+position = sellers.seller_id.searchsorted(seller_id) if seller_id else len(sellers)
+if position < len(sellers) and sellers.seller_id.iloc[position] == seller_id:
+    seller = sellers.iloc[position]
+    st.caption('{} - {}'.format(seller['seller_city'], seller['seller_state']))
+    col12, col22, col32, col42 = st.columns(4, gap='medium')
+    with col12:
+        st.metric(label='REVENUE', value="${}".format(millify(seller['revenue'], precision=2)))
+    with col22:
+        st.metric(label='ORDERS', value=int(seller['orders']),
+        help='{} items, {} cancelled orders'.format(int(seller['items']), int(seller['cancellations'])))
+    with col32:
+        st.metric(label='AVERAGE RATING', value="{:.2f}".format(seller['review_score']))
+    with col42:
+        st.metric(label='AVERAGE DELIVERY', value="{:.1f} days".format(seller['delivery_days']))
+
+    # The seller's rows are sliced through an index on seller_id, built once per data version
+    sales_df = load_data()
+    st.plotly_chart(cached_figure(monthly_revenue_figure, seller_monthly_revenue(sales_df, seller_id)),
+                    use_container_width=True)
+    show_table(seller_rows(sales_df, seller_id), key='merchant_data')
+elif seller_id:
+    st.warning('No seller with id {}'.format(seller_id))
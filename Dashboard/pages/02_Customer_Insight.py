@@ -1,7 +1,70 @@
 import pandas as pd
-import numpy as np
 import streamlit as st
-import plotly.express as px
-from Home import load_data
+from millify import millify
+from dashboard_core.cohorts import retention_matrix
+from dashboard_core.customers import RFM_COLUMNS, customer_rfm, segment_summary
+from dashboard_core.data_cache import enable_copy_on_write
+from dashboard_core.figures import cached_figure, retention_figure, segment_share_figure
+from dashboard_core.loading import load_cohorts, load_data
+from data_viewer import show_table
 
-sales_df = st.dataframe(load_data('../cleaned_sales_data.csv'))
\ No newline at end of file
+# Cached frames are shared by every session, so writes to them must copy
+enable_copy_on_write()
+
+st.markdown("#### 👥 Customer Insight")
+st.markdown("---")
+
+# Recency, frequency and monetary value per customer, computed once per version of the data
+rfm = customer_rfm(load_data(columns=RFM_COLUMNS))
+summary = segment_summary(rfm)
+
+# FIRST ROW: CUSTOMER KPIs
+col11, col21, col31, col41 = st.columns(4, gap='medium')
+with col11:
+    st.metric(label='CUSTOMERS', value=millify(len(rfm), precision=2),
+    help='Customers with at least one order that was not canceled or unavailable')
+with col21:
+    st.metric(label='REPEAT CUSTOMERS', value="{}%".format(millify((rfm.frequency > 1).mean() * 100, 2)),
+    help='Share of customers with more than one order')
+with col31:
+    st.metric(label='REVENUE PER CUSTOMER', value="${}".format(millify(rfm.monetary.mean(), precision=2)))
+with col41:
+    st.metric(label='MEDIAN RECENCY', value="{} days".format(int(rfm.recency.median())),
+    help='Days since the last purchase, counted from the last day in the data')
+
+st.markdown("---")
+st.subheader('RFM Segments')
+seg_col1, seg_col2 = st.columns([3, 2], gap='medium')
+with seg_col1:
+    st.plotly_chart(cached_figure(segment_share_figure, summary), use_container_width=True)
+
+with seg_col2:
+    st.dataframe(
+        summary[['customers', 'customer_share', 'revenue', 'revenue_share', 'recency', 'frequency', 'monetary']],
+        column_config={
+            'customers': st.column_config.NumberColumn('Customers', format='%d'),
+            'customer_share': st.column_config.NumberColumn('Customer share', format='percent'),
+            'revenue': st.column_config.NumberColumn('Revenue', format='dollar'),
+            'revenue_share': st.column_config.NumberColumn('Revenue share', format='percent'),
+            'recency': st.column_config.NumberColumn('Recency (days)', format='%.0f'),
+            'frequency': st.column_config.NumberColumn('Orders', format='%.2f'),
+            'monetary': st.column_config.NumberColumn('Revenue per customer', format='dollar'),
+        },
+        use_container_width=True)
+
+# COHORT RETENTION
+st.markdown("---")
+st.subheader('Cohort Retention')
+# Counts per cohort and month precomputed by the ETL, pivoted into the triangle once per version
+cohort_counts = load_cohorts()
+retention = retention_matrix(cohort_counts)
+st.plotly_chart(cached_figure(retention_figure, retention), use_container_width=True)
+with st.expander('Cohort sizes and retention'):
+    sizes = retention_matrix(cohort_counts, rates=False)[0].astype('int64').rename('customers')
+    st.dataframe(pd.concat([sizes, retention.iloc[:, 1:] * 100], axis=1).set_axis(
+        ['customers'] + ['{} mo %'.format(months) for months in retention.columns[1:]], axis=1).rename(index=str),
+        use_container_width=True)
+
+st.markdown("---")
+sales_df = load_data()
+show_table(sales_df, key='customer_data')
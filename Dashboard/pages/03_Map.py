@@ -0,0 +1,74 @@
+import numpy as np
+import streamlit as st
+from millify import millify
+from dashboard_core.data_cache import enable_copy_on_write
+from dashboard_core.figures import cached_figure, map_cells_figure
+from dashboard_core.filters import Filters
+from dashboard_core.home import sidebar_options
+from dashboard_core.loading import load_cube, load_map_bins
+from dashboard_core.spatial import LEVELS, Bounds, map_cells
+
+# Cached frames are shared by every session, so writes to them must copy
+enable_copy_on_write()
+
+# Center of the map when it shows the whole country
+BRAZIL = (-14.2, -51.9)
+
+MEASURE_LABELS = {'payment_value': 'Revenue', 'orders': 'Orders'}
+
+st.markdown("#### 🗺️ Map")
+st.markdown("---")
+
+# Locations binned into grid cells at every zoom level by the ETL
+bins = load_map_bins()
+options = sidebar_options(load_cube())
+
+# ---- SIDEBAR ----
+st.sidebar.header("Map Options")
+with st.sidebar:
+    party = st.radio(label="Locations", options=['customer', 'seller'], horizontal=True,
+    format_func=lambda value: value.title() + 's')
+    measure = st.selectbox(label="Measure", options=list(MEASURE_LABELS), format_func=MEASURE_LABELS.get)
+    level = st.select_slider(label="Zoom", options=list(LEVELS), value=min(LEVELS),
+    help='Cells are {} degrees across at the lowest zoom, halving at every step'.format(LEVELS[min(LEVELS)]))
+    focus = st.selectbox(label="Focus On", options=['Brazil'] + options.customer_states)
+
+    date_range = st.slider(label="Select Date Range",
+    min_value=options.first_month,
+    max_value=options.last_month,
+    value=[options.first_month, options.last_month],
+    format="MM-YY")
+    order_status = st.multiselect(label="Order Status", options=options.order_statuses, placeholder="All statuses")
+    customer_state = st.multiselect(label="Customer State", options=options.customer_states)
+    product_category = st.multiselect(label="Product Category", options=options.product_categories)
+
+filters = Filters.from_widgets(date_range, order_status, customer_state, product_category)
+
+# The viewport is centered on the revenue of the focused state, the cells outside it are not sent
+if focus == 'Brazil':
+    center, bounds = BRAZIL, None
+else:
+    state_cells = map_cells(bins, 'customer', max(LEVELS), Filters(start=filters.start, end=filters.end,
+                                                                   customer_state=(focus,)))
+    weights = state_cells['rows'].to_numpy() if len(state_cells) else None
+    center = (np.average(state_cells['lat'], weights=weights), np.average(state_cells['lng'], weights=weights)) \
+        if len(state_cells) else BRAZIL
+    bounds = Bounds.around(*center, level)
+cells = map_cells(bins, party, level, filters, bounds)
+
+col11, col21, col31 = st.columns(3, gap='medium')
+with col11:
+    st.metric(label='CELLS', value=millify(len(cells), precision=2),
+    help='Grid cells with at least one order in view')
+with col21:
+    st.metric(label='REVENUE', value="${}".format(millify(cells.payment_value.sum(), precision=2)))
+with col31:
+    st.metric(label='ORDERS', value=millify(round(cells.orders.sum()), precision=2),
+    help='Orders with items in view, an order split over several cells or categories counts as a share in each')
+
+if len(cells):
+    st.plotly_chart(cached_figure(map_cells_figure, cells, measure=measure, label=MEASURE_LABELS[measure],
+                                  center_lat=float(center[0]), center_lng=float(center[1]), zoom=level),
+                    use_container_width=True)
+else:
+    st.info('No orders match the filters in this view')
@@ -0,0 +1,54 @@
+import numpy as np
+import streamlit as st
+from millify import millify
+from dashboard_core.data_cache import enable_copy_on_write
+from dashboard_core.figures import cached_figure, pair_matrix_figure
+from dashboard_core.loading import load_state_pairs
+from dashboard_core.logistics import PAIR_MEASURES, pair_matrix
+
+# Cached frames are shared by every session, so writes to them must copy
+enable_copy_on_write()
+
+MEASURE_LABELS = {
+    'freight_per_km': 'Freight per km',
+    'distance_km': 'Distance (km)',
+    'delivery_days': 'Delivery Days',
+    'freight_value': 'Freight',
+    'items': 'Items',
+}
+
+st.markdown("#### 🚚 Logistics")
+st.markdown("---")
+
+# One row per (seller state, customer state), precomputed by the ETL
+pairs = load_state_pairs()
+
+# ---- SIDEBAR ----
+st.sidebar.header("Logistics Options")
+with st.sidebar:
+    measure = st.selectbox(label="Measure", options=PAIR_MEASURES, format_func=MEASURE_LABELS.get)
+    min_items = st.number_input(label="Minimum items per pair", min_value=1, value=10, step=10,
+    help='Pairs with fewer items are left out of the chart and table')
+
+col11, col21, col31, col41 = st.columns(4, gap='medium')
+with col11:
+    st.metric(label='ITEMS SHIPPED', value=millify(pairs['items'].sum(), precision=2))
+with col21:
+    st.metric(label='FREIGHT', value="${}".format(millify(pairs.freight_value.sum(), precision=2)))
+with col31:
+    # Weighted by distance, which gives the freight of the located items over their total distance
+    total_km = pairs.total_km.sum()
+    st.metric(label='FREIGHT PER KM', value="${:.3f}".format(np.nansum(pairs.freight_per_km * pairs.total_km) / total_km)
+    if total_km > 0 else '-', help='Needs seller and customer coordinates')
+with col41:
+    st.metric(label='SAME STATE', value="{}%".format(millify(
+        pairs['items'][pairs.seller_state == pairs.customer_state].sum() / max(pairs['items'].sum(), 1) * 100, 2)),
+    help='Share of items shipped to a customer in the seller\'s state')
+
+st.markdown("---")
+st.plotly_chart(cached_figure(pair_matrix_figure, pair_matrix(pairs, measure, min_items=min_items),
+                              label=MEASURE_LABELS[measure]), use_container_width=True)
+
+st.subheader('State Pairs')
+st.dataframe(pairs[pairs['items'] >= min_items].sort_values(measure, ascending=False),
+             hide_index=True, use_container_width=True)
@@ -0,0 +1,5 @@
+'''ETL for the Olist e-commerce dataset.
+
+The workbook sheets are loaded, typed, deduplicated, joined, enriched, translated and cleaned
+by the stages in etl.pipeline. olist_ecommerce.py is the command-line entry point.
+'''
@@ -0,0 +1,145 @@
+'''Benchmarks of the ETL stages and the dashboard compute paths on synthetic data.
+
+For each scale, the nine tables are generated with etl.synthetic and written as the CSV files of
+the Kaggle release, which hold any number of rows. The full build, from loading those files
+with an empty snapshot cache to the export, is timed stage by stage. The dashboard functions are then timed on the exported files, each one
+cold (frame cache cleared) and warm (served from the cache).
+
+Usage: python olist_ecommerce.py benchmark --orders 100000 1000000 --output benchmark.json
+'''
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+from dataclasses import asdict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from Dashboard.dashboard_core import filters, kpis
+from Dashboard.dashboard_core.cube import build_cube
+from Dashboard.dashboard_core.data_cache import frame_cache
+from Dashboard.dashboard_core.home import compute_home
+from Dashboard.dashboard_core.loading import load_cube, load_data
+from Dashboard.dashboard_core.paging import get_page
+from etl.pipeline import PipelineConfig, run_pipeline
+from etl.synthetic import generate_tables, write_csv_dir
+
+
+def time_call(func, repeat=3, clear=None):
+    '''Best wall time of func over repeat cold calls, and the time of one more warm call.
+    clear: called before each cold call to empty the caches func uses
+    return: (result, cold seconds, warm seconds)'''
+    cold = []
+    for _ in range(repeat):
+        if clear is not None:
+            clear()
+        started = time.perf_counter()
+        result = func()
+        cold.append(time.perf_counter() - started)
+    started = time.perf_counter()
+    func()
+    return result, min(cold), time.perf_counter() - started
+
+
+def benchmark_dashboard(sales_path, cube_path, repeat=3):
+    '''Time the data loading, filtering, KPI and top-ten functions of the Home page.
+    return: list of dicts with the name, cold and warm seconds of each step'''
+    results = []
+
+    def step(name, func):
+        value, cold, warm = time_call(func, repeat, clear=frame_cache.clear)
+        results.append({'name': name, 'seconds': cold, 'warm_seconds': warm})
+        return value
+
+    # The dashboard pages run with copy-on-write enabled
+    with pd.option_context('mode.copy_on_write', True):
+        sales = step('load_data', lambda: load_data(sales_path))
+        step('build_cube', lambda: build_cube(sales))
+        cube = step('load_cube', lambda: load_cube(cube_path, sales_path))
+
+        this_year = int(cube.year.max())
+        selections = {
+            'all': filters.Filters(start=(this_year, 1), end=(this_year, 12)),
+            'selective': filters.Filters(start=(this_year, 1), end=(this_year, 12), order_status=('Delivered',),
+                                         customer_state=('SP', 'RJ')),
+        }
+        for label, selection in selections.items():
+            filtered = step('filter_cube[{}]'.format(label), lambda: filters.filter_cube(cube, selection))
+            comparison = step('comparison_cube[{}]'.format(label), lambda: filters.comparison_cube(cube, selection))
+            step('compute_kpis[{}]'.format(label), lambda: kpis.compute_kpis(comparison, this_year))
+            step('top_product_lines[{}]'.format(label), lambda: kpis.top_product_lines(filtered))
+            step('top_regions[{}]'.format(label), lambda: kpis.top_regions(filtered))
+            step('compute_home[{}]'.format(label), lambda: compute_home(cube, selection))
+
+            rows = step('filter_rows[{}]'.format(label),
+                        lambda: filters.filter_cube(filters.sort_by_month(sales), selection))
+            step('raw_page[{}]'.format(label),
+                 lambda: get_page(rows, sort_by='payment_value', ascending=False, page=2))
+    return results
+
+
+def benchmark_scale(n_orders, work_dir, seed=0, repeat=3, track_memory=True):
+    '''Generate n_orders orders, run the ETL on them and time the dashboard on its output.
+    return: dict of the results for this scale'''
+    started = time.perf_counter()
+    tables = generate_tables(n_orders, seed=seed)
+    generate_seconds = time.perf_counter() - started
+
+    csv_dir = os.path.join(work_dir, 'csv')
+    started = time.perf_counter()
+    write_csv_dir(tables, csv_dir)
+    write_seconds = time.perf_counter() - started
+    sheet_rows = {name: len(df) for name, df in tables.items()}
+    del tables
+
+    config = PipelineConfig(workbook=csv_dir, output_dir=work_dir, cache_dir=os.path.join(work_dir, '.etl_cache'))
+    # Snapshots left by an earlier run in work_dir would make the load stage a cache hit
+    shutil.rmtree(os.path.join(config.cache_dir, 'raw'), ignore_errors=True)
+    _, reports = run_pipeline(config, cache_stages=False, track_memory=track_memory)
+    dashboard = benchmark_dashboard(config.output_path('cleaned_sales_data.parquet'),
+                                    config.output_path('sales_cube.parquet'), repeat=repeat)
+    return {
+        'orders': n_orders,
+        'seed': seed,
+        'sheet_rows': sheet_rows,
+        'generate_seconds': generate_seconds,
+        'write_seconds': write_seconds,
+        'etl': [asdict(stage_report) for stage_report in reports if not stage_report.resumed],
+        'dashboard': dashboard,
+    }
+
+
+def environment():
+    '''Versions and machine details stored with the results'''
+    return {
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def run_benchmarks(scales, output_path, work_dir=None, seed=0, repeat=3, track_memory=True):
+    '''Benchmark every scale and write the results to output_path as JSON.
+    work_dir: where the generated data and outputs are written, a temporary directory when None
+    return: the results dict'''
+    results = {'created': datetime.now().isoformat(timespec='seconds'), 'environment': environment(), 'scales': []}
+    temporary = work_dir is None
+    work_dir = tempfile.mkdtemp(prefix='olist-benchmark-') if temporary else work_dir
+    try:
+        for n_orders in scales:
+            scale_dir = os.path.join(work_dir, str(n_orders))
+            os.makedirs(scale_dir, exist_ok=True)
+            results['scales'].append(benchmark_scale(n_orders, scale_dir, seed, repeat, track_memory))
+            # Write after every scale, so a run stopped at a large scale keeps the smaller ones
+            with open(output_path, 'w') as output_file:
+                json.dump(results, output_file, indent=2)
+    finally:
+        if temporary:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
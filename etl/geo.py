@@ -0,0 +1,88 @@
+'''Geolocation lookup for sellers and customers.
+
+The geolocation sheet holds about a million rows, with many points per zip code prefix.
+It is compacted once to one row per (zip code prefix, state, city), holding the median latitude
+and longitude. Each place is encoded as a single int64 key, built from the zip prefix and the
+category codes of state and city, and the keys are kept sorted. Finding the coordinates of any
+number of addresses is then one np.searchsorted call, with no string merges and no row fan-out.
+'''
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+
+def _codes(values, categories):
+    '''Category codes of values in categories, -1 where missing'''
+    return pd.Categorical(values, categories=categories).codes.astype('int64')
+
+
+def _encode(zip_prefix, state, city, states, cities):
+    '''Combine zip code prefix, state and city into one int64 key per row, -1 where any part is unknown'''
+    zip_code = pd.to_numeric(pd.Series(zip_prefix), errors='coerce').to_numpy(dtype='float64')
+    state_code = _codes(state, states)
+    city_code = _codes(city, cities)
+    valid = ~np.isnan(zip_code) & (state_code >= 0) & (city_code >= 0)
+
+    keys = np.full(len(zip_code), -1, dtype='int64')
+    keys[valid] = ((zip_code[valid].astype('int64') * len(states) + state_code[valid]) * len(cities)
+                   + city_code[valid])
+    return keys
+
+
+@dataclass(frozen=True)
+class GeoLookup:
+    '''Median coordinates per place, sorted by place key'''
+    keys: np.ndarray
+    lat: np.ndarray
+    lng: np.ndarray
+    states: pd.Index
+    cities: pd.Index
+
+    def __len__(self):
+        return len(self.keys)
+
+    def locate(self, zip_prefix, state, city):
+        '''Coordinates of each (zip code prefix, state, city) row.
+        return: (lat, lng) arrays, NaN where the place is not in the geolocation table'''
+        keys = _encode(zip_prefix, state, city, self.states, self.cities)
+        lat = np.full(len(keys), np.nan)
+        lng = np.full(len(keys), np.nan)
+        if not len(self.keys):
+            return lat, lng
+
+        position = np.searchsorted(self.keys, keys).clip(max=len(self.keys) - 1)
+        found = (keys >= 0) & (self.keys[position] == keys)
+        lat[found] = self.lat[position[found]]
+        lng[found] = self.lng[position[found]]
+        return lat, lng
+
+
+def compact_geolocation(geolocation_df):
+    '''Reduce the geolocation table to one row per (zip code prefix, state, city) with the median lat/lng.
+    return: GeoLookup'''
+    states = pd.Index(pd.Series(geolocation_df['geolocation_state']).astype('category').cat.categories)
+    cities = pd.Index(pd.Series(geolocation_df['geolocation_city']).astype('category').cat.categories)
+    keys = _encode(geolocation_df['geolocation_zip_code_prefix'], geolocation_df['geolocation_state'],
+                   geolocation_df['geolocation_city'], states, cities)
+
+    points = pd.DataFrame({'key': keys,
+                           'lat': geolocation_df['geolocation_lat'].to_numpy(dtype='float64'),
+                           'lng': geolocation_df['geolocation_lng'].to_numpy(dtype='float64')})
+    medians = points[keys >= 0].groupby('key', sort=True)[['lat', 'lng']].median()
+    return GeoLookup(keys=medians.index.to_numpy(dtype='int64'), lat=medians['lat'].to_numpy(),
+                     lng=medians['lng'].to_numpy(), states=states, cities=cities)
+
+
+def enrich_geolocation(sales_df, geolocation_df):
+    '''Fetch seller and customer latitude and longitude from the geolocation table.
+    return: sales_df with seller_lat, seller_lng, customer_lat and customer_lng columns'''
+    lookup = compact_geolocation(geolocation_df)
+    sales_df = sales_df.copy()
+    for party in ['seller', 'customer']:
+        lat, lng = lookup.locate(sales_df['{}_zip_code_prefix'.format(party)],
+                                 sales_df['{}_state'.format(party)],
+                                 sales_df['{}_city'.format(party)])
+        sales_df['{}_lat'.format(party)] = lat
+        sales_df['{}_lng'.format(party)] = lng
+    return sales_df
@@ -0,0 +1,212 @@
+'''Incremental refresh of the cleaned sales data.
+
+A full build (olist_ecommerce.py) saves the prepared tables under .etl_cache/current.
+New orders are then appended from a small workbook holding only the new or changed rows.
+Only the affected orders are joined and cleaned, and their rows are merged into
+cleaned_sales_data.parquet. The cube and the map bins are only re-aggregated for the months
+those orders fall in, the seller table for the sellers of those orders, the cohort counts for
+their customers and the state pairs for their (seller state, customer state) pairs. The
+year-to-date revenue of the targets is updated with the revenue of the replaced and added
+rows only.
+
+Usage: python olist_ecommerce.py append new_orders.xlsx
+'''
+import os
+from dataclasses import dataclass, fields
+
+import pandas as pd
+
+from Dashboard.dashboard_core.cohorts import refresh_cohort_counts
+from Dashboard.dashboard_core.cube import CUBE_DIMENSIONS, build_cube
+from Dashboard.dashboard_core.logistics import PAIR_DIMENSIONS, refresh_state_pairs
+from Dashboard.dashboard_core.sellers import refresh_seller_table
+from Dashboard.dashboard_core.spatial import refresh_map_bins
+from Dashboard.dashboard_core.targets import TARGETS_PATH, accumulate, load_targets, matches, revenue_by_year
+from etl.snapshots import CACHE_DIR, EXCEL_ENGINE, SHEETS
+from etl.transform import build_sales, dedupe_tables, prepare_tables
+
+
+# Rows of these tables belong to an order. New rows for an order replace all its stored rows.
+ORDER_TABLES = ['order_items', 'order_payments', 'order_reviews']
+
+# Key columns of the other tables. New rows replace stored rows with the same key.
+TABLE_KEYS = {
+    'orders': ['order_id'],
+    'customers': ['customer_id'],
+    'products': ['product_id'],
+    'sellers': ['seller_id'],
+    'product_categories': ['product_category_name'],
+    'geolocation': None,  # no key, exact duplicates are dropped
+}
+
+
+@dataclass(frozen=True)
+class RefreshPaths:
+    '''Files read and updated by append_orders: the outputs of a full build, and the targets.
+    The seller table, cohort counts, map bins and state pairs are skipped when missing.'''
+    sales: str = 'cleaned_sales_data.parquet'
+    cube: str = 'sales_cube.parquet'
+    revenue: str = 'revenue_ytd.parquet'
+    sellers: str = 'seller_stats.parquet'
+    cohorts: str = 'customer_cohorts.parquet'
+    map_bins: str = 'map_bins.parquet'
+    state_pairs: str = 'state_pairs.parquet'
+    targets: str = TARGETS_PATH
+
+    @classmethod
+    def in_dir(cls, output_dir, targets=TARGETS_PATH):
+        '''Paths of the outputs of a build with the given output directory'''
+        defaults = cls()
+        return cls(targets=targets, **{field.name: os.path.join(output_dir, getattr(defaults, field.name))
+                                       for field in fields(cls) if field.name != 'targets'})
+
+
+def concat_frames(frames):
+    '''Concatenate frames, keeping categorical columns categorical.
+    pd.concat falls back to object dtype when the categories differ, so they are unioned first.
+    Empty frames are left out, and all-NA columns take the dtype of the other frames, so the result
+    does not depend on how pandas resolves the dtype of empty or all-NA entries.'''
+    frames = list(frames)
+    frames = [df for df in frames if len(df)] or frames[:1]
+    for col in frames[0].columns:
+        filled = {df[col].dtype for df in frames if col in df.columns and df[col].notna().any()}
+        dtype = filled.pop() if len(filled) == 1 else None
+        # NaN does not fit a numpy int or bool column, those are left to pandas
+        if dtype is not None and (pd.api.types.is_extension_array_dtype(dtype) or dtype.kind not in 'iub'):
+            frames = [df.assign(**{col: df[col].astype(dtype)})
+                      if col in df.columns and df[col].dtype != dtype else df for df in frames]
+        dtypes = [df[col].dtype for df in frames if col in df.columns]
+        if not all(isinstance(dtype, pd.CategoricalDtype) for dtype in dtypes):
+            continue
+        if all(dtype == dtypes[0] for dtype in dtypes):
+            continue
+        categories = pd.api.types.union_categoricals(
+            [df[col] for df in frames if col in df.columns], ignore_order=True).categories
+        dtype = pd.CategoricalDtype(categories, ordered=dtypes[0].ordered)
+        frames = [df.assign(**{col: df[col].astype(dtype)}) if col in df.columns else df for df in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def current_path(cache_dir, name):
+    return os.path.join(cache_dir, 'current', '{}.parquet'.format(name))
+
+
+def save_tables(tables, cache_dir=CACHE_DIR):
+    '''Store the prepared tables as the base for the next incremental refresh'''
+    os.makedirs(os.path.join(cache_dir, 'current'), exist_ok=True)
+    for name, df in tables.items():
+        df.to_parquet(current_path(cache_dir, name), index=False)
+
+
+def load_tables(cache_dir=CACHE_DIR):
+    '''Prepared tables saved by the last full build or refresh'''
+    return {name: pd.read_parquet(current_path(cache_dir, name)) for name in SHEETS}
+
+
+def merge_tables(tables, new_tables):
+    '''Merge new prepared rows into the stored tables.
+    return: dict of the merged tables'''
+    merged = dict(tables)
+    for name, new_df in new_tables.items():
+        stored = tables[name]
+        if name in ORDER_TABLES:
+            stored = stored[~stored.order_id.isin(new_df.order_id)]
+            merged[name] = concat_frames([stored, new_df])
+        elif TABLE_KEYS[name] is None:
+            merged[name] = concat_frames([stored, new_df]).drop_duplicates()
+        else:
+            merged[name] = concat_frames([stored, new_df]).drop_duplicates(subset=TABLE_KEYS[name], keep='last')
+    return merged
+
+
+def changed_order_ids(tables, new_tables):
+    '''Orders whose rows must be rebuilt: new orders, orders whose row differs from the stored one
+    (a new status or delivery date), and orders with new items, payments or reviews'''
+    order_ids = set()
+    if 'orders' in new_tables:
+        new_orders = new_tables['orders']
+        stored = tables['orders'][tables['orders'].order_id.isin(new_orders.order_id)]
+        # A new row equal to its stored row is a duplicate of it, every other new row is a change
+        stored_again = concat_frames([stored, new_orders]).duplicated(keep=False).to_numpy()[len(stored):]
+        order_ids.update(new_orders.order_id[~stored_again])
+    for name in ORDER_TABLES:
+        if name in new_tables:
+            order_ids.update(new_tables[name].order_id)
+    return order_ids
+
+
+def refresh_cube(cube, sales, months):
+    '''Re-aggregate the cube for the given (year, month) pairs only'''
+    cube_months = pd.MultiIndex.from_frame(cube[['year', 'month']].astype('int64'))
+    sales_months = pd.MultiIndex.from_frame(sales[['year', 'month']].astype('int64'))
+    months = pd.MultiIndex.from_tuples(sorted(months), names=['year', 'month'])
+
+    kept = cube[~cube_months.isin(months)]
+    rebuilt = build_cube(sales[sales_months.isin(months)])
+    return concat_frames([kept, rebuilt]).sort_values(CUBE_DIMENSIONS[:2], kind='stable', ignore_index=True)
+
+
+def refresh_revenue(revenue_path, targets, added, removed, cube):
+    '''Running year-to-date totals of the targets, updated with the added and removed sales rows.
+    They are recomputed from the cube when missing or computed for other targets.'''
+    revenue = pd.read_parquet(revenue_path) if os.path.exists(revenue_path) else None
+    if revenue is not None and matches(revenue, targets):
+        return accumulate(revenue, targets, added=added, removed=removed)
+    return revenue_by_year(cube, targets)
+
+
+def read_delta(path):
+    '''Read the sheets present in a workbook of new rows.
+    return: dict of table name to raw dataframe'''
+    sheets = pd.read_excel(path, sheet_name=None, engine=EXCEL_ENGINE)
+    names = {sheet_name: name for name, sheet_name in SHEETS.items()}
+    return {names[sheet_name]: df for sheet_name, df in sheets.items() if sheet_name in names}
+
+
+def append_orders(new_raw_tables, cache_dir=CACHE_DIR, paths=RefreshPaths()):
+    '''Merge new raw rows into the stored tables and rebuild only the affected sales rows.
+    new_raw_tables: dict of table name to raw dataframe holding only new or changed rows
+    paths: RefreshPaths of the files to update
+    return: dict with the number of affected orders, removed and added rows, and refreshed months'''
+    tables = load_tables(cache_dir)
+    new_tables = dedupe_tables(prepare_tables(new_raw_tables))
+    order_ids = changed_order_ids(tables, new_tables)
+    tables = merge_tables(tables, new_tables)
+
+    rows = build_sales(tables, order_ids=order_ids)
+    sales = pd.read_parquet(paths.sales)
+    replaced = sales.order_id.isin(order_ids)
+    months = set(zip(sales.year[replaced], sales.month[replaced])) | set(zip(rows.year, rows.month))
+    months = {(int(year), int(month)) for year, month in months if pd.notna(year)}
+
+    removed = sales[replaced]
+    previous = sales
+    # Keep the rows in month order, which the dashboard filters rely on
+    sales = concat_frames([sales[~replaced], rows]).sort_values(['year', 'month'], kind='stable', ignore_index=True)
+    sales.to_parquet(paths.sales, index=False)
+    cube = pd.read_parquet(paths.cube)
+    if months:
+        cube = refresh_cube(cube, sales, months)
+        cube.to_parquet(paths.cube, index=False)
+        if os.path.exists(paths.map_bins):
+            refresh_map_bins(pd.read_parquet(paths.map_bins), sales, months).to_parquet(paths.map_bins, index=False)
+    seller_ids = set(removed.seller_id.dropna().astype(str)) | set(rows.seller_id.dropna().astype(str))
+    if seller_ids and os.path.exists(paths.sellers):
+        refresh_seller_table(pd.read_parquet(paths.sellers), sales, seller_ids).to_parquet(paths.sellers, index=False)
+    pairs = {tuple(pair) for frame in (removed, rows)
+             for pair in frame[PAIR_DIMENSIONS].dropna().astype(str).to_numpy()}
+    if pairs and os.path.exists(paths.state_pairs):
+        state_pairs = refresh_state_pairs(pd.read_parquet(paths.state_pairs), sales, pairs)
+        state_pairs.to_parquet(paths.state_pairs, index=False)
+    customer_ids = (set(removed.customer_unique_id.dropna().astype(str))
+                    | set(rows.customer_unique_id.dropna().astype(str)))
+    if customer_ids and os.path.exists(paths.cohorts):
+        counts = refresh_cohort_counts(pd.read_parquet(paths.cohorts), previous, sales, customer_ids)
+        counts.to_parquet(paths.cohorts, index=False)
+    revenue = refresh_revenue(paths.revenue, load_targets(paths.targets), rows, removed, cube)
+    revenue.to_parquet(paths.revenue, index=False)
+    save_tables(tables, cache_dir)
+
+    return {'orders': len(order_ids), 'removed_rows': int(replaced.sum()),
+            'added_rows': len(rows), 'months': sorted(months)}
+
@@ -0,0 +1,218 @@
+'''The Olist ETL as a sequence of named stages.
+
+Each stage takes the frames produced by the previous stage and returns new ones.
+The runner reports wall time, peak memory and row counts for every stage, and saves each
+stage's output under .etl_cache/stages so a later run can resume from any stage.
+'''
+import json
+import logging
+import os
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+
+import pandas as pd
+
+from Dashboard.dashboard_core.cohorts import build_cohort_counts
+from Dashboard.dashboard_core.cube import build_cube
+from Dashboard.dashboard_core.logistics import build_state_pairs
+from Dashboard.dashboard_core.schema import apply_schema, memory_report
+from Dashboard.dashboard_core.sellers import build_seller_table
+from Dashboard.dashboard_core.spatial import build_map_bins
+from Dashboard.dashboard_core.targets import TARGETS_PATH, load_targets, revenue_by_year
+from etl.geo import enrich_geolocation
+from etl.incremental import save_tables
+from etl.snapshots import CACHE_DIR, load_tables
+from etl.transform import (clean_sales, dedupe_tables, join_tables, prepare_tables,
+                           select_dashboard_columns, translate_categories)
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PipelineConfig:
+    '''Paths used by the pipeline.
+    workbook: xlsx workbook, or directory of the Kaggle CSV files
+    workers: processes used to parse the tables, by default one per CPU
+    targets: JSON file of the revenue targets, see Dashboard/dashboard_core/targets.py'''
+    workbook: str = 'olist_store_dataset.xlsx'
+    output_dir: str = '.'
+    cache_dir: str = CACHE_DIR
+    workers: int = None
+    targets: str = TARGETS_PATH
+
+    def output_path(self, file_name):
+        return os.path.join(self.output_dir, file_name)
+
+
+@dataclass
+class StageReport:
+    '''Measurements of one stage run'''
+    stage: str
+    seconds: float
+    peak_mb: float = None
+    rows: dict = field(default_factory=dict)
+    resumed: bool = False
+
+    def __str__(self):
+        peak = '{:>9.1f} MB'.format(self.peak_mb) if self.peak_mb is not None else '{:>12}'.format('-')
+        rows = ', '.join('{}={}'.format(name, count) for name, count in self.rows.items())
+        stage = self.stage + (' (cached)' if self.resumed else '')
+        return '{:<20} {:>8.2f} s {} | {}'.format(stage, self.seconds, peak, rows)
+
+
+def stage_load(frames, config):
+    '''Read every sheet of the workbook or CSV file of the directory, through the snapshot cache'''
+    return load_tables(config.workbook, config.cache_dir, config.workers)
+
+
+def stage_type(frames, config):
+    '''Change datatypes and drop irrelevant columns'''
+    return prepare_tables(frames)
+
+
+def stage_dedupe(frames, config):
+    '''Drop duplicate rows. The tables are kept as the base for incremental refreshes.'''
+    tables = dedupe_tables(frames)
+    save_tables(tables, config.cache_dir)
+    return tables
+
+
+def stage_join(frames, config):
+    '''Merge orders with reviews, payments, items, products, sellers and customers'''
+    return {
+        'sales': join_tables(frames),
+        'geolocation': frames['geolocation'],
+        'product_categories': frames['product_categories'],
+    }
+
+
+def stage_geo_enrich(frames, config):
+    '''Fetch seller and customer latitude and longitude from the compacted geolocation table'''
+    return {
+        'sales': enrich_geolocation(frames['sales'], frames['geolocation']),
+        'product_categories': frames['product_categories'],
+    }
+
+
+def stage_translate(frames, config):
+    '''Translate product category names to English'''
+    return {'sales': translate_categories(frames['sales'], frames['product_categories'])}
+
+
+def stage_clean(frames, config):
+    '''Tidy the named columns and set the categorical datatypes'''
+    return {'sales': clean_sales(frames['sales'])}
+
+
+def stage_export(frames, config):
+    '''Write the cleaned CSV, the typed Parquet dataset, the monthly cube, the seller table,
+    the cohort counts, the map bins, the state pairs and the year-to-date revenue'''
+    os.makedirs(config.output_dir, exist_ok=True)
+    untyped_df = select_dashboard_columns(frames['sales'])
+    # The CSV holds the dashboard columns too, so load_data can fall back to it without the Parquet file
+    untyped_df.to_csv(config.output_path('cleaned_sales_data.csv'), index=False)
+    dashboard_df = apply_schema(untyped_df)
+    logger.info('Dashboard frame memory before and after the schema:\n%s',
+                memory_report(untyped_df, dashboard_df).to_string())
+    dashboard_df.to_parquet(config.output_path('cleaned_sales_data.parquet'), index=False)
+
+    sales_cube = build_cube(dashboard_df)
+    sales_cube.to_parquet(config.output_path('sales_cube.parquet'), index=False)
+    seller_table = build_seller_table(dashboard_df)
+    seller_table.to_parquet(config.output_path('seller_stats.parquet'), index=False)
+    cohort_counts = build_cohort_counts(dashboard_df)
+    cohort_counts.to_parquet(config.output_path('customer_cohorts.parquet'), index=False)
+    map_bins = build_map_bins(dashboard_df)
+    map_bins.to_parquet(config.output_path('map_bins.parquet'), index=False)
+    state_pairs = build_state_pairs(dashboard_df)
+    state_pairs.to_parquet(config.output_path('state_pairs.parquet'), index=False)
+
+    # Starting point of the running totals updated by the incremental refresh
+    revenue = revenue_by_year(sales_cube, load_targets(config.targets))
+    revenue.to_parquet(config.output_path('revenue_ytd.parquet'), index=False)
+    return {'sales': dashboard_df, 'cube': sales_cube, 'sellers': seller_table, 'cohorts': cohort_counts,
+            'map_bins': map_bins, 'state_pairs': state_pairs, 'revenue': revenue}
+
+
+STAGES = {
+    'load': stage_load,
+    'type': stage_type,
+    'dedupe': stage_dedupe,
+    'join': stage_join,
+    'geo-enrich': stage_geo_enrich,
+    'translate': stage_translate,
+    'clean': stage_clean,
+    'export': stage_export,
+}
+
+STAGE_NAMES = list(STAGES)
+
+
+def stage_dir(config, stage):
+    return os.path.join(config.cache_dir, 'stages', stage)
+
+
+def save_stage(frames, config, stage):
+    '''Store the output of a stage, so later runs can resume after it'''
+    directory = stage_dir(config, stage)
+    os.makedirs(directory, exist_ok=True)
+    for name, df in frames.items():
+        df.to_parquet(os.path.join(directory, '{}.parquet'.format(name)), index=False)
+
+
+def load_stage(config, stage):
+    '''Read the stored output of a stage'''
+    directory = stage_dir(config, stage)
+    if not os.path.isdir(directory):
+        raise FileNotFoundError('no cached output for stage {!r} in {}'.format(stage, directory))
+    return {os.path.splitext(file_name)[0]: pd.read_parquet(os.path.join(directory, file_name))
+            for file_name in sorted(os.listdir(directory)) if file_name.endswith('.parquet')}
+
+
+def run_pipeline(config, start=None, stop=None, cache_stages=True, track_memory=True, report=print,
+                 stages=STAGES):
+    '''Run the stages from start to stop, inclusive, by default all of them.
+    When start is not the first stage, the input is read from the cached output of the stage before it.
+    report: called with each StageReport as the stage finishes
+    stages: dict of stage name to stage function, in order, e.g. etl.polars_backend.POLARS_STAGES
+    return: (frames produced by the last stage, list of StageReport)'''
+    names = list(stages)
+    first = names.index(start) if start is not None else 0
+    last = names.index(stop) if stop is not None else len(names) - 1
+    frames, reports = {}, []
+
+    if first > 0:
+        previous = names[first - 1]
+        started = time.perf_counter()
+        frames = load_stage(config, previous)
+        stage_report = StageReport(previous, time.perf_counter() - started,
+                                   rows={name: len(df) for name, df in frames.items()}, resumed=True)
+        reports.append(stage_report)
+        report(stage_report)
+
+    for stage in names[first:last + 1]:
+        if track_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        frames = stages[stage](frames, config)
+        seconds = time.perf_counter() - started
+        peak_mb = None
+        if track_memory:
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+            tracemalloc.stop()
+
+        if cache_stages and stage != 'export':
+            save_stage(frames, config, stage)
+
+        stage_report = StageReport(stage, seconds, peak_mb, {name: len(df) for name, df in frames.items()})
+        reports.append(stage_report)
+        report(stage_report)
+
+    return frames, reports
+
+
+def write_report(reports, path):
+    '''Save the stage reports as JSON'''
+    with open(path, 'w') as report_file:
+        json.dump([asdict(stage_report) for stage_report in reports], report_file, indent=2)
@@ -0,0 +1,210 @@
+'''Polars backend for the pipeline, an optional alternative to the pandas stages.
+
+The type, dedupe, join, geo-enrich, translate and clean stages are expressed as one lazy
+query over the Parquet snapshots of the sheets. Polars only reads the columns the query uses
+(shipping_limit_date, the product dimensions, the review comments and the other dropped
+columns are never loaded), and runs the plan on all cores without materializing each
+intermediate join in full. The result is the same frame the pandas clean stage returns,
+so the export stage is shared. The plan stage also saves the typed and deduplicated tables,
+built with pandas, as the base for incremental refreshes. Those pandas steps read every column
+of every snapshot, so a polars build saves less time than the plan alone does.
+
+check_parity runs both backends on one workbook and compares their dashboard frames.
+
+Usage: python olist_ecommerce.py build --backend polars
+       python olist_ecommerce.py parity
+Requires the polars package.
+'''
+import logging
+
+import pandas as pd
+
+try:
+    import polars as pl
+except ImportError as error:
+    raise ImportError('the polars backend needs the polars package: pip install polars') from error
+
+from etl.incremental import save_tables
+from etl.pipeline import STAGES, PipelineConfig, run_pipeline, stage_export
+from etl.snapshots import snapshot_paths
+from etl.transform import MISSING_CATEGORIES, NAMED_COLUMNS, dedupe_tables, prepare_tables, to_dashboard_frame
+
+logger = logging.getLogger(__name__)
+
+# Columns read from each sheet: the ones the pandas prepare_* functions keep
+COLUMNS = {
+    'orders': ['order_id', 'customer_id', 'order_status', 'order_purchase_timestamp', 'order_approved_at',
+               'order_delivered_customer_date'],
+    'customers': ['customer_id', 'customer_unique_id', 'customer_zip_code_prefix', 'customer_city',
+                  'customer_state'],
+    'order_reviews': ['review_id', 'order_id', 'review_score'],
+    'order_payments': ['order_id', 'payment_type', 'payment_value'],
+    'order_items': ['order_id', 'order_item_id', 'product_id', 'seller_id', 'price', 'freight_value'],
+    'products': ['product_id', 'product_category_name'],
+    'sellers': ['seller_id', 'seller_zip_code_prefix', 'seller_city', 'seller_state'],
+    'geolocation': ['geolocation_zip_code_prefix', 'geolocation_lat', 'geolocation_lng', 'geolocation_city',
+                    'geolocation_state'],
+    'product_categories': ['product_category_name', 'product_category_name_english'],
+}
+
+ZIP_COLUMNS = ['customer_zip_code_prefix', 'seller_zip_code_prefix', 'geolocation_zip_code_prefix']
+DATE_COLUMNS = ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_customer_date']
+ID_COLUMNS = ['order_id', 'product_id', 'seller_id']
+
+
+def scan_tables(paths):
+    '''Lazy, typed and deduplicated scan of every sheet snapshot, like prepare_tables + dedupe_tables'''
+    tables = {}
+    for name, path in paths.items():
+        table = pl.scan_parquet(path).select(COLUMNS[name])
+        schema = table.collect_schema()
+        casts = []
+        for column in COLUMNS[name]:
+            if column in ZIP_COLUMNS:
+                casts.append(pl.col(column).cast(pl.String).str.zfill(5))
+            elif column in DATE_COLUMNS and schema[column] == pl.String:
+                casts.append(pl.col(column).str.to_datetime())
+            elif column in ID_COLUMNS:
+                casts.append(pl.col(column).cast(pl.String))
+        tables[name] = table.with_columns(casts).unique(keep='first', maintain_order=True)
+    return tables
+
+
+def aggregate_payments(order_payments):
+    '''One row per order: the total payment_value, and the payment_type of the largest payment'''
+    return order_payments.group_by('order_id', maintain_order=True).agg(
+        pl.col('payment_type').get(pl.col('payment_value').arg_max()),
+        pl.col('payment_value').sum(),
+    )
+
+
+def aggregate_reviews(order_reviews):
+    '''One row per order: the first review_id and the mean review_score, rounded half to even like pandas'''
+    return order_reviews.group_by('order_id', maintain_order=True).agg(
+        pl.col('review_id').drop_nulls().first(),
+        pl.col('review_score').cast(pl.Float64).mean().round(0, mode='half_to_even'),
+    )
+
+
+def allocate_payments(orders):
+    '''Spread each order's payment_value over its items, in proportion to price + freight_value'''
+    item_value = pl.col('price').fill_null(0) + pl.col('freight_value').fill_null(0)
+    order_value = item_value.sum().over('order_id')
+    share = pl.when(order_value > 0).then(item_value / order_value).otherwise(1 / pl.len().over('order_id'))
+    return orders.with_columns(pl.col('payment_value') * share)
+
+
+def geolocation_medians(geolocation):
+    '''Median latitude and longitude per (zip code prefix, state, city), as in etl.geo'''
+    keys = ['geolocation_zip_code_prefix', 'geolocation_state', 'geolocation_city']
+    return (geolocation.drop_nulls(keys)
+            .group_by(keys).agg(pl.col('geolocation_lat').median(), pl.col('geolocation_lng').median()))
+
+
+def _locate(sales, medians, party):
+    '''Join the coordinates of the seller or customer address'''
+    return sales.join(
+        medians.rename({'geolocation_lat': '{}_lat'.format(party), 'geolocation_lng': '{}_lng'.format(party)}),
+        left_on=['{}_zip_code_prefix'.format(party), '{}_state'.format(party), '{}_city'.format(party)],
+        right_on=['geolocation_zip_code_prefix', 'geolocation_state', 'geolocation_city'],
+        how='left', maintain_order='left')
+
+
+def category_translation(product_categories_df):
+    '''Portuguese to English category names, and the English name used for products without a category'''
+    product_categories_df = pd.concat([product_categories_df, pd.DataFrame(MISSING_CATEGORIES)], ignore_index=True)
+    known = product_categories_df.product_category_name.notna()
+    translation = dict(zip(product_categories_df.product_category_name[known],
+                           product_categories_df.product_category_name_english[known]))
+    not_available = product_categories_df.product_category_name_english[~known]
+    return translation, not_available.iloc[0] if len(not_available) else None
+
+
+def sales_plan(tables, translation, not_available):
+    '''The lazy query from the scanned tables to the cleaned sales rows'''
+    orders = (tables['orders']
+              .join(aggregate_reviews(tables['order_reviews']), on='order_id', how='left',
+                    validate='1:1', maintain_order='left')
+              .join(aggregate_payments(tables['order_payments']), on='order_id', how='left',
+                    validate='1:1', maintain_order='left')
+              .join(tables['order_items'], on='order_id', how='left', validate='1:m', maintain_order='left'))
+    orders = (allocate_payments(orders)
+              .join(tables['products'], on='product_id', how='left', validate='m:1', maintain_order='left')
+              .join(tables['sellers'], on='seller_id', how='left', validate='m:1', maintain_order='left'))
+    sales = tables['customers'].join(orders, on='customer_id', how='left', validate='1:m', maintain_order='left')
+
+    medians = geolocation_medians(tables['geolocation'])
+    sales = _locate(_locate(sales, medians, 'seller'), medians, 'customer')
+
+    category = pl.col('product_category_name').replace(translation)
+    if not_available is not None:
+        category = category.fill_null(pl.lit(not_available))
+    sales = sales.with_columns(category.alias('product_category_name'))
+
+    tidy = [pl.col(col).cast(pl.String).str.replace_all('_', ' ', literal=True).str.to_titlecase()
+            for col in NAMED_COLUMNS]
+    columns = (COLUMNS['orders'] + ['review_id', 'review_score', 'payment_type', 'payment_value']
+               + COLUMNS['order_items'][1:] + ['product_category_name'] + COLUMNS['sellers'][1:]
+               + COLUMNS['customers'][1:] + ['seller_lat', 'seller_lng', 'customer_lat', 'customer_lng'])
+    return sales.with_columns(tidy).select(columns)
+
+
+def run_plan(paths):
+    '''Run the polars plan on the snapshots at paths, a dict of table name to snapshot path.
+    return: pandas dataframe with the columns of the pandas clean stage output'''
+    paths = dict(paths)
+    translation, not_available = category_translation(pd.read_parquet(paths.pop('product_categories')))
+    plan = sales_plan(scan_tables(paths), translation, not_available)
+    return plan.collect().to_pandas()
+
+
+def build_clean_sales(workbook_path, cache_dir, workers=None):
+    '''Run the polars plan on the snapshots of the workbook sheets or CSV files.
+    return: pandas dataframe with the columns of the pandas clean stage output'''
+    return run_plan(snapshot_paths(workbook_path, cache_dir, workers))
+
+
+def stage_plan(frames, config):
+    '''Run the whole lazy plan, from the sheet snapshots to the cleaned sales rows.
+    The tables are typed and deduplicated with pandas too, and kept as the base for incremental
+    refreshes like the pandas dedupe stage does, so append works after either build. That reads
+    every column of every snapshot, and takes back part of the time the lazy plan saves.
+    Memory allocated by polars itself is not seen by tracemalloc, so the reported peak is low.'''
+    paths = snapshot_paths(config.workbook, config.cache_dir, config.workers)
+    save_tables(dedupe_tables(prepare_tables({name: pd.read_parquet(path) for name, path in paths.items()})),
+                config.cache_dir)
+    return {'sales': run_plan(paths)}
+
+
+POLARS_STAGES = {
+    'plan': stage_plan,
+    'export': stage_export,
+}
+
+
+def _comparable(df):
+    '''Dashboard frame in a canonical row order, with categoricals compared by value'''
+    df = df.sort_values(['order_id', 'order_item_id'], kind='stable', ignore_index=True)
+    return df.assign(**{col: df[col].astype('object') for col in df.columns
+                        if isinstance(df[col].dtype, pd.CategoricalDtype)})
+
+
+def _dedupe_only(frames, config):
+    '''The pandas dedupe stage, without saving the tables as the base for incremental refreshes'''
+    return dedupe_tables(frames)
+
+
+def check_parity(workbook_path, cache_dir):
+    '''Build the dashboard frame with both backends and assert they are equal.
+    Rows are compared in (order_id, order_item_id) order, since the join order of the backends differs.
+    Floats are compared to float32 precision. Only the sheet snapshots are written to cache_dir,
+    the base for incremental refreshes saved by the last build is left as it is.
+    return: number of rows compared'''
+    config = PipelineConfig(workbook=workbook_path, cache_dir=cache_dir)
+    frames, _ = run_pipeline(config, stop='clean', cache_stages=False, track_memory=False,
+                             report=lambda stage_report: None, stages=dict(STAGES, dedupe=_dedupe_only))
+    expected = _comparable(to_dashboard_frame(frames['sales']))
+    actual = _comparable(to_dashboard_frame(build_clean_sales(workbook_path, cache_dir)))
+    pd.testing.assert_frame_equal(actual, expected, check_exact=False, rtol=1e-6)
+    logger.info('polars and pandas backends match on %d rows', len(expected))
+    return len(expected)
@@ -0,0 +1,218 @@
+'''Content-hashed Parquet snapshots of the workbook sheets.
+
+Parsing the workbook with openpyxl is the slowest part of the ETL, the geolocation sheet
+in particular. An xlsx file is a zip archive with one XML part per sheet, so each sheet can
+be hashed without parsing it. A sheet is only read with pd.read_excel when no snapshot exists
+for its hash, and the parsed frame is saved as Parquet for the next run.
+
+The missing sheets are parsed in a pool of processes, one sheet per process, with the
+calamine reader when python-calamine is installed (it is several times faster than openpyxl).
+The source can also be a directory holding the per-table CSV files of the Kaggle release,
+which are hashed as whole files and read with explicit dtypes.
+'''
+import hashlib
+import importlib.util
+import os
+import posixpath
+import re
+import zipfile
+import xml.etree.ElementTree as ET
+
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+# Table name to the name of its sheet in olist_store_dataset.xlsx
+SHEETS = {
+    'customers': 'customers_data',
+    'geolocation': 'geolocation_data',
+    'order_items': 'order_items_data',
+    'order_payments': 'order_payments_data',
+    'order_reviews': 'order_reviews_data',
+    'orders': 'orders_data',
+    'products': 'products_data',
+    'sellers': 'sellers_data',
+    'product_categories': 'product_categories_data',
+}
+
+# Table name to the file name of its CSV in the Kaggle release of the dataset
+CSV_FILES = {
+    'customers': 'olist_customers_dataset.csv',
+    'geolocation': 'olist_geolocation_dataset.csv',
+    'order_items': 'olist_order_items_dataset.csv',
+    'order_payments': 'olist_order_payments_dataset.csv',
+    'order_reviews': 'olist_order_reviews_dataset.csv',
+    'orders': 'olist_orders_dataset.csv',
+    'products': 'olist_products_dataset.csv',
+    'sellers': 'olist_sellers_dataset.csv',
+    'product_categories': 'product_category_name_translation.csv',
+}
+
+# Datatypes of the CSV columns, the ones pd.read_excel gives for the workbook.
+# Zip code prefixes are kept as text, which the type stage pads to 5 digits either way.
+CSV_DTYPES = {
+    'customers': {'customer_id': str, 'customer_unique_id': str, 'customer_zip_code_prefix': str,
+                  'customer_city': str, 'customer_state': str},
+    'geolocation': {'geolocation_zip_code_prefix': str, 'geolocation_lat': 'float64', 'geolocation_lng': 'float64',
+                    'geolocation_city': str, 'geolocation_state': str},
+    'order_items': {'order_id': str, 'order_item_id': 'int64', 'product_id': str, 'seller_id': str,
+                    'price': 'float64', 'freight_value': 'float64'},
+    'order_payments': {'order_id': str, 'payment_sequential': 'int64', 'payment_type': str,
+                       'payment_installments': 'int64', 'payment_value': 'float64'},
+    'order_reviews': {'review_id': str, 'order_id': str, 'review_score': 'int64', 'review_comment_title': str,
+                      'review_comment_message': str},
+    'orders': {'order_id': str, 'customer_id': str, 'order_status': str},
+    'products': {'product_id': str, 'product_category_name': str, 'product_name_lenght': 'float64',
+                 'product_description_lenght': 'float64', 'product_photos_qty': 'float64',
+                 'product_weight_g': 'float64', 'product_length_cm': 'float64', 'product_height_cm': 'float64',
+                 'product_width_cm': 'float64'},
+    'sellers': {'seller_id': str, 'seller_zip_code_prefix': str, 'seller_city': str, 'seller_state': str},
+    'product_categories': {'product_category_name': str, 'product_category_name_english': str},
+}
+
+CSV_DATES = {
+    'order_items': ['shipping_limit_date'],
+    'order_reviews': ['review_creation_date', 'review_answer_timestamp'],
+    'orders': ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_carrier_date',
+               'order_delivered_customer_date', 'order_estimated_delivery_date'],
+}
+
+CACHE_DIR = '.etl_cache'
+
+EXCEL_ENGINE = 'calamine' if importlib.util.find_spec('python_calamine') else 'openpyxl'
+
+_NS = {
+    'main': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main',
+    'rel': 'http://schemas.openxmlformats.org/package/2006/relationships',
+}
+_REL_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+# Value of a cell holding a shared string: the index of the string in xl/sharedStrings.xml
+_SHARED_CELL = re.compile(rb'<(?:\w+:)?c\b[^>]*\bt="s"[^>]*>\s*<(?:\w+:)?v>(\d+)<')
+
+
+def _sheet_parts(archive):
+    '''Map each sheet name to the path of its XML part in the xlsx archive'''
+    workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+    rels = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.findall('rel:Relationship', _NS)}
+
+    parts = {}
+    for sheet in workbook.findall('main:sheets/main:sheet', _NS):
+        target = targets[sheet.get(_REL_ID)]
+        # Targets are relative to xl/, unless they are absolute
+        parts[sheet.get('name')] = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+    return parts
+
+
+def _shared_strings(archive):
+    '''Digest of every string of the shared strings part, by index'''
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as xml:
+        for _, element in ET.iterparse(xml):
+            if element.tag == '{{{}}}si'.format(_NS['main']):
+                strings.append(hashlib.sha256(''.join(element.itertext()).encode()).digest())
+                element.clear()
+    return strings
+
+
+def sheet_digests(workbook_path):
+    '''Hash the content of every sheet of an xlsx workbook without parsing the cells.
+    Sheets store their text in the shared strings part and refer to it by index, so the hash of
+    a sheet covers its XML and the shared strings it refers to, and new text in one sheet leaves
+    the hashes of the others unchanged.
+    return: dict of sheet name to hex digest'''
+    with zipfile.ZipFile(workbook_path) as archive:
+        strings = _shared_strings(archive)
+
+        digests = {}
+        for sheet_name, part in _sheet_parts(archive).items():
+            digest = hashlib.sha256()
+            indices = set()
+            rest = b''
+            with archive.open(part) as xml:
+                for chunk in iter(lambda: xml.read(1 << 20), b''):
+                    digest.update(chunk)
+                    # Cells are only searched up to the last complete one, the rest goes with the next chunk
+                    text = rest + chunk
+                    end = text.rfind(b'</c>') + len(b'</c>') if b'</c>' in text else 0
+                    indices.update(_SHARED_CELL.findall(text, 0, end))
+                    rest = text[end:]
+            for index in sorted({int(index) for index in indices}):
+                digest.update(strings[index])
+            digests[sheet_name] = digest.hexdigest()
+    return digests
+
+
+def file_digest(path):
+    '''Hash the content of a file'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_parts(source_path):
+    '''Where each table is read from: the sheets of an xlsx workbook, or the CSV files of a directory.
+    return: dict of table name to (part name, digest of its content)'''
+    if os.path.isdir(source_path):
+        return {name: (file_name, file_digest(os.path.join(source_path, file_name)))
+                for name, file_name in CSV_FILES.items()}
+    digests = sheet_digests(source_path)
+    return {name: (sheet_name, digests[sheet_name]) for name, sheet_name in SHEETS.items()}
+
+
+def snapshot_path(cache_dir, sheet_name, digest):
+    return os.path.join(cache_dir, 'raw', '{}-{}.parquet'.format(os.path.splitext(sheet_name)[0], digest[:16]))
+
+
+def read_part(source_path, name, part):
+    '''Parse one table from the source, without the snapshot cache.
+    return: the raw table dataframe'''
+    if os.path.isdir(source_path):
+        return pd.read_csv(os.path.join(source_path, part), dtype=CSV_DTYPES[name],
+                           parse_dates=CSV_DATES.get(name, []))
+    return pd.read_excel(source_path, sheet_name=part, engine=EXCEL_ENGINE)
+
+
+def _write_snapshot(source_path, name, part, path):
+    '''Parse one table and save it as its snapshot. Runs in a worker process.'''
+    df = read_part(source_path, name, part)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Written under a temporary name, so a failed run never leaves a partial snapshot
+    temporary_path = '{}.{}.tmp'.format(path, os.getpid())
+    df.to_parquet(temporary_path, index=False)
+    os.replace(temporary_path, path)
+    return path
+
+
+def snapshot_paths(source_path, cache_dir=CACHE_DIR, workers=None):
+    '''Paths of the Parquet snapshots of every Olist table, writing the missing ones first.
+    The missing tables are parsed in parallel, each in its own process.
+    source_path: xlsx workbook, or directory of the Kaggle CSV files
+    workers: number of processes, by default one per missing table up to the number of CPUs
+    return: dict of table name to snapshot path'''
+    parts = source_parts(source_path)
+    paths = {name: snapshot_path(cache_dir, part, digest) for name, (part, digest) in parts.items()}
+    missing = [name for name, path in paths.items() if not os.path.exists(path)]
+
+    workers = workers or min(len(missing), os.cpu_count() or 1)
+    if workers > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_write_snapshot, source_path, name, parts[name][0], paths[name])
+                       for name in missing]
+            for future in futures:
+                future.result()
+    else:
+        for name in missing:
+            _write_snapshot(source_path, name, parts[name][0], paths[name])
+    return paths
+
+
+def load_tables(source_path, cache_dir=CACHE_DIR, workers=None):
+    '''Read every Olist table of the workbook or CSV directory through the snapshot cache.
+    return: dict of table name to raw dataframe'''
+    return {name: pd.read_parquet(path) for name, path in snapshot_paths(source_path, cache_dir, workers).items()}
@@ -0,0 +1,334 @@
+'''Synthetic Olist data at any scale.
+
+generate_tables produces the nine sheets of olist_store_dataset.xlsx with the same columns
+and raw dtypes, and with distributions close to the public dataset: about one customer per
+order, 3% of customers buying twice, 1.13 items and 1.04 payments per order, payments that
+add up to the order's price plus freight, the real order status, payment type and review
+score shares, and customers concentrated in the south-east. Product categories, states and
+zip code ranges are the real ones; city names beyond the state capitals are made up.
+
+The geolocation table scales with the number of zip code prefixes, which stops growing
+at the size of the real dataset, so it stays around a million rows at any order count.
+'''
+import os
+
+import numpy as np
+import pandas as pd
+
+from etl.snapshots import CSV_FILES, SHEETS
+
+# Excel's row limit, minus the header row
+XLSX_MAX_ROWS = 1_048_575
+
+PRODUCT_CATEGORIES = {
+    'cama_mesa_banho': 'bed_bath_table', 'beleza_saude': 'health_beauty', 'esporte_lazer': 'sports_leisure',
+    'moveis_decoracao': 'furniture_decor', 'informatica_acessorios': 'computers_accessories',
+    'utilidades_domesticas': 'housewares', 'relogios_presentes': 'watches_gifts', 'telefonia': 'telephony',
+    'ferramentas_jardim': 'garden_tools', 'automotivo': 'auto', 'brinquedos': 'toys', 'cool_stuff': 'cool_stuff',
+    'perfumaria': 'perfumery', 'bebes': 'baby', 'eletronicos': 'electronics', 'papelaria': 'stationery',
+    'fashion_bolsas_e_acessorios': 'fashion_bags_accessories', 'pet_shop': 'pet_shop',
+    'moveis_escritorio': 'office_furniture', 'consoles_games': 'consoles_games',
+    'malas_acessorios': 'luggage_accessories', 'construcao_ferramentas_construcao': 'construction_tools_construction',
+    'eletrodomesticos': 'home_appliances', 'instrumentos_musicais': 'musical_instruments',
+    'eletroportateis': 'small_appliances', 'casa_construcao': 'home_construction',
+    'livros_interesse_geral': 'books_general_interest', 'alimentos': 'food', 'moveis_sala': 'furniture_living_room',
+    'casa_conforto': 'home_confort', 'bebidas': 'drinks', 'audio': 'audio', 'market_place': 'market_place',
+    'construcao_ferramentas_iluminacao': 'construction_tools_lights', 'climatizacao': 'air_conditioning',
+    'moveis_cozinha_area_de_servico_jantar_e_jardim': 'kitchen_dining_laundry_garden_furniture',
+    'alimentos_bebidas': 'food_drink', 'industria_comercio_e_negocios': 'industry_commerce_and_business',
+    'livros_tecnicos': 'books_technical', 'telefonia_fixa': 'fixed_telephony', 'fashion_calcados': 'fashion_shoes',
+    'eletrodomesticos_2': 'home_appliances_2', 'construcao_ferramentas_jardim': 'costruction_tools_garden',
+    'agro_industria_e_comercio': 'agro_industry_and_commerce', 'artes': 'art', 'pcs': 'computers',
+    'sinalizacao_e_seguranca': 'signaling_and_security', 'construcao_ferramentas_seguranca': 'construction_tools_safety',
+    'artigos_de_natal': 'christmas_supplies', 'fashion_roupa_masculina': 'fashion_male_clothing',
+    'fashion_underwear_e_moda_praia': 'fashion_underwear_beach', 'moveis_quarto': 'furniture_bedroom',
+    'construcao_ferramentas_ferramentas': 'costruction_tools_tools', 'tablets_impressao_imagem': 'tablets_printing_image',
+    'livros_importados': 'books_imported', 'portateis_casa_forno_e_cafe': 'small_appliances_home_oven_and_coffee',
+    'fashion_esporte': 'fashion_sport', 'artigos_de_festas': 'party_supplies', 'cine_foto': 'cine_photo',
+    'moveis_colchao_e_estofado': 'furniture_mattress_and_upholstery', 'fashion_roupa_feminina': 'fashio_female_clothing',
+    'musica': 'music', 'casa_conforto_2': 'home_comfort_2', 'artes_e_artesanato': 'arts_and_craftmanship',
+    'fraldas_higiene': 'diapers_and_hygiene', 'flores': 'flowers', 'dvds_blu_ray': 'dvds_blu_ray',
+    'la_cuisine': 'la_cuisine', 'cds_dvds_musicais': 'cds_dvds_musicals',
+    'fashion_roupa_infanto_juvenil': 'fashion_childrens_clothes', 'seguros_e_servicos': 'security_and_services',
+}
+
+# Categories used by products but missing from the product_categories sheet, as in the real data
+UNTRANSLATED_CATEGORIES = ['pc_gamer', 'portateis_cozinha_e_preparadores_de_alimentos']
+
+# State: (share of customers, capital, zip code prefix range, latitude, longitude of the capital)
+STATES = {
+    'SP': (0.420, 'sao paulo', (1000, 19999), -23.55, -46.63),
+    'RJ': (0.129, 'rio de janeiro', (20000, 28999), -22.91, -43.17),
+    'MG': (0.117, 'belo horizonte', (30000, 39999), -19.92, -43.94),
+    'RS': (0.055, 'porto alegre', (90000, 99999), -30.03, -51.23),
+    'PR': (0.051, 'curitiba', (80000, 87999), -25.43, -49.27),
+    'SC': (0.037, 'florianopolis', (88000, 89999), -27.59, -48.55),
+    'BA': (0.034, 'salvador', (40000, 48999), -12.97, -38.50),
+    'DF': (0.022, 'brasilia', (70000, 72799), -15.79, -47.88),
+    'ES': (0.020, 'vitoria', (29000, 29999), -20.32, -40.34),
+    'GO': (0.020, 'goiania', (72800, 76799), -16.69, -49.26),
+    'PE': (0.017, 'recife', (50000, 56999), -8.05, -34.88),
+    'CE': (0.013, 'fortaleza', (60000, 63999), -3.73, -38.52),
+    'PA': (0.010, 'belem', (66000, 68899), -1.46, -48.49),
+    'MT': (0.009, 'cuiaba', (78000, 78899), -15.60, -56.10),
+    'MA': (0.008, 'sao luis', (65000, 65999), -2.53, -44.30),
+    'MS': (0.007, 'campo grande', (79000, 79999), -20.47, -54.62),
+    'PB': (0.005, 'joao pessoa', (58000, 58999), -7.12, -34.86),
+    'PI': (0.005, 'teresina', (64000, 64999), -5.09, -42.80),
+    'RN': (0.005, 'natal', (59000, 59999), -5.79, -35.21),
+    'AL': (0.004, 'maceio', (57000, 57999), -9.67, -35.74),
+    'SE': (0.003, 'aracaju', (49000, 49999), -10.91, -37.07),
+    'TO': (0.003, 'palmas', (77000, 77999), -10.18, -48.33),
+    'RO': (0.003, 'porto velho', (76800, 76999), -8.76, -63.90),
+    'AM': (0.002, 'manaus', (69000, 69299), -3.12, -60.02),
+    'AC': (0.001, 'rio branco', (69900, 69999), -9.97, -67.81),
+    'AP': (0.001, 'macapa', (68900, 68999), 0.03, -51.07),
+    'RR': (0.001, 'boa vista', (69300, 69399), 2.82, -60.67),
+}
+
+ORDER_STATUSES = {'delivered': 0.970, 'shipped': 0.011, 'canceled': 0.006, 'unavailable': 0.006,
+                  'invoiced': 0.003, 'processing': 0.003, 'created': 0.0005, 'approved': 0.0005}
+PAYMENT_TYPES = {'credit_card': 0.739, 'boleto': 0.190, 'voucher': 0.056, 'debit_card': 0.015, 'not_defined': 0.0001}
+REVIEW_SCORES = {5: 0.578, 4: 0.193, 1: 0.115, 3: 0.082, 2: 0.032}
+ITEMS_PER_ORDER = {1: 0.900, 2: 0.076, 3: 0.013, 4: 0.005, 5: 0.004, 6: 0.002}
+PAYMENTS_PER_ORDER = {1: 0.970, 2: 0.020, 3: 0.006, 4: 0.004}
+
+# Scale of the real dataset, used to size the tables that do not grow with the number of orders
+REAL_ORDERS = 99_441
+REAL_ZIP_PREFIXES = 19_015
+GEOLOCATION_ROWS_PER_ZIP = 52
+
+
+def _choice(rng, shares, size):
+    '''Draw size values with the given shares'''
+    values = np.array(list(shares))
+    weights = np.array(list(shares.values()), dtype='float64')
+    return values[rng.choice(len(values), size=size, p=weights / weights.sum())]
+
+
+def _hex_ids(rng, size):
+    '''Random 32 character hex ids, like the Olist ids'''
+    digits = np.frombuffer(b'0123456789abcdef', dtype='S1')
+    chars = digits[rng.integers(0, 16, size=(size, 32), dtype=np.uint8)]
+    return chars.view('S32').ravel().astype(str).astype(object)
+
+
+def _places(rng, n_zips):
+    '''Zip code prefixes with their state, city and centre coordinates'''
+    codes = list(STATES)
+    shares = np.array([STATES[state][0] for state in codes])
+    state = rng.choice(len(codes), size=n_zips, p=shares / shares.sum())
+    low = np.array([STATES[code][2][0] for code in codes])[state]
+    high = np.array([STATES[code][2][1] for code in codes])[state]
+    zips = rng.integers(low, high + 1)
+
+    # Half the zip codes of a state are in its capital, the rest spread over made up towns
+    capital = rng.random(n_zips) < 0.5
+    town = rng.integers(1, max(2, n_zips // 60), size=n_zips)
+    capitals = np.array([STATES[code][1] for code in codes], dtype=object)[state]
+    cities = np.where(capital, capitals, np.char.add('municipio ', town.astype(str)).astype(object))
+
+    lat = np.array([STATES[code][3] for code in codes])[state] + rng.normal(0, np.where(capital, 0.1, 1.5))
+    lng = np.array([STATES[code][4] for code in codes])[state] + rng.normal(0, np.where(capital, 0.1, 1.5))
+    places = pd.DataFrame({'zip': zips, 'city': cities, 'state': np.array(codes)[state], 'lat': lat, 'lng': lng})
+    return places.drop_duplicates('zip', ignore_index=True)
+
+
+def _geolocation(rng, places):
+    '''Several points per zip code prefix around its centre, including exact duplicates'''
+    n_points = rng.poisson(GEOLOCATION_ROWS_PER_ZIP, size=len(places)).clip(min=1)
+    place = np.repeat(np.arange(len(places)), n_points)
+    geolocation_df = pd.DataFrame({
+        'geolocation_zip_code_prefix': places.zip.to_numpy()[place],
+        'geolocation_lat': places.lat.to_numpy()[place] + rng.normal(0, 0.01, len(place)),
+        'geolocation_lng': places.lng.to_numpy()[place] + rng.normal(0, 0.01, len(place)),
+        'geolocation_city': places.city.to_numpy()[place],
+        'geolocation_state': places.state.to_numpy()[place],
+    })
+    duplicated = rng.random(len(geolocation_df)) < 0.25
+    duplicates = geolocation_df[duplicated].sample(frac=1, random_state=int(rng.integers(2**31)))
+    return pd.concat([geolocation_df, duplicates], ignore_index=True)
+
+
+def _parties(rng, places, ids, prefix, zip_weights=None):
+    '''Customers or sellers, located at random zip code prefixes'''
+    place = rng.choice(len(places), size=len(ids), p=zip_weights)
+    return pd.DataFrame({
+        '{}_id'.format(prefix): ids,
+        '{}_zip_code_prefix'.format(prefix): places.zip.to_numpy()[place],
+        '{}_city'.format(prefix): places.city.to_numpy()[place],
+        '{}_state'.format(prefix): places.state.to_numpy()[place],
+    })
+
+
+def _purchase_times(rng, n_orders):
+    '''Purchase timestamps from September 2016 to October 2018, with sales growing over time'''
+    start, stop = pd.Timestamp('2016-09-04'), pd.Timestamp('2018-10-17')
+    span = (stop - start).total_seconds()
+    # Density rising linearly over the period, drawn by inverse transform sampling
+    offset = np.sqrt(rng.random(n_orders)) * span
+    return (start + pd.to_timedelta(offset, unit='s')).floor('s')
+
+
+def _split(rng, totals, counts):
+    '''Split each total into counts parts, rounded to cents, that add up to the total'''
+    owner = np.repeat(np.arange(len(totals)), counts)
+    weights = rng.gamma(1.0, size=len(owner))
+    shares = weights / np.bincount(owner, weights)[owner]
+    parts = np.round(totals[owner] * shares, 2)
+    # Put the rounding difference on the first part of each total
+    first = np.r_[0, np.cumsum(counts)[:-1]]
+    parts[first] += np.round(totals - np.bincount(owner, parts, minlength=len(totals)), 2)
+    return owner, parts
+
+
+def generate_tables(n_orders, seed=0):
+    '''Generate the nine Olist tables for n_orders orders.
+    return: dict of table name (see etl.snapshots.SHEETS) to raw dataframe'''
+    rng = np.random.default_rng(seed)
+    scale = n_orders / REAL_ORDERS
+
+    n_zips = int(min(REAL_ZIP_PREFIXES, max(100, REAL_ZIP_PREFIXES * scale)))
+    places = _places(rng, n_zips)
+    geolocation_df = _geolocation(rng, places)
+
+    # Zip codes attract customers in proportion to their state's share
+    state_share = places.state.map({code: values[0] for code, values in STATES.items()})
+    zip_weights = (state_share / places.groupby('state').state.transform('size')).to_numpy()
+    zip_weights = zip_weights / zip_weights.sum()
+
+    # One customer_id per order; customer_unique_id repeats for returning customers
+    customers_df = _parties(rng, places, _hex_ids(rng, n_orders), 'customer', zip_weights)
+    unique_ids = _hex_ids(rng, n_orders)
+    owner = np.arange(n_orders)
+    returning = rng.random(n_orders) < 0.034
+    owner[returning] = rng.integers(0, n_orders, returning.sum())
+    customers_df.insert(1, 'customer_unique_id', unique_ids[owner])
+
+    sellers_df = _parties(rng, places, _hex_ids(rng, max(1, int(3_095 * scale))), 'seller', zip_weights)
+
+    n_products = max(1, int(32_951 * scale))
+    categories = np.array(list(PRODUCT_CATEGORIES) + UNTRANSLATED_CATEGORIES, dtype=object)
+    # Category popularity falls off with rank, as in the real data
+    popularity = 1 / np.arange(1, len(categories) + 1)
+    product_category = categories[rng.choice(len(categories), size=n_products, p=popularity / popularity.sum())]
+    product_category[rng.random(n_products) < 0.0185] = np.nan
+    products_df = pd.DataFrame({
+        'product_id': _hex_ids(rng, n_products),
+        'product_category_name': product_category,
+        'product_name_lenght': rng.integers(5, 76, n_products).astype('float64'),
+        'product_description_lenght': rng.integers(4, 3993, n_products).astype('float64'),
+        'product_photos_qty': rng.integers(1, 8, n_products).astype('float64'),
+        'product_weight_g': rng.lognormal(6.5, 1.2, n_products).round().clip(0, 40425),
+        'product_length_cm': rng.integers(7, 106, n_products).astype('float64'),
+        'product_height_cm': rng.integers(2, 106, n_products).astype('float64'),
+        'product_width_cm': rng.integers(6, 119, n_products).astype('float64'),
+    })
+
+    order_ids = _hex_ids(rng, n_orders)
+    purchased = _purchase_times(rng, n_orders)
+    status = _choice(rng, ORDER_STATUSES, n_orders)
+    approved = purchased + pd.to_timedelta(rng.exponential(10, n_orders), unit='h').round('s')
+    carrier = approved + pd.to_timedelta(rng.exponential(3, n_orders), unit='D').round('s')
+    delivered = carrier + pd.to_timedelta(rng.gamma(3, 3, n_orders), unit='D').round('s')
+    shipped = np.isin(status, ['shipped', 'delivered'])
+    orders_df = pd.DataFrame({
+        'order_id': order_ids,
+        'customer_id': customers_df.customer_id.to_numpy(),
+        'order_status': status,
+        'order_purchase_timestamp': purchased,
+        'order_approved_at': approved.where(~np.isin(status, ['created', 'canceled']) | (rng.random(n_orders) < 0.8)),
+        'order_delivered_carrier_date': carrier.where(shipped),
+        'order_delivered_customer_date': delivered.where(status == 'delivered'),
+        'order_estimated_delivery_date': (purchased + pd.to_timedelta(rng.integers(10, 40, n_orders), unit='D')).floor('D'),
+    })
+
+    # Unavailable and most canceled orders have no items
+    n_items = _choice(rng, ITEMS_PER_ORDER, n_orders).astype('int64')
+    n_items[(status == 'unavailable') | ((status == 'canceled') & (rng.random(n_orders) < 0.5))] = 0
+    item_order = np.repeat(np.arange(n_orders), n_items)
+    item_number = np.arange(len(item_order)) - np.repeat(np.cumsum(n_items) - n_items, n_items) + 1
+    # Orders with several items often hold the same product several times
+    item_product = rng.integers(0, n_products, len(item_order))
+    repeat = (item_number > 1) & (rng.random(len(item_order)) < 0.6)
+    item_product[repeat] = item_product[np.flatnonzero(repeat) - 1]
+    product_price = rng.lognormal(4.3, 0.9, n_products).round(2).clip(0.85, 6735)
+    product_seller = rng.integers(0, len(sellers_df), n_products)
+    order_items_df = pd.DataFrame({
+        'order_id': order_ids[item_order],
+        'order_item_id': item_number,
+        'product_id': products_df.product_id.to_numpy()[item_product],
+        'seller_id': sellers_df.seller_id.to_numpy()[product_seller[item_product]],
+        'shipping_limit_date': (purchased[item_order] + pd.Timedelta('6D')).floor('s'),
+        'price': product_price[item_product],
+        'freight_value': rng.gamma(2.5, 8, len(item_order)).round(2).clip(0, 409),
+    })
+
+    # Payments add up to the order total; orders without items get a freight-sized payment
+    totals = np.bincount(item_order, order_items_df.price + order_items_df.freight_value, minlength=n_orders)
+    totals = np.where(n_items > 0, totals, rng.gamma(2.5, 40, n_orders)).round(2)
+    n_payments = _choice(rng, PAYMENTS_PER_ORDER, n_orders).astype('int64')
+    payment_order, payment_value = _split(rng, totals, n_payments)
+    payment_sequential = np.arange(len(payment_order)) - np.repeat(np.cumsum(n_payments) - n_payments, n_payments) + 1
+    payment_type = _choice(rng, PAYMENT_TYPES, len(payment_order)).astype(object)
+    payment_type[payment_sequential > 1] = 'voucher'
+    order_payments_df = pd.DataFrame({
+        'order_id': order_ids[payment_order],
+        'payment_sequential': payment_sequential,
+        'payment_type': payment_type,
+        'payment_installments': np.where(payment_type == 'credit_card', rng.integers(1, 11, len(payment_order)), 1),
+        'payment_value': payment_value,
+    })
+
+    # About one review per order: a few orders have none, a few have two
+    n_reviews = np.ones(n_orders, dtype='int64')
+    n_reviews[rng.random(n_orders) < 0.008] = 0
+    n_reviews[rng.random(n_orders) < 0.005] = 2
+    review_order = np.repeat(np.arange(n_orders), n_reviews)
+    created = (delivered[review_order] + pd.to_timedelta(rng.integers(0, 3, len(review_order)), unit='D')).floor('D')
+    score = _choice(rng, REVIEW_SCORES, len(review_order))
+    title = np.where(rng.random(len(review_order)) < 0.12, 'recomendo', None)
+    message = np.where(rng.random(len(review_order)) < 0.41,
+                       np.where(score >= 4, 'produto chegou antes do prazo', 'ainda nao recebi o produto'), None)
+    order_reviews_df = pd.DataFrame({
+        'review_id': _hex_ids(rng, len(review_order)),
+        'order_id': order_ids[review_order],
+        'review_score': score,
+        'review_comment_title': title,
+        'review_comment_message': message,
+        'review_creation_date': created,
+        'review_answer_timestamp': created + pd.to_timedelta(rng.exponential(3, len(review_order)), unit='D').round('s'),
+    })
+
+    product_categories_df = pd.DataFrame({'product_category_name': list(PRODUCT_CATEGORIES),
+                                          'product_category_name_english': list(PRODUCT_CATEGORIES.values())})
+
+    return {
+        'customers': customers_df,
+        'geolocation': geolocation_df,
+        'order_items': order_items_df,
+        'order_payments': order_payments_df,
+        'order_reviews': order_reviews_df,
+        'orders': orders_df,
+        'products': products_df,
+        'sellers': sellers_df,
+        'product_categories': product_categories_df,
+    }
+
+
+def write_workbook(tables, path):
+    '''Write the tables as an xlsx workbook with the sheet names of olist_store_dataset.xlsx.
+    Only possible up to about 900k orders, when every sheet fits in an Excel sheet.'''
+    too_long = [name for name, df in tables.items() if len(df) > XLSX_MAX_ROWS]
+    if too_long:
+        raise ValueError('too many rows for an xlsx sheet: {}'.format(', '.join(too_long)))
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for name, df in tables.items():
+            df.to_excel(writer, sheet_name=SHEETS[name], index=False)
+
+
+def write_csv_dir(tables, directory):
+    '''Write the tables as the per-table CSV files of the Kaggle release, which have no row limit'''
+    os.makedirs(directory, exist_ok=True)
+    for name, df in tables.items():
+        df.to_csv(os.path.join(directory, CSV_FILES[name]), index=False)
@@ -0,0 +1,341 @@
+'''Transformations that turn the raw Olist tables into the cleaned sales table.
+
+Each function implements one step of the pipeline in etl/pipeline.py, so that the full build
+and the incremental refresh share one implementation. Each prepare_* function takes the raw sheet
+as read from the workbook and returns the typed, trimmed table.
+'''
+import logging
+
+import numpy as np
+import pandas as pd
+
+from Dashboard.dashboard_core.logistics import delivery_days, haversine_km
+from Dashboard.dashboard_core.schema import ORDERED_CATEGORIES, apply_schema
+from etl.geo import enrich_geolocation
+
+logger = logging.getLogger(__name__)
+
+# Categories missing from the product_categories sheet
+MISSING_CATEGORIES = {'product_category_name' : ['portateis_cozinha_e_preparadores_de_alimentos', 'pc_gamer', np.nan],
+    'product_category_name_english' : ['Kitchen Equipment', 'PC Gamer', 'Not Available']}
+
+# Columns where '_' is replaced with a space and values are converted to title case
+NAMED_COLUMNS = ['order_status', 'payment_type', 'product_category_name', 'seller_city', 'customer_city',]
+
+# Columns written to the typed dataset read by the dashboard
+DASHBOARD_COLUMNS = ['order_id', 'customer_id', 'order_status', 'order_purchase_timestamp', 'order_approved_at',
+                     'order_delivered_customer_date', 'review_score', 'payment_type', 'payment_value',
+                     'order_item_id', 'product_id', 'seller_id', 'price', 'freight_value',
+                     'product_category_name_english', 'seller_zip_code_prefix', 'seller_city', 'seller_state',
+                     'seller_lat', 'seller_lng',
+                     'customer_unique_id', 'customer_zip_code_prefix', 'customer_city', 'customer_state',
+                     'customer_lat', 'customer_lng', 'distance_km', 'delivery_days', 'year', 'month',]
+
+
+def prepare_customers(customers_df):
+    # change column datatypes
+    convert_dict = {
+        'customer_zip_code_prefix': str,
+        'customer_city': 'category',
+        'customer_state': 'category',
+    }
+    customers_df = customers_df.astype(convert_dict)
+
+    # Let's standardize customer_zip_code_prefix digits to 5 for the column
+    customers_df['customer_zip_code_prefix'] = customers_df.customer_zip_code_prefix.str.zfill(5)
+    return customers_df
+
+
+def prepare_geolocation(geolocation_df):
+    # Change data types of listed columns
+    convert_dict = {
+        'geolocation_zip_code_prefix' : str,
+        'geolocation_city': 'category',
+        'geolocation_state': 'category',
+    }
+    geolocation_df = geolocation_df.astype(convert_dict)
+
+    # Let's standardize geolocation_zip_code_prefix digits to 5 for the column
+    geolocation_df['geolocation_zip_code_prefix'] = geolocation_df.geolocation_zip_code_prefix.str.zfill(5)
+    return geolocation_df
+
+
+def prepare_order_items(order_items_df):
+    convert_dict = {
+        'order_item_id': str,
+        'product_id': str,
+        'seller_id': str,
+    }
+    order_items_df = order_items_df.astype(convert_dict)
+    return order_items_df.drop(columns=['shipping_limit_date'])
+
+
+def prepare_order_payments(order_payments_df):
+    # Change datatype
+    convert_dict = {
+        'order_id': str,
+        'payment_type': 'category',
+    }
+    order_payments_df = order_payments_df.astype(convert_dict)
+
+    # drop irrelevant columns
+    return order_payments_df.drop(columns=['payment_sequential', 'payment_installments'])
+
+
+def prepare_order_reviews(order_reviews_df):
+    # change dtype
+    order_reviews_df = order_reviews_df.astype({'review_score': 'category'})
+
+    # drop irrelevant columns
+    return order_reviews_df.drop(columns=['review_creation_date','review_comment_message',
+                                          'review_comment_title','review_answer_timestamp',
+                                         ])
+
+
+def prepare_orders(orders_df):
+    # change dtype
+    orders_df = orders_df.astype({'order_status': 'category'})
+    for col in ['order_purchase_timestamp', 'order_approved_at', 'order_delivered_customer_date']:
+        orders_df[col] = pd.to_datetime(orders_df[col])
+
+    # drop irrelevant columns
+    return orders_df.drop(columns = ['order_delivered_carrier_date',
+                                     'order_estimated_delivery_date'
+                                    ])
+
+
+def prepare_products(products_df):
+    # drop irrelevant columns
+    return products_df.drop(columns=['product_name_lenght',
+       'product_description_lenght', 'product_photos_qty', 'product_weight_g',
+       'product_length_cm', 'product_height_cm', 'product_width_cm'])
+
+
+def prepare_sellers(sellers_df):
+    # change data types of columns
+    convert_dict = {
+        'seller_zip_code_prefix': str,
+        'seller_id': str,
+        'seller_city': 'category',
+        'seller_state': 'category',
+    }
+    sellers_df = sellers_df.astype(convert_dict)
+
+    # Let's standardize seller_zip_code_prefix digits to 5 for the column
+    sellers_df['seller_zip_code_prefix'] = sellers_df.seller_zip_code_prefix.str.zfill(5)
+    return sellers_df
+
+
+def prepare_product_categories(product_categories_df):
+    # Some products categories were not translated to English, while others are not available
+    missing_df = pd.DataFrame(data=MISSING_CATEGORIES)
+    return pd.concat([product_categories_df, missing_df], ignore_index=True)
+
+
+PREPARE = {
+    'customers': prepare_customers,
+    'geolocation': prepare_geolocation,
+    'order_items': prepare_order_items,
+    'order_payments': prepare_order_payments,
+    'order_reviews': prepare_order_reviews,
+    'orders': prepare_orders,
+    'products': prepare_products,
+    'sellers': prepare_sellers,
+    'product_categories': prepare_product_categories,
+}
+
+
+def prepare_tables(raw_tables):
+    '''Type and trim every raw table.
+    return: dict of table name to prepared dataframe'''
+    return {name: PREPARE[name](df) for name, df in raw_tables.items()}
+
+
+def dedupe_tables(tables):
+    '''Drop exact duplicate rows from every table. order_payments and geolocation contain them.
+    return: dict of table name to deduplicated dataframe'''
+    return {name: df.drop_duplicates(ignore_index=True) for name, df in tables.items()}
+
+
+def aggregate_payments(order_payments_df):
+    '''One row per order: the total payment_value, and the payment_type of the largest payment'''
+    totals = order_payments_df.groupby('order_id', sort=False)['payment_value'].sum()
+    largest = order_payments_df.loc[order_payments_df.groupby('order_id', sort=False)['payment_value'].idxmax()]
+    payments = largest[['order_id', 'payment_type']].set_index('order_id')
+    payments['payment_value'] = totals
+    return payments.reset_index()
+
+
+def aggregate_reviews(order_reviews_df):
+    '''One row per order: the first review_id and the mean review_score, rounded to a whole score'''
+    review_score = pd.to_numeric(order_reviews_df['review_score'].astype('float64'))
+    reviews = (order_reviews_df[['order_id', 'review_id']].assign(review_score=review_score)
+               .groupby('order_id', sort=False)
+               .agg(review_id=('review_id', 'first'), review_score=('review_score', 'mean')))
+    reviews['review_score'] = reviews['review_score'].round().astype('category')
+    return reviews.reset_index()
+
+
+def _merge(left, right, step, **kwargs):
+    '''pd.merge with a validated cardinality, logging the row fan-out of the step'''
+    merged = pd.merge(left, right, **kwargs)
+    logger.info('join %-15s %9d -> %9d rows (x%.2f)', step, len(left), len(merged),
+                len(merged) / len(left) if len(left) else 1.0)
+    return merged
+
+
+def allocate_payments(orders):
+    '''Spread each order's payment_value over its items, in proportion to price + freight_value.
+    Summing payment_value over item rows then gives each order's payment exactly once.'''
+    item_value = orders['price'].fillna(0) + orders['freight_value'].fillna(0)
+    by_order = item_value.groupby(orders['order_id'], sort=False)
+    order_value = by_order.transform('sum')
+    items = by_order.transform('size')
+    share = (item_value / order_value).where(order_value > 0, 1 / items)
+    orders = orders.copy()
+    orders['payment_value'] = orders['payment_value'] * share
+    return orders
+
+
+def join_tables(tables, order_ids=None):
+    '''Merge the prepared tables into one row per order item.
+    Payments and reviews are aggregated per order first, so orders with several payments and
+    several items are not multiplied out. Every merge validates its cardinality.
+    order_ids: optional collection of order ids; only those orders (and their customers) are joined
+    return: the joined sales dataframe'''
+    orders_df = tables['orders']
+    customers_df = tables['customers']
+    order_reviews_df = tables['order_reviews']
+    order_payments_df = tables['order_payments']
+    order_items_df = tables['order_items']
+    if order_ids is not None:
+        orders_df = orders_df[orders_df.order_id.isin(order_ids)]
+        customers_df = customers_df[customers_df.customer_id.isin(orders_df.customer_id)]
+        order_reviews_df = order_reviews_df[order_reviews_df.order_id.isin(order_ids)]
+        order_payments_df = order_payments_df[order_payments_df.order_id.isin(order_ids)]
+        order_items_df = order_items_df[order_items_df.order_id.isin(order_ids)]
+
+    #  orders_df + order_reviews = orders
+    orders = _merge(orders_df, aggregate_reviews(order_reviews_df), 'order_reviews',
+                    on='order_id', how='left', validate='one_to_one')
+    # orders + order_payments_df = orders
+    orders = _merge(orders, aggregate_payments(order_payments_df), 'order_payments',
+                    on='order_id', how='left', validate='one_to_one')
+    # orders + order_items_df = orders
+    orders = _merge(orders, order_items_df, 'order_items',
+                    on='order_id', how='left', validate='one_to_many')
+    orders = allocate_payments(orders)
+    # orders + products = orders
+    orders = _merge(orders, tables['products'], 'products',
+                    on='product_id', how='left', validate='many_to_one')
+    # orders + sellers_df = orders
+    orders = _merge(orders, tables['sellers'], 'sellers',
+                    on='seller_id', how='left', validate='many_to_one')
+
+    # orders + customers_df = sales_df
+    return _merge(orders, customers_df, 'customers', on = 'customer_id', how='right', validate='many_to_one')
+
+
+def translate_categories(sales_df, product_categories_df):
+    '''Replace the Portugese category names with the English version.
+    The translation is applied to the categories of product_category_name, not to its rows:
+    each distinct name is looked up once, and the row codes are remapped.
+    Names missing from product_categories_df are kept as they are, and reported.'''
+    known = product_categories_df.product_category_name.notna()
+    translation = dict(zip(product_categories_df.product_category_name[known],
+                           product_categories_df.product_category_name_english[known]))
+    # English name for products without a category (the np.nan entry of MISSING_CATEGORIES)
+    not_available = product_categories_df.product_category_name_english[~known]
+    not_available = not_available.iloc[0] if len(not_available) else np.nan
+
+    names = sales_df['product_category_name'].astype('category')
+    categories = names.cat.categories
+    english = categories.map(translation)
+    unmapped = categories[english.isna()]
+    if len(unmapped):
+        logger.warning('%d product categories have no English name: %s', len(unmapped), ', '.join(map(str, unmapped)))
+    english = english.where(english.notna(), categories)
+
+    # Several names may translate to the same English name, so the English names are factorized again
+    english_codes, english_categories = pd.factorize(english)
+    codes = names.cat.codes.to_numpy()
+    # Only the codes of present names are looked up, english_codes is empty when every name is missing
+    present = codes >= 0
+    new_codes = np.full(len(codes), -1, dtype=english_codes.dtype)
+    new_codes[present] = english_codes[codes[present]]
+    if pd.notna(not_available):
+        if not_available not in english_categories:
+            english_categories = english_categories.append(pd.Index([not_available]))
+        new_codes[~present] = english_categories.get_loc(not_available)
+
+    sales_df = sales_df.copy()
+    sales_df['product_category_name'] = pd.Categorical.from_codes(new_codes, categories=english_categories)
+    return sales_df
+
+
+def tidy_names(values):
+    '''Replace '_' with a space and convert to title case.
+    The names are repetitive, so each distinct value is transformed once and the row codes are remapped.
+    Missing values stay missing.
+    return: categorical series'''
+    values = values if isinstance(values.dtype, pd.CategoricalDtype) else values.astype('category')
+    names = values.cat.categories.astype(str).str.replace('_', ' ', regex=False).str.title()
+
+    # Distinct raw names can tidy to the same name, e.g. 'sao_paulo' and 'sao paulo'
+    name_codes, tidy_categories = pd.factorize(names)
+    codes = values.cat.codes.to_numpy()
+    # Only the codes of present values are looked up, name_codes is empty when every value is missing
+    present = codes >= 0
+    new_codes = np.full(len(codes), -1, dtype=name_codes.dtype)
+    new_codes[present] = name_codes[codes[present]]
+    return pd.Series(pd.Categorical.from_codes(new_codes, categories=tidy_categories),
+                     index=values.index, name=values.name)
+
+
+def clean_sales(sales_df):
+    '''Tidy the named columns and set the categorical datatypes.
+    return: the cleaned sales dataframe'''
+    sales_df_clean = sales_df.copy()
+    for col in NAMED_COLUMNS:
+        sales_df_clean[col] = tidy_names(sales_df_clean[col])
+
+    # Re-convert columns to desired datatypes
+    for category in ORDERED_CATEGORIES:
+        ordered_var = pd.api.types.CategoricalDtype(categories=ORDERED_CATEGORIES[category],
+                                                    ordered = True)
+        sales_df_clean[category] = sales_df_clean[category].astype(ordered_var)
+    return sales_df_clean
+
+
+def select_dashboard_columns(sales_df_clean):
+    '''Column-pruned copy of the cleaned sales data, with the year and month of purchase, the delivery days
+    and the seller to customer distance in km added.
+    Customers without an order, kept by the customers join, have no sale and no month, so their rows are dropped.
+    Rows are sorted by month of purchase, so the dashboard can filter them by binary search.
+    return: the dataframe, before the dashboard schema is applied'''
+    dashboard_df = sales_df_clean[sales_df_clean.order_id.notna()]
+    dashboard_df = dashboard_df.rename(columns={'product_category_name': 'product_category_name_english'})
+    purchased = pd.to_datetime(dashboard_df.order_purchase_timestamp)
+    dashboard_df = dashboard_df.assign(year=purchased.dt.year, month=purchased.dt.month,
+                                       delivery_days=delivery_days(purchased, dashboard_df.order_delivered_customer_date))
+    if {'seller_lat', 'seller_lng', 'customer_lat', 'customer_lng'} <= set(dashboard_df.columns):
+        dashboard_df['distance_km'] = haversine_km(dashboard_df.seller_lat, dashboard_df.seller_lng,
+                                                   dashboard_df.customer_lat, dashboard_df.customer_lng)
+    dashboard_df = dashboard_df.sort_values(['year', 'month'], kind='stable', ignore_index=True)
+    return dashboard_df[[col for col in DASHBOARD_COLUMNS if col in dashboard_df.columns]]
+
+
+def to_dashboard_frame(sales_df_clean):
+    '''Typed, column-pruned copy of the cleaned sales data for the dashboard, see Dashboard/dashboard_core/schema.py.
+    Parquet keeps these dtypes, so the dashboard reads it without re-casting.'''
+    return apply_schema(select_dashboard_columns(sales_df_clean))
+
+
+def build_sales(tables, order_ids=None):
+    '''Join, enrich, translate and clean the prepared tables.
+    order_ids: optional collection of order ids to restrict the build to
+    return: the dashboard frame for those orders'''
+    sales_df = join_tables(tables, order_ids=order_ids)
+    sales_df = enrich_geolocation(sales_df, tables['geolocation'])
+    sales_df = translate_categories(sales_df, tables['product_categories'])
+    return to_dashboard_frame(clean_sales(sales_df))
@@ -1,710 +1,134 @@
 #!/usr/bin/env python
 # coding: utf-8
-
-# ## Attention
-# 
-# An order might have multiple items.
-# 
-# Each item might be fulfiled by a distinct seller
-
-# In[1]:
-
-
-#Import required libraries
-import numpy as np
-import pandas as pd
-import seaborn as sb
-import matplotlib.pyplot as plt
-# import streamlit as st
-# import plotly
-
-
-# In[ ]:
-
-
-
-
-
-# In[2]:
-
-
-# The datasets were combined into one Excel file with multiple sheets
-#Load workbook
-xl = pd.ExcelFile('olist_store_dataset.xlsx', engine='openpyxl')
-
-
-# In[3]:
-
-
-# list of sheets containing the datasets
-xl.sheet_names
-
-
-# ### Load the tables from Excel worksheet to a pandas dataframe
-
-# In[4]:
-
-
-# Customers data sheet
-customers_df = pd.read_excel(xl, sheet_name='customers_data')
-customers_df.head(2)
-
-
-# In[7]:
-
-
-customers_df.info()
-
-
-# In[8]:
-
-
-# change column datatypes
-convert_dict = {
-    'customer_zip_code_prefix': str,
-    'customer_city': 'category',
-    'customer_state': 'category',
-}
-customers_df = customers_df.astype(convert_dict)
-
-# Let's standardize customer_zip_code_prefix digits to 5 for the column
-customers_df.customer_zip_code_prefix = customers_df.customer_zip_code_prefix.str.zfill(5)
-
-customers_df.info()
-
-
-# In[30]:
-
-
-customers_df.customer_zip_code_prefix.sample(5)
-
-
-# In[31]:
-
-
-# geolocation data sheet
-geolocation_df = pd.read_excel(xl, sheet_name='geolocation_data')
-geolocation_df
-
-
-# In[32]:
-
-
-geolocation_df.info()
-
-
-# In[33]:
-
-
-# Change data types of listed columns
-convert_dict = {
-    'geolocation_zip_code_prefix' : str,
-    'geolocation_city': 'category',
-    'geolocation_state': 'category',
-}
-geolocation_df = geolocation_df.astype(convert_dict)
-
-
-# Let's standardize geolocation_zip_code_prefix digits to 5 for the column
-geolocation_df.geolocation_zip_code_prefix = geolocation_df.geolocation_zip_code_prefix.str.zfill(5)
-
-
-# In[34]:
-
-
-geolocation_df.info()
-
-
-# In[35]:
-
-
-geolocation_df.geolocation_zip_code_prefix.sample(10)
-
-
-# In[36]:
-
-
-# order_items data sheet
-order_items_df = pd.read_excel(xl, sheet_name='order_items_data')
-order_items_df.head(2)
-
-
-# In[37]:
-
-
-order_items_df.info()
-
-
-# - Change datatypes for some columns
-# - Drop the shipping_limit_date column
-
-# In[38]:
-
-
-convert_dict = {
-    'order_item_id': str,
-    'product_id': str,
-    'seller_id': str,    
-}
-
-order_items_df = order_items_df.astype(convert_dict)
-order_items_df = order_items_df.drop(columns=['shipping_limit_date'])
-
-
-# In[39]:
-
-
-order_items_df.info()
-
-
-# In[40]:
-
-
-# order_payments data sheet
-order_payments_df = pd.read_excel(xl, sheet_name='order_payments_data')
-order_payments_df.head(2)
-
-
-# In[41]:
-
-
-order_payments_df.info()
-
-
-# In[42]:
-
-
-order_payments_df.duplicated().any()
-
-
-# In[43]:
-
-
-# order_payments_df contains duplicate rows
-order_payments_df[order_payments_df.duplicated()]
-
-
-# In[44]:
-
-
-# Change datatype
-convert_dict = {
-    'order_id': str,
-    'payment_type': 'category', 
-}
-order_payments_df = order_payments_df.astype(convert_dict)
-
-# drop irrelevant columns
-order_payments_df = order_payments_df.drop(columns=['payment_sequential', 'payment_installments'])
-order_payments_df.info()
-
-# drop duplicates
-order_payments_df = order_payments_df.drop_duplicates()
-
-
-# In[45]:
-
-
-order_payments_df.duplicated().any()
-
-
-# In[46]:
-
-
-# order_reviews data sheet
-order_reviews_df = pd.read_excel(xl, sheet_name='order_reviews_data')
-order_reviews_df.head(2)
-
-
-# In[47]:
-
-
-order_reviews_df.info()
-
-
-# In[48]:
-
-
-# change dtype
-convert_dict = {
-    'review_score': 'category',
-}
-order_reviews_df = order_reviews_df.astype(convert_dict)
-
-# drop irrelevant columns
-order_reviews_df = order_reviews_df.drop(columns=['review_creation_date','review_comment_message',
-                                                  'review_comment_title','review_answer_timestamp',
-                                                 ])
-order_reviews_df.info()
-
-
-# In[49]:
-
-
-# orders data sheet
-orders_df = pd.read_excel(xl, sheet_name='orders_data')
-orders_df.head(2)
-
-
-# In[50]:
-
-
-orders_df.info()
-
-
-# In[51]:
-
-
-# change dtype
-orders_df["order_status"] = orders_df.order_status.astype('category')
-
-# drop irrelevant columns
-orders_df = orders_df.drop(columns = ['order_delivered_carrier_date', 
-                                      'order_estimated_delivery_date'
-                                     ])
-orders_df.info()
-
-
-# In[52]:
-
-
-# products data sheet
-products_df = pd.read_excel(xl, sheet_name='products_data')
-products_df.head(2)
-
-
-# In[53]:
-
-
-products_df.info()
-
-
-# In[54]:
-
-
-# drop irrelevant columns
-products_df = products_df.drop(columns=['product_name_lenght',
-       'product_description_lenght', 'product_photos_qty', 'product_weight_g',
-       'product_length_cm', 'product_height_cm', 'product_width_cm'])
-products_df.info()
-
-
-# In[55]:
-
-
-# sellers data sheet
-sellers_df = pd.read_excel(xl, sheet_name='sellers_data')
-sellers_df.sample(10)
-
-
-# In[56]:
-
-
-sellers_df.info()
-
-
-# In[57]:
-
-
-# change data types of columns
-convert_dict = {
-    'seller_zip_code_prefix': str,
-    'seller_id': str,
-    'seller_city': 'category',
-    'seller_state': 'category',
-}
-sellers_df = sellers_df.astype(convert_dict)
-
-# Let's standardize seller_zip_code_prefix digits to 5 for the column
-sellers_df.seller_zip_code_prefix = sellers_df.seller_zip_code_prefix.str.zfill(5)
-
-sellers_df.info()
-
-
-# In[58]:
-
-
-# product_categories data sheet
-product_categories_df = pd.read_excel(xl, sheet_name='product_categories_data')
-product_categories_df
-
-
-# ## Using the schema below, let's merge the tables.
-# 
-# >1.	An order might have multiple items.
-# 2.	Each item might be fulfilled by a distinct seller.
-# 3.	All text identifying stores and partners were replaced by the names of Game of Thrones great houses.
-# 
-
-# <img src='schema.png' alt='Table schema' width='750px'>
-
-# In[59]:
-
-
-#  orders_df + order_reviews = orders
-orders = pd.merge(orders_df, order_reviews_df, on='order_id', how='left')
-orders.info()
-
-
-# In[60]:
-
-
-orders.duplicated().any()
-
-
-# In[61]:
-
-
-# orders + order_payments_df = orders
-orders = pd.merge(orders, order_payments_df, on='order_id', how='left')
-orders.info()
-
-
-# In[62]:
-
-
-order_payments_df.query("order_id == '8ca5bdac5ebe8f2d6fc9171d5ebc906a'")
-
-
-# In[63]:
-
-
-# orders + order_items_df = orders
-orders = pd.merge(orders, order_items_df, on='order_id', how='left')
-orders.info()
-
-
-# In[64]:
-
-
-# orders + products = orders
-orders = pd.merge(orders, products_df, on='product_id', how='left')
-orders.info()
-
-
-# In[65]:
-
-
-# orders + sellers_df = orders
-orders = pd.merge(orders, sellers_df, on='seller_id', how='left')
-orders.info()
-
-
-# ### Fetch Seller Latitude and Longitude values from the geolocation table
-
-# In[43]:
-
-
-# orders['seller_lat'] = pd.merge(orders, geolocation_df, 
-#                                         left_on=['seller_zip_code_prefix', 'seller_state', 'seller_city'], 
-#                                         right_on=['geolocation_zip_code_prefix', 'geolocation_state', 'geolocation_city'], 
-#                                          how='left')['geolocation_lat']
-
-
-# In[ ]:
-
-
-# orders['seller_lng'] = pd.merge(orders, geolocation_df, 
-#                                          left_on=['seller_zip_code_prefix', 'seller_state', 'seller_city'], 
-#                                          right_on=['geolocation_zip_code_prefix', 'geolocation_state', 'geolocation_city'], 
-#                                          how='left')['geolocation_lng']
-
-
-# In[83]:
-
-
-orders_copy = orders.copy()
-
-
-# In[98]:
-
-
-# EXPERIMENTAL
-
-# Convert columns to string, then combine to form a new id column
-
-geolocation_df['geo_multikey'] = geolocation_df['geolocation_zip_code_prefix'] + "" + geolocation_df['geolocation_state'].astype(str).replace(' ', '') + "" + geolocation_df['geolocation_city'].astype(str).replace(' ', '')  #+"" #.str.replace('\n', '')
-orders_copy['seller_multikey'] = orders_copy['seller_zip_code_prefix'] + "" + orders_copy['seller_state'].astype(str).replace(' ', '') + "" + orders_copy['seller_city'].astype(str).replace(' ', '')
-
-
-# In[ ]:
-
-
-orders_copy['seller_lat'] = pd.merge(orders_copy, geolocation_df, left_on='seller_multikey', right_on='geo_multikey', how='left')['geolocation_lat']
-orders_copy['seller_lng'] = pd.merge(orders_copy, geolocation_df, left_on='seller_multikey', right_on='geo_multikey', how='left')['geolocation_lng']
-
-
-# In[87]:
-
-
-orders_copy['seller_lng'].value_counts(dropna=False)
-
-
-# In[102]:
-
-
-geolocation_df['geo_multikey']
-
-
-# In[100]:
-
-
-orders_copy['seller_multikey']
-
-
-# In[45]:
-
-
-orders
-
-
-# ### Also, fetch Customer Latitude and Longitude values from the geolocation table
-
-# In[46]:
-
-
-customers_df['customer_lat'] = pd.merge(customers_df, geolocation_df, 
-                                         left_on=['customer_zip_code_prefix', 'customer_state', 'customer_city'], right_on=['geolocation_zip_code_prefix', 'geolocation_state', 'geolocation_city'], 
-                                         how='left')['geolocation_lat']
-
-
-# In[47]:
-
-
-customers_df['customer_lng'] = pd.merge(customers_df, geolocation_df, 
-                                         left_on=['customer_zip_code_prefix', 'customer_state', 'customer_city'], right_on=['geolocation_zip_code_prefix', 'geolocation_state', 'geolocation_city'], 
-                                         how='left')['geolocation_lng']
-
-
-# In[ ]:
-
-
-customers_df['customer_multikey'] = customers_df['customer_zip_code_prefix'] + str(customers_df['customer_state']) + str(customers_df['customer_city'])
-customers_df['customer_lat'] = pd.merge(orders, geolocation_df, left_on='customer_multikey', right_on = 'geo_multikey')['geolocation_lat']
-customers_df['customer_lng'] = pd.merge(orders, geolocation_df, left_on='customer_multikey', right_on = 'geo_multikey')['geolocation_lng']
-
-
-# In[48]:
-
-
-customers_df
-
-
-# ### Finally, merge customers_df with orders using customer_id column
-
-# In[49]:
-
-
-# orders + customers_df = sales_df
-sales_df = pd.merge(orders, customers_df, on = 'customer_id', how='right')
-sales_df
-
-
-# ### Copy the sales_df table for further cleaning
-
-# In[50]:
-
-
-sales_df_clean = sales_df.copy()
-sales_df_clean
-
-
-# In[51]:
-
-
-# Export to csv for visual cleaning
-sales_df_clean.to_csv('dirty_sales_data.csv', index=False)
-
-
-# In[52]:
-
-
-sales_df_clean.info()
-
-
-# In[53]:
-
-
-sales_df_clean.describe()
-
-
-# ### Additional Data Quality Issues
-# - Product category column not in English
-# - '_' in item and category names
-# - City names are in lower case
-
-# In[ ]:
-
-
-
-
-
-# ### Product category column not in English
-# 
-# Replace product category name column with the translated one in the products_category_translation csv file
-
-# In[54]:
-
-
-sales_df_clean.product_category_name.sample(15)
-
-
-# In[55]:
-
-
-for i in sales_df_clean.product_category_name:
-    assert (str(i).islower())
-
-
-# In[56]:
-
-
-# Some products categories were not translated to English, while others are not available
-print(sales_df_clean.product_category_name.nunique(dropna=False))
-print(product_categories_df.product_category_name.nunique(dropna=False))
-
-
-# In[57]:
-
-
-missing_cat = {'product_category_name' : ['portateis_cozinha_e_preparadores_de_alimentos', 'pc_gamer', np.nan],
-    'product_category_name_english' : ['Kitchen Equipment', 'PC Gamer', 'Not Available']}
-
-df = pd.DataFrame(data=missing_cat)
-
-# Concatenate with the product_categories_df dataframe
-product_categories_df = pd.concat([product_categories_df, df], ignore_index=True)
-product_categories_df
-
-
-# In[58]:
-
-
-# Next, replace the Portugese category names to English version
-sales_df_clean = sales_df_clean.replace(sales_df_clean.product_category_name.unique(), product_categories_df.product_category_name_english.unique())
-sales_df_clean.product_category_name.unique()
-
-
-# ### '_' in item and category names
-# 
-# ### City names are in lower case
-# 
-# Replace all underscores in named columns of the Dataframe to have a cleaner data, then, convert to title case
-
-# In[59]:
-
-
-sales_df_clean.customer_city
-
-
-# In[60]:
-
-
-# Replace all underscores with white space
-named_columns = ['order_status', 'payment_type', 'product_category_name', 'seller_city', 'customer_city',]
-sales_df_clean[named_columns] = sales_df_clean[named_columns].astype(str)
-sales_df_clean[named_columns] = sales_df_clean[named_columns].replace('_', ' ', regex=True)
-
-# Next, convert to title case
-for col in named_columns:
-    sales_df_clean[col] = sales_df_clean[col].str.title()
-
-
-# In[61]:
-
-
-sales_df_clean[named_columns].info()
-
-
-# In[62]:
-
-
-# Re-convert columns to desired datatypes
-
-ordered_category ={
-    'order_status': ['Unavailable', 'Created', 'Invoiced', 'Approved', 'Processing', 'Shipped', 'Canceled', 'Delivered',],
-    'review_score': [1, 2, 3, 4, 5],
-    'payment_type': ['Credit Card', 'Debit Card', 'Voucher', 'Boleto', 'Not Defined', 'Nan'],    
-    }
-
-# Convert to categorical datatype
-for category in ordered_category:
-    ordered_var = pd.api.types.CategoricalDtype(categories=ordered_category[category], 
-                                                ordered = True)
-    sales_df_clean[category] = sales_df_clean[category].astype(ordered_var)
-    
-    
-# Convert other columns to unordered categories
-sales_df_clean['product_category_name'] = sales_df_clean['product_category_name'].astype('category')
-
-
-# In[63]:
-
-
-sales_df_clean.info()
-
-
-# In[329]:
-
-
-# OPTIONAL
-# Now, let's export our cleaned data
-
-sales_df_clean.to_csv('cleaned_sales_data.csv', index=False)
-
-
-# In[64]:
-
-
-
-sales_df_clean.order_status.unique()
-
-
-# # UNIVARIATE ANALYSIS
-
-# In[65]:
-
-
-sales_df_clean.info()
-
-
-# In[ ]:
-
-
-
-
-
-# In[66]:
-
-
-# Distribution of variables
-sales_df_clean.order_id.nunique()
-
-
-# Total unique customers till date
-
-# In[67]:
-
-
-sales_df_clean.customer_unique_id.nunique()
-
-
-# In[ ]:
-
-
-sales_df_clean[]
-
-
-# ### 1: Sales Volume by location
-
-# In[ ]:
-
-
-
-
-
-# In[ ]:
-
-
-
-
+'''Command-line entry point for the Olist ETL.
+
+    python olist_ecommerce.py build                      # full build from the workbook
+    python olist_ecommerce.py build --from-stage join    # resume from the cached output of dedupe
+    python olist_ecommerce.py build --workbook csv/      # build from a directory of the Kaggle CSV files
+    python olist_ecommerce.py build --backend polars     # one lazy polars query instead of the pandas stages
+    python olist_ecommerce.py parity                     # check the polars backend against the pandas one
+    python olist_ecommerce.py append new_orders.xlsx     # incremental refresh with new orders
+    python olist_ecommerce.py generate --orders 100000   # synthetic data as the load stage output
+    python olist_ecommerce.py benchmark --orders 100000 1000000 --output benchmark.json
+
+The build writes cleaned_sales_data.csv, cleaned_sales_data.parquet, sales_cube.parquet,
+seller_stats.parquet, customer_cohorts.parquet, map_bins.parquet, state_pairs.parquet and
+revenue_ytd.parquet, which are read by the dashboard. Every stage reports its wall time, peak
+memory and row counts.
+See etl/pipeline.py for the stages, and olist_ecommerce.ipynb for the exploratory analysis.
+'''
+import argparse
+import logging
+
+from etl.benchmark import run_benchmarks
+from etl.incremental import RefreshPaths, append_orders, read_delta
+from etl.pipeline import STAGE_NAMES, PipelineConfig, run_pipeline, save_stage, write_report
+from etl.snapshots import CACHE_DIR
+from etl.synthetic import generate_tables, write_workbook
+
+
+def build(args):
+    config = PipelineConfig(workbook=args.workbook, output_dir=args.output_dir, cache_dir=args.cache_dir,
+                            workers=args.workers)
+    print('{:<20} {:>10} {:>12} | rows'.format('stage', 'time', 'peak memory'))
+    if args.backend == 'polars':
+        from etl.polars_backend import POLARS_STAGES
+        _, reports = run_pipeline(config, cache_stages=not args.no_stage_cache, track_memory=not args.no_memory,
+                                  stages=POLARS_STAGES)
+    else:
+        _, reports = run_pipeline(config, start=args.from_stage, stop=args.to_stage,
+                                  cache_stages=not args.no_stage_cache, track_memory=not args.no_memory)
+    if args.report:
+        write_report(reports, args.report)
+
+
+def parity(args):
+    from etl.polars_backend import check_parity
+    rows = check_parity(args.workbook, args.cache_dir)
+    print('the polars and pandas backends produce the same {:,} rows'.format(rows))
+
+
+def append(args):
+    paths = RefreshPaths.in_dir(args.output_dir)
+    summary = append_orders(read_delta(args.workbook), args.cache_dir, paths)
+    print('{orders} orders refreshed: {removed_rows} rows replaced by {added_rows}, '
+          '{n} months re-aggregated'.format(n=len(summary['months']), **summary))
+
+
+def generate(args):
+    tables = generate_tables(args.orders, seed=args.seed)
+    if args.workbook:
+        write_workbook(tables, args.workbook)
+        print('wrote {}'.format(args.workbook))
+    else:
+        save_stage(tables, PipelineConfig(cache_dir=args.cache_dir), 'load')
+        print('saved as the load stage output, run: python olist_ecommerce.py build --from-stage type')
+
+
+def benchmark(args):
+    results = run_benchmarks(args.orders, args.output, work_dir=args.work_dir, seed=args.seed,
+                             repeat=args.repeat, track_memory=not args.no_memory)
+    for scale in results['scales']:
+        print('{:,} orders'.format(scale['orders']))
+        for step in scale['dashboard']:
+            print('  {:<32} {:>8.4f} s cold {:>8.4f} s warm'.format(step['name'], step['seconds'], step['warm_seconds']))
+    print('results written to {}'.format(args.output))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Clean the Olist dataset for the KPI dashboard.')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='directory for sheet snapshots and stage outputs')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help='run the pipeline stages')
+    build_parser.add_argument('--workbook', default='olist_store_dataset.xlsx',
+                              help='xlsx workbook, or directory of the per-table CSV files of the Kaggle release')
+    build_parser.add_argument('--workers', type=int, help='processes used to parse the sheets, one per CPU by default')
+    build_parser.add_argument('--output-dir', default='.')
+    build_parser.add_argument('--from-stage', choices=STAGE_NAMES, default=STAGE_NAMES[0],
+                              help='resume from this stage, using the cached output of the stage before it')
+    build_parser.add_argument('--to-stage', choices=STAGE_NAMES, default=STAGE_NAMES[-1],
+                              help='stop after this stage')
+    build_parser.add_argument('--no-stage-cache', action='store_true', help='do not save stage outputs')
+    build_parser.add_argument('--no-memory', action='store_true',
+                              help='do not trace peak memory, which slows the stages down')
+    build_parser.add_argument('--report', help='write the stage reports to this JSON file')
+    build_parser.add_argument('--backend', choices=['pandas', 'polars'], default='pandas',
+                              help='polars runs the stages before export as one lazy query, '
+                                   'and ignores --from-stage and --to-stage. It still types and dedupes '
+                                   'every sheet with pandas to save the base for append, which costs '
+                                   'part of the time the lazy query saves')
+    build_parser.set_defaults(func=build)
+
+    parity_parser = commands.add_parser('parity', help='check that the polars backend matches the pandas one')
+    parity_parser.add_argument('--workbook', default='olist_store_dataset.xlsx', help='xlsx workbook or CSV directory')
+    parity_parser.set_defaults(func=parity)
+
+    append_parser = commands.add_parser('append', help='merge new orders into the cleaned data')
+    append_parser.add_argument('workbook', help='xlsx workbook with new rows, using the sheet names of olist_store_dataset.xlsx')
+    append_parser.add_argument('--output-dir', default='.', help='directory of the files written by the build')
+    append_parser.set_defaults(func=append)
+
+    generate_parser = commands.add_parser('generate', help='generate synthetic Olist tables')
+    generate_parser.add_argument('--orders', type=int, default=100_000)
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--workbook', help='write an xlsx workbook instead of the load stage output')
+    generate_parser.set_defaults(func=generate)
+
+    benchmark_parser = commands.add_parser('benchmark', help='time the ETL and dashboard on synthetic data')
+    benchmark_parser.add_argument('--orders', type=int, nargs='+', default=[100_000, 1_000_000],
+                                  help='scales to benchmark, in orders')
+    benchmark_parser.add_argument('--output', default='benchmark.json', help='JSON file for the results')
+    benchmark_parser.add_argument('--work-dir', help='keep the generated data and outputs in this directory')
+    benchmark_parser.add_argument('--seed', type=int, default=0)
+    benchmark_parser.add_argument('--repeat', type=int, default=3, help='cold runs per dashboard step')
+    benchmark_parser.add_argument('--no-memory', action='store_true', help='do not trace peak memory')
+    benchmark_parser.set_defaults(func=benchmark)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
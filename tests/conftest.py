@@ -0,0 +1,16 @@
+import pytest
+
+from etl.pipeline import PipelineConfig, run_pipeline, save_stage
+from etl.synthetic import generate_tables
+
+ORDERS = 400
+
+
+@pytest.fixture(scope='session')
+def etl_config(tmp_path_factory):
+    '''A full pandas build of synthetic tables, resumed after the load stage'''
+    root = tmp_path_factory.mktemp('etl')
+    config = PipelineConfig(output_dir=str(root / 'out'), cache_dir=str(root / 'cache'))
+    save_stage(generate_tables(ORDERS, seed=1), config, 'load')
+    run_pipeline(config, start='type', track_memory=False, report=lambda stage_report: None)
+    return config
@@ -0,0 +1,16 @@
+import pandas as pd
+import pytest
+
+from Dashboard.dashboard_core.data_cache import FrameCache
+
+
+@pytest.mark.parametrize('copy_on_write', [False, True])
+def test_writes_to_cached_frames_do_not_reach_the_cache(copy_on_write):
+    cache = FrameCache()
+    with pd.option_context('mode.copy_on_write', copy_on_write):
+        first = cache.get_or_compute('frame', lambda: pd.DataFrame({'value': [1.0, 2.0, 3.0]}))
+        first.loc[0, 'value'] = -1.0
+        first['value'] *= 10
+        second = cache.get_or_compute('frame', lambda: None)
+    assert second['value'].tolist() == [1.0, 2.0, 3.0]
+    assert cache.hits == 1
@@ -0,0 +1,40 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+from Dashboard.dashboard_core.filters import Filters, comparison_cube
+from Dashboard.dashboard_core.kpis import yearly_status_summary
+from Dashboard.dashboard_core.loading import load_cube
+
+duckdb_engine = pytest.importorskip('Dashboard.dashboard_core.duckdb_engine')
+
+
+def test_summary_over_two_years_matches_comparison_cube(etl_config, tmp_path):
+    sales_path = etl_config.output_path('cleaned_sales_data.parquet')
+    cube = load_cube(etl_config.output_path('sales_cube.parquet'), sales_path)
+    # 24 months, so every row falls in two of the three shifted periods
+    last_year = int(cube['year'].max())
+    filters = Filters(start=(last_year - 1, 1), end=(last_year, 12))
+
+    engine = duckdb_engine.DuckDBEngine.open(sales_path, str(tmp_path / 'sales.duckdb'))
+    actual = duckdb_engine.yearly_status_summary(engine, filters)
+    expected = yearly_status_summary(comparison_cube(cube, filters))
+    expected.index = pd.MultiIndex.from_arrays(
+        [expected.index.get_level_values('year').astype('int64'),
+         expected.index.get_level_values('order_status').astype(str)], names=['year', 'order_status'])
+
+    assert len(expected.index.get_level_values('year').unique()) > 1
+    pd.testing.assert_frame_equal(actual[expected.columns].sort_index(), expected.sort_index(),
+                                  check_dtype=False, rtol=1e-5)
+
+
+def test_open_reads_the_csv_without_parquet(etl_config, tmp_path):
+    '''Like load_data, the engine falls back to the CSV export, and is reused while that file is unchanged'''
+    shutil.copy(etl_config.output_path('cleaned_sales_data.csv'), tmp_path)
+    sales_path = str(tmp_path / 'cleaned_sales_data.parquet')
+
+    engine = duckdb_engine.DuckDBEngine.open(sales_path, str(tmp_path / 'sales.duckdb'))
+    expected = pd.read_csv(tmp_path / 'cleaned_sales_data.csv')
+    assert engine.query('SELECT count(*) AS n FROM sales').n.iloc[0] == len(expected)
+    assert duckdb_engine.DuckDBEngine.open(sales_path, str(tmp_path / 'sales.duckdb')) is engine
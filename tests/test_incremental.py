@@ -0,0 +1,27 @@
+import pandas as pd
+
+from etl.incremental import RefreshPaths, append_orders
+from etl.pipeline import PipelineConfig, run_pipeline, save_stage
+from etl.synthetic import generate_tables
+
+
+def test_status_update_rebuilds_the_order(tmp_path):
+    '''An orders row with a known order_id and purchase time but a new status replaces the stored one'''
+    tables = generate_tables(200, seed=3)
+    config = PipelineConfig(output_dir=str(tmp_path / 'out'), cache_dir=str(tmp_path / 'cache'))
+    save_stage(tables, config, 'load')
+    run_pipeline(config, start='type', track_memory=False, report=lambda stage_report: None)
+
+    orders = tables['orders']
+    order = orders[orders.order_status == 'shipped'].head(1)
+    delivered = order.assign(order_status='delivered',
+                             order_delivered_customer_date=order.order_estimated_delivery_date)
+    summary = append_orders({'orders': delivered}, config.cache_dir, RefreshPaths.in_dir(config.output_dir))
+    assert summary['orders'] == 1
+
+    sales = pd.read_parquet(config.output_path('cleaned_sales_data.parquet'))
+    rows = sales[sales.order_id == order.order_id.iloc[0]]
+    assert len(rows) and set(rows.order_status) == {'Delivered'}
+
+    # Appending the same row again changes nothing
+    assert append_orders({'orders': delivered}, config.cache_dir, RefreshPaths.in_dir(config.output_dir))['orders'] == 0
@@ -0,0 +1,24 @@
+import os
+import shutil
+
+import pandas as pd
+
+from Dashboard.dashboard_core.loading import load_cube, load_data
+
+
+def test_csv_fallback_matches_parquet(etl_config, tmp_path):
+    '''Without the Parquet files, the dashboard reads the CSV written by the same build'''
+    shutil.copy(etl_config.output_path('cleaned_sales_data.csv'), tmp_path)
+    csv_path = str(tmp_path / 'cleaned_sales_data.csv')
+
+    from_csv = load_data(csv_path)
+    from_parquet = load_data(etl_config.output_path('cleaned_sales_data.parquet'))
+    assert list(from_csv.columns) == list(from_parquet.columns)
+    assert from_csv[['year', 'month']].equals(from_parquet[['year', 'month']])
+    assert (from_csv['payment_value'].sum() - from_parquet['payment_value'].sum()) < 1e-3
+
+    cube = load_cube(str(tmp_path / 'missing_cube.parquet'), csv_path)
+    expected = pd.read_parquet(etl_config.output_path('sales_cube.parquet'))
+    assert not os.path.exists(tmp_path / 'missing_cube.parquet')
+    assert len(cube) == len(expected)
+    assert abs(cube['payment_value'].sum() - expected['payment_value'].sum()) < 1e-3
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from Dashboard.dashboard_core.paging import get_page
+
+
+def test_reduced_pages_cover_every_row():
+    # Rows further down are larger than the first ones
+    df = pd.DataFrame({'row': np.arange(1000), 'text': ['x' * 10] * 100 + ['x' * 400] * 900})
+    first = get_page(df, page=1, page_size=100, max_bytes=5000)
+    assert first.page_size < 100
+
+    shown = [get_page(df, page=number, page_size=100, max_bytes=5000).rows['row']
+             for number in range(1, first.count + 1)]
+    assert np.array_equal(pd.concat(shown).to_numpy(), np.arange(1000))
+    assert all(len(rows) == first.page_size for rows in shown[:-1])
+
+
+def test_pages_stay_under_max_bytes():
+    # A run of large rows that a sample of the table would miss
+    text = ['x' * 10] * 4000 + ['x' * 50_000] * 100 + ['x' * 10] * 900
+    df = pd.DataFrame({'row': np.arange(5000), 'text': text,
+                       'arrow': pd.array(text, dtype=pd.StringDtype('pyarrow')),
+                       'category': pd.Categorical(text)})
+    # Cached per frame, as for the data the dashboard loads
+    df.attrs['fingerprint'] = ('large rows', 1)
+    size = get_page(df, page=1, page_size=500, max_bytes=1_000_000).page_size
+    # The pages around the large rows
+    numbers = range(3900 // size + 1, 4200 // size + 2)
+    pages = [get_page(df, page=number, page_size=500, max_bytes=1_000_000).rows for number in numbers]
+    assert max(rows.memory_usage(index=True, deep=True).sum() for rows in pages) <= 1_000_000
+    assert np.array_equal(pd.concat(pages)['row'].to_numpy(), np.arange((numbers[0] - 1) * size, numbers[-1] * size))
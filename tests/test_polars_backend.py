@@ -0,0 +1,45 @@
+import os
+
+import pandas as pd
+import pytest
+
+from etl.incremental import RefreshPaths, append_orders, load_tables
+from etl.pipeline import PipelineConfig, run_pipeline
+from etl.snapshots import CSV_FILES, SHEETS
+from etl.synthetic import generate_tables, write_csv_dir
+from etl.transform import dedupe_tables, prepare_tables
+
+polars_backend = pytest.importorskip('etl.polars_backend')
+
+
+def test_polars_build_saves_the_incremental_base(tmp_path):
+    tables = generate_tables(200, seed=2)
+    csv_dir = tmp_path / 'csv'
+    csv_dir.mkdir()
+    for name, df in tables.items():
+        df.to_csv(csv_dir / CSV_FILES[name], index=False)
+    config = PipelineConfig(workbook=str(csv_dir), output_dir=str(tmp_path / 'out'), cache_dir=str(tmp_path / 'cache'))
+    run_pipeline(config, cache_stages=False, track_memory=False, report=lambda stage_report: None,
+                 stages=polars_backend.POLARS_STAGES)
+
+    base = load_tables(config.cache_dir)
+    expected = dedupe_tables(prepare_tables(
+        {name: pd.read_csv(csv_dir / CSV_FILES[name]) for name in SHEETS}))
+    assert {name: len(df) for name, df in base.items()} == {name: len(df) for name, df in expected.items()}
+
+    # A changed review is merged into that base
+    order_id = tables['orders'].order_id.iloc[0]
+    reviews = tables['order_reviews'][tables['order_reviews'].order_id == order_id].assign(review_score=1)
+    summary = append_orders({'order_reviews': reviews}, config.cache_dir, RefreshPaths.in_dir(config.output_dir))
+    assert summary['orders'] == 1
+    sales = pd.read_parquet(config.output_path('cleaned_sales_data.parquet'))
+    assert set(sales.review_score[sales.order_id == order_id]) == {1}
+
+
+def test_check_parity_keeps_the_incremental_base(tmp_path):
+    csv_dir = str(tmp_path / 'csv')
+    write_csv_dir(generate_tables(200, seed=5), csv_dir)
+    cache_dir = str(tmp_path / 'cache')
+
+    assert polars_backend.check_parity(csv_dir, cache_dir) > 0
+    assert not os.path.exists(os.path.join(cache_dir, 'current'))
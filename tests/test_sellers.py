@@ -0,0 +1,19 @@
+import numpy as np
+
+from Dashboard.dashboard_core.loading import load_data
+from Dashboard.dashboard_core.paging import get_page, sort_order
+from Dashboard.dashboard_core.sellers import seller_rows
+
+
+def test_sorting_seller_rows_after_the_full_table(etl_config):
+    sales = load_data(etl_config.output_path('cleaned_sales_data.parquet'))
+    seller_id = sales['seller_id'].value_counts().index[0]
+    sort_order(sales, 'payment_value', ascending=False)
+
+    rows = seller_rows(sales, seller_id)
+    assert rows.attrs['fingerprint'] != sales.attrs['fingerprint']
+    page = get_page(rows, sort_by='payment_value', ascending=False, page_size=500)
+    assert len(page.rows) == len(rows) > 1
+    assert (page.rows['seller_id'] == seller_id).all()
+    assert np.array_equal(page.rows['payment_value'].to_numpy(),
+                          np.sort(rows['payment_value'].to_numpy())[::-1])
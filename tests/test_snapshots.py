@@ -0,0 +1,37 @@
+import zipfile
+
+from etl.snapshots import sheet_digests
+
+MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+DOC_RELS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+
+
+def write_xlsx(path, sheets, strings):
+    '''Write the parts of an xlsx workbook read by sheet_digests, with the cells of each sheet
+    referring to the shared strings by index'''
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('xl/workbook.xml', '<workbook xmlns="{}" xmlns:r="{}"><sheets>{}</sheets></workbook>'.format(
+            MAIN, DOC_RELS, ''.join('<sheet name="{}" sheetId="{}" r:id="rId{}"/>'.format(name, i, i)
+                                    for i, name in enumerate(sheets, 1))))
+        archive.writestr('xl/_rels/workbook.xml.rels', '<Relationships xmlns="{}">{}</Relationships>'.format(
+            RELS, ''.join('<Relationship Id="rId{0}" Target="worksheets/sheet{0}.xml"/>'.format(i)
+                          for i in range(1, len(sheets) + 1))))
+        for i, indices in enumerate(sheets.values(), 1):
+            cells = ''.join('<row r="{0}"><c r="A{0}" t="s"><v>{1}</v></c></row>'.format(row, index)
+                            for row, index in enumerate(indices, 1))
+            archive.writestr('xl/worksheets/sheet{}.xml'.format(i),
+                             '<worksheet xmlns="{}"><sheetData>{}</sheetData></worksheet>'.format(MAIN, cells))
+        archive.writestr('xl/sharedStrings.xml', '<sst xmlns="{}">{}</sst>'.format(
+            MAIN, ''.join('<si><t>{}</t></si>'.format(text) for text in strings)))
+
+
+def test_sheet_digests_cover_only_the_strings_of_the_sheet(tmp_path):
+    write_xlsx(tmp_path / 'a.xlsx', {'cities': [0, 1], 'states': [2]}, ['recife', 'natal', 'PE'])
+    # A new string of the states sheet, and a changed string of the cities sheet
+    write_xlsx(tmp_path / 'b.xlsx', {'cities': [0, 1], 'states': [2, 3]}, ['recife', 'natal', 'PE', 'RN'])
+    write_xlsx(tmp_path / 'c.xlsx', {'cities': [0, 1], 'states': [2]}, ['recife', 'olinda', 'PE'])
+
+    a, b, c = (sheet_digests(tmp_path / name) for name in ['a.xlsx', 'b.xlsx', 'c.xlsx'])
+    assert a['cities'] == b['cities'] and a['states'] != b['states']
+    assert a['cities'] != c['cities'] and a['states'] == c['states']
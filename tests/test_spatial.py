@@ -0,0 +1,27 @@
+import pandas as pd
+
+from Dashboard.dashboard_core.filters import Filters
+from Dashboard.dashboard_core.spatial import build_map_bins, map_cells
+
+
+def test_map_orders_add_up_over_categories_and_cells():
+    # Order a has items in two categories, from sellers in two cells
+    sales = pd.DataFrame({
+        'order_id': ['a', 'a', 'b'],
+        'year': [2018, 2018, 2018],
+        'month': [1, 1, 2],
+        'order_status': ['Delivered'] * 3,
+        'customer_state': ['SP'] * 3,
+        'product_category_name_english': ['Toys', 'Audio', 'Toys'],
+        'payment_value': [10.0, 20.0, 30.0],
+        'customer_lat': [-23.5] * 3,
+        'customer_lng': [-46.6] * 3,
+        'seller_lat': [-23.5, -8.0, -23.5],
+        'seller_lng': [-46.6, -34.9, -46.6],
+    })
+    bins = build_map_bins(sales)
+    everything = Filters(start=(2018, 1), end=(2018, 12))
+    for party in ['customer', 'seller']:
+        assert map_cells(bins, party, 7, everything)['orders'].sum() == 2
+    toys = Filters(start=(2018, 1), end=(2018, 12), product_category=('Toys',))
+    assert map_cells(bins, 'customer', 7, toys)['orders'].sum() == 1.5
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from etl.synthetic import generate_tables
+from etl.transform import build_sales, dedupe_tables, prepare_tables, tidy_names, translate_categories
+
+
+def test_translate_categories_without_any_category():
+    '''Orders without items, e.g. canceled ones, have no product category'''
+    product_categories = pd.DataFrame({'product_category_name': ['beleza_saude', np.nan],
+                                       'product_category_name_english': ['health_beauty', 'not_available']})
+    sales = pd.DataFrame({'order_id': ['a', 'b'], 'product_category_name': [np.nan, np.nan]})
+
+    translated = translate_categories(sales, product_categories)
+    assert list(translated.product_category_name) == ['not_available', 'not_available']
+
+    translated = translate_categories(sales, product_categories.iloc[:1])
+    assert translated.product_category_name.isna().all()
+
+
+def test_customer_without_orders_is_not_exported():
+    tables = generate_tables(50, seed=4)
+    customer = tables['customers'].head(1).assign(customer_id='f' * 32)
+    tables['customers'] = pd.concat([tables['customers'], customer], ignore_index=True)
+
+    sales = build_sales(dedupe_tables(prepare_tables(tables)))
+    assert sales.order_id.notna().all()
+    assert set(sales.order_id) == set(tables['orders'].order_id)
+
+
+def test_tidy_names_without_any_name():
+    assert tidy_names(pd.Series([np.nan, np.nan], dtype='object')).isna().all()
+    assert list(tidy_names(pd.Series(['sao_paulo', np.nan, 'sao paulo']))) == ['Sao Paulo', np.nan, 'Sao Paulo']